@@ -0,0 +1,134 @@
+"""
+Compiled alert rules.
+
+Active AlertRules are loaded once and compiled into a brand -> rules index
+plus numeric thresholds. A scan evaluates all its new products in one pass
+(prices as a numpy array, one mask per rule and brand group).
+
+The compiled set is cached per process and keyed by the `alert_rules_version`
+Config value, which `invalidate_alert_rules` bumps whenever a rule is edited,
+so changes made from the UI apply to the next scan in any process.
+"""
+import threading
+from collections import defaultdict
+
+import numpy as np
+
+from database import AlertRule, Config
+
+RULES_VERSION_KEY = "alert_rules_version"
+
+
+def _norm_brand(brand):
+    return (brand or "").lower().strip()
+
+
+class CompiledRule:
+    def __init__(self, rule):
+        self.id = rule.id
+        self.name = rule.name
+        brands = [_norm_brand(b) for b in (rule.brand_list or "").split(',')]
+        self.brands = frozenset(b for b in brands if b) or None  # None = any brand
+        self.max_price = rule.max_price
+        self.min_discount_percent = rule.min_discount_percent
+        self.min_z_score = rule.min_z_score
+
+    def mask(self, prices, z_scores, hist_mean):
+        """Boolean mask over `prices` for the numeric predicates of this rule."""
+        keep = np.ones(len(prices), dtype=bool)
+        if self.max_price is not None:
+            keep &= prices <= self.max_price
+        if self.min_discount_percent is not None:
+            if hist_mean <= 0:
+                return np.zeros(len(prices), dtype=bool)
+            keep &= prices <= hist_mean * (1 - self.min_discount_percent / 100.0)
+        if self.min_z_score is not None:
+            if z_scores is None:
+                return np.zeros(len(prices), dtype=bool)
+            keep &= z_scores <= self.min_z_score
+        return keep
+
+
+class AlertEngine:
+    def __init__(self, rules):
+        self.rules = [CompiledRule(r) for r in rules]
+        self.by_brand = defaultdict(list)
+        self.any_brand = []
+        for rule in self.rules:
+            if rule.brands is None:
+                self.any_brand.append(rule)
+            else:
+                for brand in rule.brands:
+                    self.by_brand[brand].append(rule)
+
+    @classmethod
+    def load(cls, db):
+        return cls(db.query(AlertRule).filter_by(is_active=1).all())
+
+    def evaluate(self, products, hist_mean=0.0, hist_std=0.0):
+        """
+        Returns [(rule, product), ...] for a batch of products, in product order.
+        `hist_mean`/`hist_std` are the search's price stats used by the
+        discount and z-score predicates (skipped when there is no history).
+        """
+        if not self.rules or not products:
+            return []
+
+        prices = np.array([p.price if p.price is not None else np.inf for p in products], dtype=float)
+        z_scores = None
+        if hist_mean > 0:
+            z_scores = (prices - hist_mean) / (hist_std if hist_std > 0 else 1)
+
+        groups = defaultdict(list)
+        for idx, p in enumerate(products):
+            groups[_norm_brand(p.brand)].append(idx)
+
+        hits = []
+        for brand, idxs in groups.items():
+            rules = self.by_brand.get(brand, []) + self.any_brand
+            if not rules:
+                continue
+            idxs = np.array(idxs)
+            group_prices = prices[idxs]
+            group_z = z_scores[idxs] if z_scores is not None else None
+            for rule in rules:
+                for i in idxs[rule.mask(group_prices, group_z, hist_mean)]:
+                    hits.append((int(i), rule))
+
+        hits.sort(key=lambda h: h[0])
+        return [(rule, products[i]) for i, rule in hits]
+
+
+def format_alert(rule, product):
+    return f"🚨 **ALERTA: {rule.name}**\n\n{product.title}\n{product.price}€\nURL: {product.url}"
+
+
+_cache = {'version': None, 'engine': None}
+_cache_lock = threading.Lock()
+
+
+def _rules_version(db):
+    row = db.query(Config).filter_by(key=RULES_VERSION_KEY).first()
+    return row.value if row else "0"
+
+
+def get_alert_engine(db):
+    """Compiled rules for this scan; recompiled only when the rules version changed."""
+    version = _rules_version(db)
+    with _cache_lock:
+        if _cache['engine'] is None or _cache['version'] != version:
+            _cache['engine'] = AlertEngine.load(db)
+            _cache['version'] = version
+        return _cache['engine']
+
+
+def invalidate_alert_rules(db):
+    """Call after creating, editing or deleting an AlertRule."""
+    row = db.query(Config).filter_by(key=RULES_VERSION_KEY).first()
+    if not row:
+        db.add(Config(key=RULES_VERSION_KEY, value="1"))
+    else:
+        row.value = str(int(row.value or 0) + 1)
+    db.commit()
+    with _cache_lock:
+        _cache['engine'] = None
@@ -1,29 +1,33 @@
-import streamlit as st
-import pandas as pd
-from datetime import datetime
-from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
-import threading
-import logging
-
 import streamlit as st
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
-from apscheduler.schedulers.background import BackgroundScheduler
-from sqlalchemy.orm import Session
 import logging
 import os
 import sys
 import asyncio
-from io import BytesIO
+from sqlalchemy import func, select
 
 # Fix for Windows asyncio loop (NotImplementedError in Playwright)
 if sys.platform.startswith("win"):
     asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
 
-from database import get_db, init_db, SearchConfig, Product, ScraperLog, Config, PriceHistory, Brand, AlertRule
-from scraper import scrape_vinted, VINTED_SIZE_IDS, VINTED_CONDITION_IDS, VINTED_COLOR_IDS, VINTED_CATALOG_IDS, send_telegram_alert, download_image_as_avif, verify_sold_status, fetch_vinted_brands
+from database import get_db, init_db, SearchConfig, Product, ProductSearch, PriceDaily, ScraperLog, Config, PriceHistory, Brand, AlertRule, ScanJob, MetricSample
+from scraper import FETCH_MODES, VINTED_SIZE_IDS, VINTED_CONDITION_IDS, VINTED_COLOR_IDS, VINTED_CATALOG_IDS, fetch_vinted_brands
+from alerts import invalidate_alert_rules
+from price_stats import recompute_stats
+from persistence import delete_search_config
+from log_sink import get_db_log_handler, fetch_worker_pending_lines
+from notifier import invalidate_telegram_settings
+from jobs import enqueue_job, worker_last_seen, SCAN_WORKERS_KEY, DEFAULT_SCAN_WORKERS, MAX_SCAN_WORKERS
+from scheduling import read_budget
+from route_filter import DEFAULT_BLOCK_TYPES, RESOURCE_TYPES, invalid_patterns
+from readiness import get_politeness, invalidate_politeness
+from sold_check import read_sold_check_settings
+from scan_cache import read_cache_ttl
+from market import get_data_version, bump_data_version, list_brands, summary, price_matrix, brand_means, MATRIX_PAGE_SIZE
+from exports import export_market_data, export_url, EXPORT_FORMATS
+from product_search import search_products
 
 # --- CONFIGURATION ---
 st.set_page_config(page_title="Vinted Pro Analytics", layout="wide", page_icon="📈")
@@ -31,145 +35,24 @@ st.set_page_config(page_title="Vinted Pro Analytics", layout="wide", page_icon="
 # Initialize DB
 init_db()
 
-# --- SCHEDULER SETUP ---
-if 'scheduler' not in st.session_state:
-    st.session_state.scheduler = BackgroundScheduler()
-    st.session_state.scheduler.start()
-    logging.info("Scheduler started.")
-
-def update_scheduler_job(db: Session):
-    scheduler = st.session_state.scheduler
-    if scheduler.get_job('main_scan'): scheduler.remove_job('main_scan')
-    if scheduler.get_job('sold_check'): scheduler.remove_job('sold_check')
-        
-    active_setting = db.query(Config).filter_by(key="scheduler_active").first()
-    interval_setting = db.query(Config).filter_by(key="scheduler_interval").first()
-    is_active = active_setting.value == "1" if active_setting else True
-    interval = int(interval_setting.value) if interval_setting else 6
-    
-    if is_active:
-        scheduler.add_job(run_scheduled_scans, 'interval', hours=interval, id='main_scan')
-        scheduler.add_job(run_sold_check_job, 'interval', hours=24, id='sold_check')
+# Scans and scheduling run in the worker process (python -m worker);
+# the UI only enqueues jobs and reads their status.
+JOB_STATUS_LABELS = {"queued": "⏳ En cola", "running": "🔄 En curso", "done": "✅ Hecho", "error": "❌ Error"}
+MARKET_QUERIES = {"list_brands": list_brands, "summary": summary, "price_matrix": price_matrix, "brand_means": brand_means}
 
-def run_scheduled_scans():
+@st.cache_data(max_entries=256, show_spinner=False)
+def market_query(name, version, *args):
+    """market.<name>(db, *args), cached per arguments; `version` is the data_version it was read at."""
     db = next(get_db())
-    configs = db.query(SearchConfig).all()
-    for config in configs:
-        scrape_and_save(db, config)
-    db.close()
-
-def run_sold_check_job():
-    db = next(get_db())
-    products = db.query(Product).filter(Product.is_sold == 0).order_by(Product.scanned_at.desc()).limit(100).all()
-    for p in products:
-        status = verify_sold_status(p.url)
-        if status == 'sold':
-            p.is_sold = 1
-            p.sold_at = datetime.utcnow()
-        elif status == 'deleted':
-            p.is_sold = 1
-    db.commit()
-    db.close()
-
-if not st.session_state.scheduler.get_jobs():
-    st.session_state.scheduler.add_job(run_scheduled_scans, 'interval', hours=6, id='main_scan')
-    st.session_state.scheduler.add_job(run_sold_check_job, 'interval', hours=24, id='sold_check')
-    
-# --- ANALYTICS ENGINE ---
-
-def calculate_stats(prices):
-    if not prices: return 0, 0
-    arr = np.array(prices)
-    return np.mean(arr), np.std(arr)
-
-def check_global_alerts(db, product):
-    """
-    Checks if a product matches any active AlertRule.
-    """
-    rules = db.query(AlertRule).filter_by(is_active=1).all()
-    for rule in rules:
-        # Check Brand
-        if rule.brand_list:
-            if not product.brand or product.brand.lower() not in [b.lower().strip() for b in rule.brand_list.split(',')]:
-                continue
-        
-        # Check Price
-        if rule.max_price is not None and product.price > rule.max_price:
-            continue
-            
-        # Check Z-Score (Complex)
-        if rule.min_z_score is not None:
-             # Need context stats
-             ph = db.query(PriceHistory).filter(PriceHistory.product_id == product.id).all() # This is only for this product
-             # We need stats for the SEARCH TERM usually
-             # Approximate with current price vs search config average?
-             # Let's use the scrape_and_save pre-calculated stats for now or skip if complex
-             pass 
-
-        # If we get here, Match!
-        send_telegram_alert(f"🚨 **ALERTA: {rule.name}**\n\n{product.title}\n{product.price}€\nURL: {product.url}")
-
-def scrape_and_save(db, config):
-    results = scrape_vinted(config)
-    new_count = 0
-    
-    # Get stats for Z-Score
-    # We look at all products for this search config to build a baseline
-    all_prices = [p.price for p in config.products]
-    hist_mean, hist_std = calculate_stats(all_prices)
-    
-    for item in results:
-        existing = db.query(Product).filter_by(url=item['url']).first()
-        
-        # Image
-        local_img = None
-        if item.get('image_url'):
-            temp_id = abs(hash(item['url'])) 
-            local_img = download_image_as_avif(item['image_url'], temp_id)
-            
-        p_obj = existing
-        if not existing:
-            new_product = Product(
-                search_config_id=config.id,
-                title=item.get('title'),
-                brand=item.get('brand'),
-                price=item.get('price'),
-                size=item.get('size'),
-                url=item.get('url'),
-                image_url=item.get('image_url'),
-                local_image_path=local_img
-            )
-            db.add(new_product)
-            db.commit()
-            p_obj = new_product
-            
-            # History
-            db.add(PriceHistory(product_id=p_obj.id, price=item.get('price')))
-            new_count += 1
-            
-            # CHECK ALERTS
-            check_global_alerts(db, p_obj)
-            
-            # AUTO-Z-SCORE ALERT (Legacy)
-            if hist_mean > 0:
-                 z_score = (item.get('price') - hist_mean) / (hist_std if hist_std > 0 else 1)
-                 if z_score < -1.5: # 1.5 Sigma event
-                     send_telegram_alert(f"📉 **Oportunidad Estadística (Z={z_score:.1f})**\n\n{item.get('title')}\n{item.get('price')}€ (Avg: {hist_mean:.1f}€)")
-
-        else:
-            # Price Update
-            if abs(existing.price - item.get('price')) > 0.5:
-                existing.price = item.get('price')
-                db.add(PriceHistory(product_id=existing.id, price=item.get('price')))
-                
-    config.last_run = datetime.utcnow()
-    db.commit()
-    return new_count
+    try:
+        return MARKET_QUERIES[name](db, *args)
+    finally:
+        db.close()
 
 # --- UI ---
 
 # Sidebar Navigation
-mode = st.sidebar.radio("Menú", ["📊 Dashboard", "📈 Análisis de Mercado", "🚨 Reglas y Alertas", "🛠️ Configuración", "🔍 Logs"])
+mode = st.sidebar.radio("Menú", ["📊 Dashboard", "📈 Análisis de Mercado", "🚨 Reglas y Alertas", "🛠️ Configuración", "⏱️ Métricas", "🔍 Logs"])
 
 if mode == "📊 Dashboard":
     st.header("Monitor de Oportunidades")
@@ -202,6 +85,8 @@ if mode == "📊 Dashboard":
             lim_pages = c3.number_input("Máx Páginas", 1, 50, 5, help="Cuántas páginas de Vinted recorrer.")
             lim_items = c4.number_input("Máx Items", 10, 1000, 100, help="Detener tras encontrar N items.")
             
+            fetch_label = st.selectbox("Modo de extracción", list(FETCH_MODES.keys()), help="API JSON es más rápido; si falla se usa el HTML automáticamente.")
+            
             if st.form_submit_button("Guardar"):
                 nc = SearchConfig(
                     term=term, 
@@ -209,7 +94,8 @@ if mode == "📊 Dashboard":
                     min_price=min_p, 
                     max_price=max_p if max_p > 0 else None,
                     max_pages=lim_pages,
-                    max_items=lim_items
+                    max_items=lim_items,
+                    fetch_mode=FETCH_MODES[fetch_label]
                 )
                 db.add(nc)
                 db.commit()
@@ -220,21 +106,55 @@ if mode == "📊 Dashboard":
     # Active
     st.subheader("Rastreadores")
     db = next(get_db())
+    
+    # Worker status
+    last_seen = worker_last_seen(db)
+    if last_seen is None or datetime.utcnow() - last_seen > timedelta(minutes=2):
+        st.warning("⚠️ El worker no está activo. Los escaneos quedarán en cola hasta que se inicie `python -m worker`.")
+    
+    active_jobs = {j.search_config_id: j for j in db.query(ScanJob).filter(ScanJob.kind == "scan", ScanJob.status.in_(["queued", "running"])).all()}
     configs = db.query(SearchConfig).all()
+    # Products seen by each search, including the ones another search stored first
+    linked = dict(db.query(ProductSearch.search_config_id, func.count()).group_by(ProductSearch.search_config_id).all())
     for c in configs:
         with st.container(border=True):
             cols = st.columns([5, 2, 1])
-            cols[0].markdown(f"**{c.term}** - {c.brand_name or 'Cualquier marca'} | 📄 {c.max_pages} pgs")
-            if cols[1].button("Escanear", key=f"s_{c.id}"):
-                with st.status(f"Escaneando {c.term}...", expanded=True) as status:
-                    status.write("Iniciando navegador...")
-                    n = scrape_and_save(db, c)
-                    status.update(label=f"Completado: {n} nuevos.", state="complete")
+            next_run = c.next_run_at.strftime('%d/%m %H:%M') if c.next_run_at else "pendiente"
+            cols[0].markdown(f"**{c.term}** - {c.brand_name or 'Cualquier marca'} | 📄 {c.max_pages} pgs | ⚙️ {c.fetch_mode or 'dom'}")
+            cols[0].caption(f"⏱️ Próximo: {next_run} UTC | {c.velocity or 0:.1f} nuevos/h | 🔗 {linked.get(c.id, 0)} productos")
+            if c.id in active_jobs:
+                cols[1].markdown(JOB_STATUS_LABELS[active_jobs[c.id].status])
+            elif cols[1].button("Escanear", key=f"s_{c.id}"):
+                enqueue_job(db, "scan", c.id)
+                st.toast(f"Escaneo de {c.term} en cola.")
+                st.rerun()
             if cols[2].button("🗑️", key=f"d_{c.id}"):
-                db.delete(c)
+                delete_search_config(db, c)
                 db.commit()
                 st.rerun()
     
+    # Job queue
+    with st.expander("🧵 Cola de trabajos"):
+        q1, q2, q3 = st.columns([2, 2, 1])
+        if q1.button("Escanear todo"):
+            enqueue_job(db, "scan_all")
+            st.rerun()
+        if q2.button("Comprobar vendidos"):
+            enqueue_job(db, "sold_check")
+            st.rerun()
+        if q3.button("🔄"): st.rerun()
+        jobs = db.query(ScanJob).order_by(ScanJob.id.desc()).limit(20).all()
+        if jobs:
+            st.dataframe(pd.DataFrame([{
+                "#": j.id,
+                "Tipo": j.kind,
+                "Búsqueda": j.search_config_id,
+                "Estado": JOB_STATUS_LABELS.get(j.status, j.status),
+                "Resultado": j.result,
+                "Creado": j.created_at,
+                "Fin": j.finished_at
+            } for j in jobs]), hide_index=True)
+    
     # Results
     st.divider()
     st.subheader("Últimos Hallazgos")
@@ -256,12 +176,26 @@ if mode == "📊 Dashboard":
             dt_start = datetime.strptime(target_batch, "%Y-%m-%d %H:%M")
             dt_end = dt_start + timedelta(minutes=1)
             
-            deleted = db.query(Product).filter(Product.scanned_at >= dt_start, Product.scanned_at < dt_end).delete()
+            in_batch = (Product.scanned_at >= dt_start, Product.scanned_at < dt_end)
+            batch_ids = select(Product.id).where(*in_batch)
+            db.query(ProductSearch).filter(ProductSearch.product_id.in_(batch_ids)).delete(synchronize_session=False)
+            db.query(PriceDaily).filter(PriceDaily.product_id.in_(batch_ids)).delete(synchronize_session=False)
+            deleted = db.query(Product).filter(*in_batch).delete()
+            bump_data_version(db)
             db.commit()
+            recompute_stats(db)
             st.success(f"Eliminados {deleted} productos del lote {target_batch}.")
             st.rerun()
 
-    prods = db.query(Product).order_by(Product.scanned_at.desc()).limit(150).all()
+    product_query = st.text_input("🔎 Buscar productos", placeholder="Título o marca, ej: nike air", help="Ordenados por relevancia; sin texto se muestran los últimos encontrados.")
+    if product_query.strip():
+        ids = search_products(db, product_query, limit=150)
+        by_id = {p.id: p for p in db.query(Product).filter(Product.id.in_(ids)).all()} if ids else {}
+        prods = [by_id[pid] for pid in ids if pid in by_id]
+        if not prods:
+            st.info("Sin resultados.")
+    else:
+        prods = db.query(Product).order_by(Product.scanned_at.desc()).limit(150).all()
     if prods:
         # Prepare for DataFrame
         data = []
@@ -283,47 +217,57 @@ elif mode == "📈 Análisis de Mercado":
     st.info("Analiza la evolución de precios y la distribución del mercado.")
     
     db = next(get_db())
-    # Load all price history
-    history = pd.read_sql(db.query(PriceHistory).statement, db.bind)
-    products = pd.read_sql(db.query(Product).statement, db.bind)
+    # Every query below is cached per filters until a scan commits new data
+    version = get_data_version(db)
+    db.close()
+    all_brands = market_query("list_brands", version)
     
-    if not history.empty:
-        full_df = pd.merge(history, products, left_on="product_id", right_on="id", suffixes=('_hist', '_prod'))
-        
+    if all_brands:
         # FILTERS
         st.subheader("Filtros")
         f_c1, f_c2 = st.columns(2)
-        all_brands = sorted(full_df['brand'].astype(str).unique())
-        sel_brand = f_c1.multiselect("Filtrar Marca", all_brands)
-        sel_term = f_c2.text_input("Filtrar en Título")
-        
-        filtered_df = full_df.copy()
-        if sel_brand:
-            filtered_df = filtered_df[filtered_df['brand'].isin(sel_brand)]
-        if sel_term:
-            filtered_df = filtered_df[filtered_df['title'].str.contains(sel_term, case=False, na=False)]
+        sel_brand = tuple(sorted(f_c1.multiselect("Filtrar Marca", all_brands)))
+        sel_term = f_c2.text_input("Filtrar en Título").strip()
+        records, n_titles = market_query("summary", version, sel_brand, sel_term)
             
-        # 1. Price Matrix
-        st.subheader(f"Matriz de Evolución ({len(filtered_df)} registros)")
-        pivot = filtered_df.pivot_table(index='title', columns=pd.to_datetime(filtered_df['timestamp']).dt.date, values='price_hist', aggfunc='last')
+        # 1. Price Matrix (one page of titles at a time)
+        st.subheader(f"Matriz de Evolución ({records} registros)")
+        n_pages = max(1, -(-n_titles // MATRIX_PAGE_SIZE))
+        page = st.number_input(f"Página (de {n_pages}, {MATRIX_PAGE_SIZE} títulos por página)", 1, n_pages, 1) - 1
+        pivot = market_query("price_matrix", version, sel_brand, sel_term, page)
         st.dataframe(pivot)
         
-        # Export
-        if st.button("Descargar Excel"):
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                pivot.to_excel(writer, sheet_name='Matriz')
-                filtered_df.to_excel(writer, sheet_name='RawData')
-            st.download_button("📥 Descargar .xlsx", output.getvalue(), "vinted_analisis.xlsx")
+        # Export (streamed from SQL to a file, whatever the size)
+        e1, e2 = st.columns([2, 1])
+        export_label = e1.selectbox("Formato de exportación", list(EXPORT_FORMATS.keys()), help="Excel incluye la matriz y los datos; CSV y Parquet, el historial de precios.")
+        if e2.button("Exportar"):
+            fmt = EXPORT_FORMATS[export_label]
+            bar = st.progress(0.0, text="Exportando...")
+            
+            def show_progress(done, total):
+                bar.progress(min(1.0, done / total) if total else 1.0, text=f"Exportando... {done}/{total} filas")
+            
+            db = next(get_db())
+            try:
+                path, rows = export_market_data(db, fmt, sel_brand, sel_term, show_progress)
+            except ImportError as e:
+                st.error(f"Falta una dependencia para este formato: {e}")
+            else:
+                # Served from disk by the static file route, not loaded into memory
+                url = export_url(path)
+                if url:
+                    st.markdown(f'<a href="{url}" download="{os.path.basename(path)}">📥 Descargar .{fmt} ({rows} filas)</a>', unsafe_allow_html=True)
+                else:
+                    st.warning(f"El archivo ({rows} filas) supera el tamaño que sirve Streamlit; está en el servidor en `{path}`. Filtra por marca o título para reducirlo.")
+            finally:
+                db.close()
             
         # 2. Stats
-        st.subheader("Estadísticas de Mercado (Box Plot)")
-        if 'brand' in filtered_df.columns:
-            st.bar_chart(filtered_df.groupby('brand')['price_prod'].mean())
+        st.subheader("Estadísticas de Mercado (precio medio diario por marca)")
+        st.bar_chart(market_query("brand_means", version, sel_brand, sel_term))
             
     else:
         st.warning("No hay suficiente historial de precios.")
-    db.close()
 
 elif mode == "🚨 Reglas y Alertas":
     st.header("Motor de Alertas")
@@ -333,11 +277,22 @@ elif mode == "🚨 Reglas y Alertas":
         name = st.text_input("Nombre de la Regla", placeholder="Ej: Gangas Nike")
         brands = st.text_input("Marcas (separadas por coma)", placeholder="Nike, Adidas")
         max_p = st.number_input("Precio Máximo", 0.0)
+        r1, r2 = st.columns(2)
+        min_disc = r1.number_input("Descuento mínimo vs media (%)", 0.0, 100.0, 0.0, help="0 = sin filtro")
+        use_z = r2.checkbox("Filtrar por Z-Score")
+        max_z = r2.number_input("Z-Score máximo", -5.0, 0.0, -1.5, step=0.1)
         
         if st.form_submit_button("Crear Regla"):
             db = next(get_db())
-            db.add(AlertRule(name=name, brand_list=brands, max_price=max_p if max_p > 0 else None))
+            db.add(AlertRule(
+                name=name,
+                brand_list=brands,
+                max_price=max_p if max_p > 0 else None,
+                min_discount_percent=min_disc if min_disc > 0 else None,
+                min_z_score=max_z if use_z else None
+            ))
             db.commit()
+            invalidate_alert_rules(db)
             st.success("Regla creada.")
             db.close()
             
@@ -347,10 +302,14 @@ elif mode == "🚨 Reglas y Alertas":
     for r in rules:
         with st.container(border=True):
             c1, c2 = st.columns([5, 1])
-            c1.markdown(f"**{r.name}** | Marcas: {r.brand_list} | Max: {r.max_price}€")
+            extra = ""
+            if r.min_discount_percent is not None: extra += f" | Desc: {r.min_discount_percent:.0f}%"
+            if r.min_z_score is not None: extra += f" | Z ≤ {r.min_z_score}"
+            c1.markdown(f"**{r.name}** | Marcas: {r.brand_list} | Max: {r.max_price}€{extra}")
             if c2.button("Borrar", key=f"rd_{r.id}"):
                 db.delete(r)
                 db.commit()
+                invalidate_alert_rules(db)
                 st.rerun()
     db.close()
 
@@ -362,20 +321,95 @@ elif mode == "🛠️ Configuración":
         db = next(get_db())
         current_token = db.query(Config).filter_by(key="telegram_token").first()
         current_chat = db.query(Config).filter_by(key="telegram_chat_id").first()
+        current_digest = db.query(Config).filter_by(key="telegram_digest").first()
         
         with st.form("tg"):
             tk = st.text_input("Token", value=current_token.value if current_token else "")
             cid = st.text_input("Chat ID", value=current_chat.value if current_chat else "")
+            dg = st.checkbox("Modo resumen (agrupar las alertas de cada escaneo)", value=bool(current_digest and current_digest.value == "1"))
             if st.form_submit_button("Guardar"):
                 # Upsert logic simplified
                 if not current_token: db.add(Config(key="telegram_token", value=tk))
                 else: current_token.value = tk
                 if not current_chat: db.add(Config(key="telegram_chat_id", value=cid))
                 else: current_chat.value = cid
+                if not current_digest: db.add(Config(key="telegram_digest", value="1" if dg else "0"))
+                else: current_digest.value = "1" if dg else "0"
                 db.commit()
+                # The worker sends the messages; the version bump reaches it with its next one
+                invalidate_telegram_settings(db)
                 st.toast("Guardado")
         db.close()
 
+    # Scan execution
+    with st.expander("⚙️ Escaneo"):
+        db = next(get_db())
+        current_workers = db.query(Config).filter_by(key=SCAN_WORKERS_KEY).first()
+        base_h, min_h, max_h = read_budget(db)
+        with st.form("scan_settings"):
+            workers = st.number_input("Navegadores en paralelo", 1, MAX_SCAN_WORKERS, min(MAX_SCAN_WORKERS, int(current_workers.value)) if current_workers else DEFAULT_SCAN_WORKERS, help=f"Búsquedas escaneadas a la vez en cada ciclo programado (máximo {MAX_SCAN_WORKERS}). También fija cuántas páginas de Vinted se abren a la vez.")
+            st.markdown("Cada búsqueda se escanea según los anuncios nuevos que recibe: las más activas más a menudo, con el mismo total de escaneos que un intervalo fijo.")
+            s1, s2, s3 = st.columns(3)
+            interval = s1.number_input("Intervalo medio (h)", 1, 168, int(base_h))
+            min_interval = s2.number_input("Mínimo (min)", 5, 1440, int(round(min_h * 60)))
+            max_interval = s3.number_input("Máximo (h)", 1, 336, int(max_h))
+            cache_ttl = st.number_input("Reutilizar resultados durante (min)", 0, 1440, int(read_cache_ttl(db)), help="Búsquedas con la misma URL normalizada usan la descarga anterior durante este tiempo. 0 = sin caché.")
+            politeness = get_politeness()
+            p1, p2 = st.columns(2)
+            pol_min = p1.number_input("Pausa entre páginas mín. (s)", 0.0, 30.0, float(politeness.min_s), step=0.5)
+            pol_max = p2.number_input("Pausa entre páginas máx. (s)", 0.0, 30.0, float(politeness.max_s), step=0.5, help="Espera aleatoria tras cargar cada página, además de esperar a que esté lista. 0 = sin pausa.")
+            st.markdown("**Comprobación de vendidos** (HTTP primero, navegador solo si la respuesta es dudosa)")
+            sold_settings = read_sold_check_settings(db)
+            v1, v2, v3, v4 = st.columns(4)
+            sold_budget = v1.number_input("Productos por ronda", 100, 50000, sold_settings["sold_check_budget"], step=100)
+            sold_conc = v2.number_input("Peticiones simultáneas", 1, 64, sold_settings["sold_check_concurrency"])
+            sold_rate = v3.number_input("Peticiones/s", 0.5, 100.0, float(sold_settings["sold_check_rate"]), step=0.5)
+            sold_fallback = v4.number_input("Máx. con navegador", 0, 1000, sold_settings["sold_check_fallback"])
+            if st.form_submit_button("Guardar"):
+                values = {SCAN_WORKERS_KEY: workers, "scheduler_interval": interval, "scheduler_min_interval": min_interval, "scheduler_max_interval": max_interval, "scan_cache_ttl_min": cache_ttl,
+                          "politeness_min_s": pol_min, "politeness_max_s": max(pol_min, pol_max),
+                          "sold_check_budget": sold_budget, "sold_check_concurrency": sold_conc, "sold_check_rate": sold_rate, "sold_check_fallback": sold_fallback}
+                for key, value in values.items():
+                    row = db.query(Config).filter_by(key=key).first()
+                    if not row: db.add(Config(key=key, value=str(value)))
+                    else: row.value = str(value)
+                db.commit()
+                invalidate_politeness()
+                st.toast("Guardado")
+        db.close()
+
+    # Network filtering
+    with st.expander("🌐 Red del Navegador"):
+        db = next(get_db())
+        net_values = {c.key: c for c in db.query(Config).filter(Config.key.in_(["net_filter", "net_block_types", "net_allow_patterns"])).all()}
+        current_types = net_values["net_block_types"].value.split(",") if "net_block_types" in net_values else list(DEFAULT_BLOCK_TYPES)
+        with st.form("net_settings"):
+            st.markdown("El scraper solo lee texto y URLs, así que imágenes, fuentes y analítica de terceros se bloquean. Desactiva o añade excepciones para depurar.")
+            net_on = st.checkbox("Filtrar peticiones", value=net_values["net_filter"].value != "0" if "net_filter" in net_values else True)
+            block_types = st.multiselect("Tipos bloqueados", RESOURCE_TYPES, default=[t for t in current_types if t in RESOURCE_TYPES])
+            allow = st.text_area("Permitir siempre (una URL o regex por línea)", help="Las URLs sin caracteres especiales se comparan literalmente.", value=net_values["net_allow_patterns"].value if "net_allow_patterns" in net_values else "")
+            if st.form_submit_button("Guardar"):
+                invalid = invalid_patterns(allow.splitlines())
+                if invalid:
+                    st.error("Patrones inválidos (no se ha guardado): " + "; ".join(f"`{line}`: {err}" for line, err in invalid))
+                else:
+                    new_values = {"net_filter": "1" if net_on else "0", "net_block_types": ",".join(block_types), "net_allow_patterns": allow}
+                    for key, value in new_values.items():
+                        if key in net_values: net_values[key].value = value
+                        else: db.add(Config(key=key, value=value))
+                    db.commit()
+                    st.toast("Guardado (se aplica en el próximo trabajo)")
+        db.close()
+
+    # Price stats
+    with st.expander("📐 Estadísticas de Precio"):
+        st.markdown("Las medias por búsqueda se actualizan en cada escaneo. Recalcula si has borrado productos a mano.")
+        if st.button("Recalcular desde cero"):
+            db = next(get_db())
+            n = recompute_stats(db)
+            st.success(f"Estadísticas recalculadas para {n} búsquedas.")
+            db.close()
+
     # Brand Sync
     with st.expander("🏷️ Marcas Vinted"):
         st.markdown("Sincroniza marcas populares para tener el autocompletado.")
@@ -393,28 +427,77 @@ elif mode == "🛠️ Configuración":
             st.success(f"Importadas {count} marcas nuevas.")
             db.close()
 
+elif mode == "⏱️ Métricas":
+    st.header("Tiempos por Fase")
+    st.info("Duraciones registradas por el worker (navegación, espera, extracción, guardado, alertas...).")
+    
+    m1, m2 = st.columns(2)
+    window = m1.selectbox("Periodo", ["Última hora", "Últimas 24h", "Últimos 7 días"], index=1)
+    since = datetime.utcnow() - {"Última hora": timedelta(hours=1), "Últimas 24h": timedelta(days=1), "Últimos 7 días": timedelta(days=7)}[window]
+    db = next(get_db())
+    configs = {c.id: c.term for c in db.query(SearchConfig.id, SearchConfig.term).all()}
+    sel_config = m2.selectbox("Búsqueda", [None] + list(configs), format_func=lambda cid: "Todas" if cid is None else f"{configs[cid]} (#{cid})")
+    
+    q = db.query(MetricSample.phase, MetricSample.duration_ms, MetricSample.ok).filter(MetricSample.timestamp >= since)
+    if sel_config is not None:
+        q = q.filter(MetricSample.search_config_id == sel_config)
+    samples = pd.read_sql(q.statement, db.bind)
+    db.close()
+    
+    if samples.empty:
+        st.warning("Sin muestras en este periodo.")
+    else:
+        grouped = samples.groupby("phase")
+        summary = pd.DataFrame({
+            "Muestras": grouped.size(),
+            "p50 (ms)": grouped["duration_ms"].quantile(0.5),
+            "p95 (ms)": grouped["duration_ms"].quantile(0.95),
+            "Máx (ms)": grouped["duration_ms"].max(),
+            "Total (s)": grouped["duration_ms"].sum() / 1000,
+            "Errores": grouped["ok"].apply(lambda s: int((s == 0).sum())),
+        }).round(1)
+        st.dataframe(summary, use_container_width=True)
+        st.bar_chart(summary[["p50 (ms)", "p95 (ms)"]])
+
 elif mode == "🔍 Logs":
     st.header("Consola de Sistema")
     st.info("Visualiza los logs en tiempo real (similar a CMD).")
     
-    col1, col2 = st.columns([8, 2])
+    col1, col2, col3 = st.columns([6, 2, 2])
     limit = col2.number_input("Mostrar", 10, 500, 100)
+    show_live = col3.checkbox("Incluir en memoria", value=True, help="Líneas del worker y de esta app aún no guardadas en la base de datos.")
     if col1.button("🔄 Actualizar Consola"): st.rerun()
     
+    # Read before the DB: a line flushed in between shows up twice (filtered below), never zero times
+    pending = []
+    if show_live:
+        worker_lines = fetch_worker_pending_lines()
+        if worker_lines is None:
+            st.caption("No se pudo leer el buffer del worker (endpoint de métricas desactivado o inaccesible, ver WORKER_LOGS_URL).")
+        pending = (worker_lines or []) + (get_db_log_handler().pending_lines() if get_db_log_handler() else [])
+    
     db = next(get_db())
     logs = db.query(ScraperLog).order_by(ScraperLog.timestamp.desc()).limit(limit).all()
+    stored = {(l.timestamp, l.level, l.message) for l in logs}
     
-    if logs:
+    # Unflushed lines (newest first)
+    log_lines = []
+    for row in sorted(pending, key=lambda r: r['timestamp'], reverse=True):
+        if (row['timestamp'], row['level'], row['message']) in stored:
+            continue
+        ts = row['timestamp'].strftime('%Y-%m-%d %H:%M:%S')
+        log_lines.append(f"{ts} - {row['level']} - {row['message']}  (pendiente)")
+    
+    for l in logs:
+        # Reconstruct the format requested: 2026-01-17 16:24:15,170 - INFO - Message
+        # We don't have ms in DB by default, but we can simulate/show timestamp
+        ts = l.timestamp.strftime('%Y-%m-%d %H:%M:%S')
+        line = f"{ts} - {l.level} - {l.message}"
+        log_lines.append(line)
+    
+    if log_lines:
         # Format logs as a single string block
-        log_lines = []
-        for l in logs:
-            # Reconstruct the format requested: 2026-01-17 16:24:15,170 - INFO - Message
-            # We don't have ms in DB by default, but we can simulate/show timestamp
-            ts = l.timestamp.strftime('%Y-%m-%d %H:%M:%S')
-            line = f"{ts} - {l.level} - {l.message}"
-            log_lines.append(line)
-        
-        st.code("\n".join(log_lines), language="bash")
+        st.code("\n".join(log_lines[:limit]), language="bash")
     else:
         st.write("No hay logs registrados.")
     db.close()
@@ -0,0 +1,78 @@
+"""
+Scheduled-scan cycle wall time vs number of scan workers.
+
+Starts the local fixture server, points the scraper and the database at it
+and a temporary directory, creates N search configs and runs
+jobs.run_scheduled_scans with 1, 2, 4 and 8 workers (fresh DB each time).
+Needs Playwright's Chromium installed.
+
+Usage: python benchmarks/bench_concurrency.py [--configs 12] [--latency-ms 50] [--workers 1 2 4 8]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import start_fixture_server
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--configs", type=int, default=12)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--latency-ms", type=int, default=50)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--domain-cap", type=int, default=None, help="Páginas a la vez en el servidor local (por defecto, igual a workers)")
+    args = parser.parse_args()
+
+    server, base_url = start_fixture_server(latency_ms=args.latency_ms)
+    # Must be set before the app modules are imported
+    os.environ["VINTED_HOST"] = base_url
+    os.environ["VINTED_DATA_DIR"] = tempfile.mkdtemp(prefix="vinted-bench-")
+
+    from urllib.parse import urlsplit
+    from database import init_db, SessionLocal, Config, SearchConfig, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats
+    from scan_cache import get_scan_cache
+    import scraper
+    import jobs
+    from browser_pool import set_max_open_contexts
+
+    init_db()
+    host = urlsplit(base_url).netloc
+    # Every run must scrape: the same searches would otherwise be served from the scan cache
+    db = SessionLocal()
+    db.merge(Config(key="scan_cache_ttl_min", value="0"))
+    db.commit()
+    db.close()
+
+    print(f"{args.configs} búsquedas x {args.pages} páginas, latencia {args.latency_ms} ms, límite por dominio {args.domain_cap or 'workers'}")
+    print(f"{'workers':>8} | {'wall s':>8} | {'nuevos':>7} | {'speedup':>7}")
+    baseline = None
+    for workers in args.workers:
+        db = SessionLocal()
+        for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+            db.query(model).delete()
+        for i in range(args.configs):
+            db.add(SearchConfig(term=f"bench {i}", max_pages=args.pages, max_items=args.pages * 96))
+        db.commit()
+        db.close()
+        get_scan_cache().clear()
+
+        # Same caps the worker derives from scan_workers, unless --domain-cap overrides
+        set_max_open_contexts(workers + 1)
+        scraper.set_domain_concurrency(host, args.domain_cap or workers)
+        t0 = time.perf_counter()
+        new = jobs.run_scheduled_scans(workers=workers)
+        wall = time.perf_counter() - t0
+        baseline = baseline or wall
+        print(f"{workers:>8} | {wall:>8.1f} | {new:>7} | {baseline / wall:>6.2f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
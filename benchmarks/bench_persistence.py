@@ -0,0 +1,109 @@
+"""
+Per-row vs batched persistence of scan results.
+
+Runs both paths on a throw-away SQLite file for 100, 1,000 and 10,000 items:
+a first pass where every item is new, then a rescan where 10% of the prices
+changed. Images and alerts are left out; only the DB work is timed.
+
+Usage: python benchmarks/bench_persistence.py [sizes...]
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base, SearchConfig, Product, PriceHistory
+from persistence import save_scan_results
+
+
+def legacy_save(db, config, results):
+    """The old scrape_and_save loop: one lookup per URL, one commit per new product."""
+    new_count = 0
+    for item in results:
+        existing = db.query(Product).filter_by(url=item['url']).first()
+        if not existing:
+            p = Product(search_config_id=config.id, title=item['title'], brand=item['brand'],
+                        price=item['price'], size=item['size'], url=item['url'], image_url=item['image_url'])
+            db.add(p)
+            db.commit()
+            db.add(PriceHistory(product_id=p.id, price=item['price']))
+            new_count += 1
+        elif abs(existing.price - item['price']) > 0.5:
+            existing.price = item['price']
+            db.add(PriceHistory(product_id=existing.id, price=item['price']))
+    db.commit()
+    return new_count
+
+
+def batch_save(db, config, results):
+    new_products, _, _ = save_scan_results(db, config, results)
+    db.commit()
+    return len(new_products)
+
+
+def make_results(n, seed=0):
+    rnd = random.Random(seed)
+    return [{
+        'title': f"Producto {i}",
+        'price': round(rnd.uniform(5, 80), 2),
+        'url': f"https://www.vinted.es/items/{1000000 + i}-producto",
+        'image_url': None,
+        'brand': rnd.choice(["Nike", "Adidas", "Zara", "Levi's"]),
+        'size': "M",
+    } for i in range(n)]
+
+
+def reprice(results, fraction=0.1, seed=1):
+    rnd = random.Random(seed)
+    out = [dict(r) for r in results]
+    for r in rnd.sample(out, int(len(out) * fraction)):
+        r['price'] = round(r['price'] + 5, 2)
+    return out
+
+
+def run(save_fn, n):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    engine = create_engine(f"sqlite:///{path}")
+    try:
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+        db = Session()
+        config = SearchConfig(term="bench")
+        db.add(config)
+        db.commit()
+
+        first = make_results(n)
+        t0 = time.perf_counter()
+        new_count = save_fn(db, config, first)
+        t_insert = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        save_fn(db, config, reprice(first))
+        t_rescan = time.perf_counter() - t0
+
+        assert new_count == n, (save_fn.__name__, new_count, n)
+        assert db.query(PriceHistory).count() == n + int(n * 0.1)
+        db.close()
+        return t_insert, t_rescan
+    finally:
+        engine.dispose()
+        os.remove(path)
+
+
+def main(sizes):
+    print(f"{'items':>8} | {'path':>7} | {'insert s':>9} | {'rescan s':>9} | {'items/s':>9}")
+    for n in sizes:
+        for name, fn in (("legacy", legacy_save), ("batch", batch_save)):
+            t_insert, t_rescan = run(fn, n)
+            print(f"{n:>8} | {name:>7} | {t_insert:>9.3f} | {t_rescan:>9.3f} | {n / t_insert:>9.0f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [100, 1000, 10000])
@@ -0,0 +1,329 @@
+"""
+Offline scraper benchmark against the local fixture server.
+
+Starts benchmarks/fixture_server.py, points VINTED_HOST (and so BASE_URL,
+the item and brand API URLs) and the database at it and a temporary
+directory, then measures:
+
+    scrape_dom / scrape_api   iter_scrape_vinted, per page and time to first page
+    scrape_and_save           full scan with persistence, images and alerts
+    verify_sold_status        browser sold check, per product
+    sold_check_http           SoldChecker HTTP fast path, per product
+    fetch_vinted_brands       per call
+
+Each phase reports items/s, pages/s, latency percentiles and peak RSS
+(this process; Chromium's tree too when psutil is installed). Results are
+written as JSON so two commits can be compared:
+
+    python benchmarks/bench_scraper.py --out before.json
+    python benchmarks/bench_scraper.py --out after.json
+    python benchmarks/bench_scraper.py --compare before.json after.json
+
+Browser phases need Playwright's Chromium; they are marked as skipped
+when it cannot be launched.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fixture_server import start_fixture_server, PER_PAGE
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Lower is better for these; everything else is a throughput
+LATENCY_KEYS = ("wall_s", "first_page_s", "p50_ms", "p95_ms", "max_ms", "peak_rss_mb")
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _self_rss_mb():
+    if resource is None:
+        return 0.0
+    # ru_maxrss is KB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+class RssSampler:
+    """Peak RSS of this process and its children (Chromium), sampled every 50 ms."""
+
+    def __init__(self):
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if psutil is not None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        me = psutil.Process()
+        while not self._stop.is_set():
+            try:
+                total = me.memory_info().rss
+                for child in me.children(recursive=True):
+                    try:
+                        total += child.memory_info().rss
+                    except psutil.Error:
+                        pass
+                self.peak_mb = max(self.peak_mb, total / (1024 * 1024))
+            except psutil.Error:
+                pass
+            self._stop.wait(0.05)
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if psutil is None:
+            self.peak_mb = _self_rss_mb()
+
+
+def phase_result(wall_s, latencies_s, items=0, pages=0, rss=None, **extra):
+    result = {
+        "wall_s": round(wall_s, 3),
+        "items": items,
+        "pages": pages,
+        "items_per_s": round(items / wall_s, 2) if wall_s else None,
+        "pages_per_s": round(pages / wall_s, 2) if wall_s else None,
+        "p50_ms": round(_percentile(latencies_s, 0.5) * 1000, 1) if latencies_s else None,
+        "p95_ms": round(_percentile(latencies_s, 0.95) * 1000, 1) if latencies_s else None,
+        "max_ms": round(max(latencies_s) * 1000, 1) if latencies_s else None,
+        "peak_rss_mb": round(rss.peak_mb, 1) if rss else None,
+    }
+    result.update(extra)
+    return result
+
+
+def bench_stream(config):
+    """Per-page latency of iter_scrape_vinted."""
+    from scraper import iter_scrape_vinted
+    latencies, items = [], 0
+    with RssSampler() as rss:
+        start = last = time.perf_counter()
+        for batch in iter_scrape_vinted(config):
+            now = time.perf_counter()
+            latencies.append(now - last)
+            last = now
+            items += len(batch)
+        wall = time.perf_counter() - start
+    return phase_result(wall, latencies, items, len(latencies), rss,
+                        first_page_s=round(latencies[0], 3) if latencies else None)
+
+
+def bench_scrape_and_save(config_id):
+    import jobs
+    from database import SessionLocal, SearchConfig
+
+    save_times = []
+    original = jobs._save_batch
+
+    def timed_save(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            save_times.append(time.perf_counter() - t0)
+
+    jobs._save_batch = timed_save
+    db = SessionLocal()
+    try:
+        with RssSampler() as rss:
+            start = time.perf_counter()
+            new = jobs.scrape_and_save(db, db.get(SearchConfig, config_id))
+            wall = time.perf_counter() - start
+    finally:
+        jobs._save_batch = original
+        db.close()
+    return phase_result(wall, save_times, new, len(save_times), rss,
+                        persist_total_s=round(sum(save_times), 3))
+
+
+def bench_verify(urls):
+    from scraper import verify_sold_status, browser_job
+    latencies = []
+    with RssSampler() as rss, browser_job("Benchmark vendidos"):
+        start = time.perf_counter()
+        for url in urls:
+            t0 = time.perf_counter()
+            verify_sold_status(url)
+            latencies.append(time.perf_counter() - t0)
+        wall = time.perf_counter() - start
+    return phase_result(wall, latencies, len(urls), len(urls), rss)
+
+
+def bench_sold_http(urls, concurrency):
+    from sold_check import SoldChecker
+    checker = SoldChecker(concurrency=concurrency, rate=1000, fallback_budget=0)
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        statuses = checker.check(urls)
+        wall = time.perf_counter() - start
+    resolved = sum(1 for s in statuses.values() if s in ("sold", "active", "deleted"))
+    return phase_result(wall, [], len(urls), checker.http_requests, rss, resolved=resolved)
+
+
+def bench_brands(calls):
+    from scraper import fetch_vinted_brands
+    latencies, found = [], 0
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        for keyword in ["nike", "a", "zara"][:calls]:
+            t0 = time.perf_counter()
+            found += len(fetch_vinted_brands(keyword))
+            latencies.append(time.perf_counter() - t0)
+        wall = time.perf_counter() - start
+    return phase_result(wall, latencies, found, calls, rss)
+
+
+def chromium_available():
+    from browser_pool import lease_page
+    try:
+        with lease_page("Benchmark"):
+            return True, None
+    except Exception as e:
+        return False, str(e).splitlines()[0]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except Exception:
+        return None
+
+
+def run(args):
+    server, base_url = start_fixture_server(latency_ms=args.latency_ms)
+    # Must be set before the app modules are imported
+    os.environ["VINTED_HOST"] = base_url
+    os.environ["VINTED_DATA_DIR"] = tempfile.mkdtemp(prefix="vinted-bench-")
+
+    from database import init_db, SessionLocal, SearchConfig, Config
+
+    init_db()
+    db = SessionLocal()
+    # No jitter: measure readiness, not politeness
+    db.add_all([Config(key="politeness_min_s", value="0"), Config(key="politeness_max_s", value="0")])
+    dom = SearchConfig(term="bench dom", max_pages=args.pages, max_items=args.pages * PER_PAGE, fetch_mode="dom")
+    api = SearchConfig(term="bench api", max_pages=args.pages, max_items=args.pages * PER_PAGE, fetch_mode="api")
+    saved = SearchConfig(term="bench save", max_pages=args.pages, max_items=args.pages * PER_PAGE, fetch_mode="dom")
+    db.add_all([dom, api, saved])
+    db.commit()
+    item_urls = [f"{base_url}/items/{8_000_000 + i}-bench" for i in range(args.sold)]
+
+    report = {
+        "revision": git_revision(),
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "settings": {"pages": args.pages, "latency_ms": args.latency_ms, "sold": args.sold},
+        "phases": {},
+    }
+    phases = report["phases"]
+
+    phases["sold_check_http"] = bench_sold_http(item_urls, args.concurrency)
+
+    ok, reason = chromium_available()
+    if ok:
+        phases["scrape_dom"] = bench_stream(dom)
+        phases["scrape_api"] = bench_stream(api)
+        phases["scrape_and_save"] = bench_scrape_and_save(saved.id)
+        phases["verify_sold_status"] = bench_verify(item_urls[:args.browser_sold])
+        phases["fetch_vinted_brands"] = bench_brands(3)
+    else:
+        for name in ("scrape_dom", "scrape_api", "scrape_and_save", "verify_sold_status", "fetch_vinted_brands"):
+            phases[name] = {"skipped": f"Chromium no disponible: {reason}"}
+    db.close()
+
+    from images import get_image_pipeline
+    get_image_pipeline().shutdown(wait=False)
+    server.shutdown()
+    return report
+
+
+def print_report(report):
+    print(f"Revisión {report.get('revision')} | {report['settings']}")
+    print(f"{'fase':<22} | {'wall s':>7} | {'items/s':>8} | {'pág/s':>6} | {'p50 ms':>7} | {'p95 ms':>7} | {'RSS MB':>7}")
+    for name, r in report["phases"].items():
+        if "skipped" in r:
+            print(f"{name:<22} | {r['skipped']}")
+            continue
+        cells = [r.get(k) for k in ("wall_s", "items_per_s", "pages_per_s", "p50_ms", "p95_ms", "peak_rss_mb")]
+        print(f"{name:<22} | " + " | ".join(f"{'-' if v is None else v:>{w}}" for v, w in zip(cells, (7, 8, 6, 7, 7, 7))))
+
+
+def compare(old_path, new_path, threshold):
+    """Prints per-metric deltas; returns 1 if any metric regressed more than `threshold`."""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"{old.get('revision')} -> {new.get('revision')}")
+    regressed = False
+    for name, new_r in new["phases"].items():
+        old_r = old["phases"].get(name)
+        if not old_r or "skipped" in old_r or "skipped" in new_r:
+            continue
+        for key in ("wall_s", "first_page_s", "items_per_s", "pages_per_s", "p50_ms", "p95_ms", "peak_rss_mb"):
+            a, b = old_r.get(key), new_r.get(key)
+            if not a or b is None:
+                continue
+            change = (b - a) / a
+            worse = change > threshold if key in LATENCY_KEYS else change < -threshold
+            regressed |= worse
+            print(f"{name:<22} {key:<13} {a:>10} -> {b:<10} {change:+.1%}{'  ⚠️' if worse else ''}")
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--latency-ms", type=int, default=30, help="Latencia añadida por el servidor a cada respuesta")
+    parser.add_argument("--sold", type=int, default=200, help="Productos para la comprobación HTTP")
+    parser.add_argument("--browser-sold", type=int, default=20, help="Productos para verify_sold_status")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--out", help="Ruta del JSON de resultados")
+    parser.add_argument("--compare", nargs=2, metavar=("ANTES", "DESPUES"))
+    parser.add_argument("--threshold", type=float, default=0.10, help="Cambio relativo que cuenta como regresión")
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(compare(*args.compare, args.threshold))
+
+    report = run(args)
+    print_report(report)
+    out = args.out or os.path.join(os.path.dirname(os.path.abspath(__file__)), "results",
+                                   f"{report['created_at'].replace(':', '')}-{report.get('revision') or 'local'}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Resultados guardados en {out}")
+
+
+if __name__ == "__main__":
+    main()
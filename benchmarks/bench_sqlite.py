@@ -0,0 +1,159 @@
+"""
+Query latency before/after the SQLite profile (pragmas + indexes).
+
+Builds a throw-away database with N products (default 1,000,000), one
+PriceHistory row per product and 200k log lines, then times the queries the
+dashboard, sold checker and Logs page run: first on a plain connection
+without the indexes, then with `apply_sqlite_pragmas` and `create_indexes`
+from database.py. Title search is timed as a LIKE scan and through the
+FTS5 index (`create_fts`).
+
+Usage: python benchmarks/bench_sqlite.py [n_products]
+"""
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, event, text
+
+from database import Base, INDEXES, apply_sqlite_pragmas, create_indexes, create_fts
+from product_search import fts_query, SEARCH_SQL, RANK_POOL
+
+N_CONFIGS = 30
+N_LOGS = 200_000
+TITLE_WORDS = ("zapatillas", "chaqueta", "vaquera", "camiseta", "vintage", "air", "max", "sudadera",
+               "abrigo", "lana", "cuero", "negro", "blanca", "running", "retro", "oversize")
+TITLE_SEARCHES = ("chaqueta vaquera", "air max", "sudadera retro", "cuero negro", "lana")
+
+QUERIES = {
+    "dashboard_latest": ("SELECT * FROM products ORDER BY scanned_at DESC LIMIT 150", None),
+    "batch_dates": ("SELECT DISTINCT scanned_at FROM products ORDER BY scanned_at DESC LIMIT 20", None),
+    "sold_check": ("SELECT * FROM products WHERE is_sold = 0 ORDER BY scanned_at DESC LIMIT 100", None),
+    "config_prices": ("SELECT price FROM products WHERE search_config_id = :cid", "cid"),
+    "product_history": ("SELECT * FROM price_history WHERE product_id = :pid", "pid"),
+    "logs_page": ("SELECT * FROM scraper_logs ORDER BY timestamp DESC LIMIT 100", None),
+}
+
+
+def build(path, n_products):
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    engine.dispose()
+
+    rnd = random.Random(0)
+    start = datetime(2025, 1, 1)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    for name, _, _ in INDEXES:
+        conn.execute(f"DROP INDEX IF EXISTS {name}")
+    conn.executemany("INSERT INTO search_configs (id, term) VALUES (?, ?)",
+                     [(i, f"term {i}") for i in range(1, N_CONFIGS + 1)])
+
+    chunk = 100_000
+    for base in range(0, n_products, chunk):
+        rows = []
+        for i in range(base + 1, min(base + chunk, n_products) + 1):
+            ts = start + timedelta(seconds=rnd.randint(0, 365 * 86400))
+            title = " ".join(rnd.sample(TITLE_WORDS, 3)) + f" {i}"
+            rows.append((i, rnd.randint(1, N_CONFIGS), title, "Nike", rnd.uniform(5, 90), "M",
+                         f"https://www.vinted.es/items/{i}", int(rnd.random() < 0.3), ts))
+        conn.executemany(
+            "INSERT INTO products (id, search_config_id, title, brand, price, size, url, is_sold, scanned_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        conn.executemany("INSERT INTO price_history (product_id, price, timestamp) VALUES (?, ?, ?)",
+                         [(r[0], r[4], r[8]) for r in rows])
+    conn.executemany("INSERT INTO scraper_logs (timestamp, level, message) VALUES (?, 'INFO', ?)",
+                     [(start + timedelta(seconds=i), f"log {i}") for i in range(N_LOGS)])
+    conn.commit()
+    conn.close()
+
+
+def time_queries(engine, n_products, repeats=5):
+    rnd = random.Random(1)
+    out = {}
+    with engine.connect() as conn:
+        for name, (sql, param) in QUERIES.items():
+            samples = []
+            for _ in range(repeats):
+                params = {}
+                if param == "cid":
+                    params = {"cid": rnd.randint(1, N_CONFIGS)}
+                elif param == "pid":
+                    params = {"pid": rnd.randint(1, n_products)}
+                t0 = time.perf_counter()
+                conn.execute(text(sql), params).fetchall()
+                samples.append(time.perf_counter() - t0)
+            out[name] = statistics.median(samples) * 1000
+
+        # Small write + commit, what every log line / scan step used to cost
+        samples = []
+        for i in range(50):
+            t0 = time.perf_counter()
+            conn.execute(text("INSERT INTO scraper_logs (timestamp, level, message) VALUES (:ts, 'INFO', 'bench')"),
+                         {"ts": datetime.utcnow()})
+            conn.commit()
+            samples.append(time.perf_counter() - t0)
+        out["single_commit"] = statistics.median(samples) * 1000
+    return out
+
+
+def time_title_search(engine, repeats=3):
+    """Median ms of a LIKE scan (every match, like the old str.contains) and of product_search's FTS5 query."""
+    like, fts = [], []
+    with engine.connect() as conn:
+        for term in TITLE_SEARCHES:
+            for _ in range(repeats):
+                t0 = time.perf_counter()
+                conn.execute(text("SELECT id FROM products WHERE title LIKE :q"), {"q": f"%{term}%"}).fetchall()
+                like.append(time.perf_counter() - t0)
+                t0 = time.perf_counter()
+                conn.execute(SEARCH_SQL, {"q": fts_query(term), "pool": RANK_POOL, "limit": 200}).fetchall()
+                fts.append(time.perf_counter() - t0)
+    return statistics.median(like) * 1000, statistics.median(fts) * 1000
+
+
+def main(n_products):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        t0 = time.perf_counter()
+        build(path, n_products)
+        print(f"Base de prueba: {n_products} productos en {time.perf_counter() - t0:.1f}s")
+
+        plain = create_engine(f"sqlite:///{path}")
+        before = time_queries(plain, n_products)
+        plain.dispose()
+
+        tuned = create_engine(f"sqlite:///{path}")
+        event.listen(tuned, "connect", apply_sqlite_pragmas)
+        with tuned.begin() as conn:
+            t0 = time.perf_counter()
+            create_indexes(conn)
+        print(f"Índices creados en {time.perf_counter() - t0:.1f}s")
+        after = time_queries(tuned, n_products)
+        with tuned.begin() as conn:
+            t0 = time.perf_counter()
+            create_fts(conn)
+        print(f"Índice FTS5 creado en {time.perf_counter() - t0:.1f}s")
+        before["title_search"], after["title_search"] = time_title_search(tuned)
+        tuned.dispose()
+
+        print(f"{'query':>18} | {'before ms':>10} | {'after ms':>10}")
+        for name in before:
+            print(f"{name:>18} | {before[name]:>10.2f} | {after[name]:>10.2f}")
+    finally:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
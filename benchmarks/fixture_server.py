@@ -0,0 +1,207 @@
+"""
+Local stand-in for vinted.es, for offline benchmarks.
+
+Serves synthetic but deterministic pages with the markup the scraper reads:
+
+    /                              home page (cookie banner)
+    /catalog?...&page=N            catalog grid (grid-item cards + next button)
+    /api/v2/catalog/items?...      catalog JSON
+    /api/v2/catalog/brands?...     brands JSON
+    /items/<id>-<slug>             item page (active / sold / deleted)
+    /api/v2/items/<id>             item JSON
+    /images/<id>.jpg               small JPEG
+
+Point the scraper at it with VINTED_HOST=http://127.0.0.1:<port>.
+
+    python benchmarks/fixture_server.py --port 8800 --latency-ms 50
+"""
+import argparse
+import html
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit, parse_qs
+
+PER_PAGE = 96
+TOTAL_PAGES = 5
+BRANDS = ["Nike", "Adidas", "Zara", "Levi's", "Carhartt", "Ralph Lauren", "The North Face", "Patagonia"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+
+
+def _seed(query):
+    """Stable per-search seed: same filters -> same listing ids."""
+    params = {k: v for k, v in parse_qs(query).items() if k not in ("page", "per_page")}
+    return zlib.crc32(json.dumps(sorted(params.items())).encode()) % 100000
+
+
+def _item(item_id):
+    brand = BRANDS[item_id % len(BRANDS)]
+    price = 5 + (item_id * 37 % 9000) / 100.0
+    title = f"{brand} prenda {item_id}"
+    return {
+        "id": item_id,
+        "title": title,
+        "path": f"/items/{item_id}-{brand.lower().replace(' ', '-')}-prenda",
+        "price": round(price, 2),
+        "brand_title": brand,
+        "size_title": SIZES[item_id % len(SIZES)],
+        "image": f"/images/{item_id}.jpg",
+    }
+
+
+def item_status(item_id):
+    """~10% sold, ~5% deleted, rest active."""
+    bucket = item_id % 20
+    if bucket in (0, 1):
+        return "sold"
+    if bucket == 2:
+        return "deleted"
+    return "active"
+
+
+def _page_items(query, page):
+    start = _seed(query) % 5000 * 1000 + (page - 1) * PER_PAGE
+    # Newest first: ids decrease along the pagination
+    return [_item(9_000_000 - (start + i)) for i in range(PER_PAGE)]
+
+
+def _fmt_price(price):
+    return f"{price:.2f}".replace(".", ",") + " €"
+
+
+def render_catalog(query, page):
+    cards = []
+    for it in _page_items(query, page):
+        cards.append(
+            '<div data-testid="grid-item">'
+            f'<a data-testid="item-box-overlay" href="{it["path"]}" title="{html.escape(it["title"])}, {_fmt_price(it["price"])}"></a>'
+            f'<img src="{it["image"]}" alt="{html.escape(it["title"])}">'
+            f'<p data-testid="item-title">{html.escape(it["title"])}</p>'
+            f'<p data-testid="grid-item-subtitle">{html.escape(it["brand_title"])}</p>'
+            f'<p>{_fmt_price(it["price"])}</p>'
+            '</div>'
+        )
+    params = {k: v for k, v in parse_qs(query).items() if k != "page"}
+    next_q = "&".join(f"{k}={v}" for k, vals in params.items() for v in vals) + f"&page={page + 1}"
+    disabled = "disabled" if page >= TOTAL_PAGES else ""
+    nav = f'<a data-testid="pagination-next-button" class="{disabled}" href="/catalog?{next_q}">Siguiente</a>'
+    return f"<html><head><title>Catálogo | Vinted</title></head><body><div class=\"feed-grid\">{''.join(cards)}</div>{nav}</body></html>"
+
+
+def catalog_json(query, page):
+    items = []
+    for it in _page_items(query, page):
+        items.append({
+            "id": it["id"],
+            "title": it["title"],
+            "path": it["path"],
+            "price": {"amount": f"{it['price']:.2f}", "currency_code": "EUR"},
+            "photo": {"url": it["image"]},
+            "brand_title": it["brand_title"],
+            "size_title": it["size_title"],
+        })
+    return {"items": items, "pagination": {"current_page": page, "total_pages": TOTAL_PAGES, "per_page": PER_PAGE}}
+
+
+def item_state(item_id):
+    status = item_status(item_id)
+    return dict(_item(item_id), is_closed=status == "sold", is_sold=status == "sold", is_reserved=False)
+
+
+def render_item(item_id):
+    it = item_state(item_id)
+    state = json.dumps({"props": {"pageProps": {"item": it}}})
+    if it["is_sold"]:
+        action = '<div data-testid="item-status-banner">Vendido</div>'
+    else:
+        action = '<button data-testid="item-buy-button">Comprar</button>'
+    return (
+        f"<html><head><title>{html.escape(it['title'])} | Vinted</title></head><body>"
+        f"<h1>{html.escape(it['title'])}</h1><p>{_fmt_price(it['price'])}</p>{action}"
+        f'<script id="__NEXT_DATA__" type="application/json">{state}</script>'
+        "</body></html>"
+    )
+
+
+def _jpeg():
+    try:
+        import PIL.Image
+        buf = BytesIO()
+        PIL.Image.new("RGB", (320, 427), (200, 120, 80)).save(buf, "JPEG", quality=80)
+        return buf.getvalue()
+    except ImportError:
+        return b""
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    image_bytes = b""
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, content_type):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(self.path)
+        path, query = parts.path, parts.query
+        page = int(parse_qs(query).get("page", ["1"])[0])
+
+        if path == "/":
+            return self._send(200, '<html><head><title>Vinted</title></head><body><button id="onetrust-accept-btn-handler">Aceptar</button></body></html>', "text/html")
+        if path == "/catalog":
+            return self._send(200, render_catalog(query, page), "text/html")
+        if path == "/api/v2/catalog/items":
+            return self._send(200, json.dumps(catalog_json(query, page)), "application/json")
+        if path == "/api/v2/catalog/brands":
+            text = parse_qs(query).get("search_text", [""])[0].lower()
+            brands = [{"id": i + 1, "title": b} for i, b in enumerate(BRANDS) if text in b.lower()]
+            return self._send(200, json.dumps({"brands": brands}), "application/json")
+        if path.startswith("/items/"):
+            item_id = int(path.split("/")[2].split("-")[0])
+            if item_status(item_id) == "deleted":
+                return self._send(404, "<html><head><title>Vinted</title></head><body>No encontrado</body></html>", "text/html")
+            return self._send(200, render_item(item_id), "text/html")
+        if path.startswith("/api/v2/items/"):
+            item_id = int(path.rstrip("/").split("/")[-1])
+            if item_status(item_id) == "deleted":
+                return self._send(404, json.dumps({"code": 404, "message": "Not found"}), "application/json")
+            return self._send(200, json.dumps({"item": item_state(item_id)}), "application/json")
+        if path.startswith("/images/"):
+            return self._send(200, self.image_bytes, "image/jpeg")
+        return self._send(404, "not found", "text/plain")
+
+
+def start_fixture_server(port=0, latency_ms=0):
+    """Starts the server in a daemon thread. Returns (server, base_url)."""
+    handler = type("Handler", (FixtureHandler,), {"latency": latency_ms / 1000.0, "image_bytes": _jpeg()})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="fixture-server", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--latency-ms", type=int, default=0)
+    args = parser.parse_args()
+    server, url = start_fixture_server(args.port, args.latency_ms)
+    print(f"Fixture server en {url} (Ctrl+C para salir)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
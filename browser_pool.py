@@ -0,0 +1,240 @@
+"""
+Shared Chromium pool for the scraper entry points.
+
+Playwright's sync API is bound to the thread that started it, so a pool lives
+in a thread-local slot. Inside a `pool_scope()` every lease reuses the same
+Chromium process and only gets a fresh, isolated BrowserContext. Outside a
+scope a lease opens a short-lived pool, which keeps one-off calls (UI buttons)
+working exactly as before.
+
+Every context is routed through the pool's RoutePolicy (route_filter.py) and
+its traffic is added to the pool's totals. Leased pages also log their
+traffic per navigated page (main-frame navigation, client-side ones
+included) and per lease, under the caller's label.
+"""
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+from playwright.sync_api import sync_playwright
+
+from route_filter import TrafficStats, load_route_policy
+
+USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36"
+
+# Limits
+MAX_OPEN_CONTEXTS = 4       # Contexts open at the same time across all threads
+MAX_USES_PER_BROWSER = 50   # Relaunch Chromium after N leases to cap memory growth
+
+_context_slots = threading.BoundedSemaphore(MAX_OPEN_CONTEXTS)
+_local = threading.local()
+
+
+def set_max_open_contexts(limit):
+    """
+    Changes the global cap of simultaneously open contexts. Leases already
+    holding a slot release it on the semaphore they took it from.
+    """
+    global _context_slots, MAX_OPEN_CONTEXTS
+    limit = max(1, int(limit))
+    if limit == MAX_OPEN_CONTEXTS:
+        return
+    MAX_OPEN_CONTEXTS = limit
+    _context_slots = threading.BoundedSemaphore(MAX_OPEN_CONTEXTS)
+
+
+class BrowserPool:
+    """
+    Owns one Playwright driver and one Chromium for the calling thread.
+    Hands out isolated contexts and recycles the browser after `max_uses`
+    leases or when it crashes/disconnects.
+    """
+
+    def __init__(self, max_uses=None, headless=True, policy=None):
+        self.max_uses = max_uses or MAX_USES_PER_BROWSER
+        self.headless = headless
+        # Read once per pool, i.e. once per job
+        self.policy = policy if policy is not None else load_route_policy()
+        self.traffic = TrafficStats()
+        self._playwright = None
+        self._browser = None
+        self._uses = 0
+        self._closed = False
+
+        # Stats
+        self.launches = 0
+        self.leases = 0
+        self.crashes = 0
+        self.launch_seconds = 0.0
+
+    # --- Browser lifecycle ---
+    def _launch(self):
+        if self._playwright is None:
+            self._playwright = sync_playwright().start()
+        start = time.perf_counter()
+        self._browser = self._playwright.chromium.launch(headless=self.headless)
+        self.launch_seconds += time.perf_counter() - start
+        self.launches += 1
+        self._uses = 0
+
+    def _close_browser(self):
+        if self._browser is not None:
+            try:
+                self._browser.close()
+            except Exception:
+                pass
+        self._browser = None
+
+    def _ensure_browser(self):
+        if self._closed:
+            raise RuntimeError("BrowserPool cerrado")
+        if self._browser is not None:
+            if not self._browser.is_connected():
+                self.crashes += 1
+                self._close_browser()
+            elif self._uses >= self.max_uses:
+                self._close_browser()
+        if self._browser is None:
+            self._launch()
+        return self._browser
+
+    def close(self):
+        self._close_browser()
+        if self._playwright is not None:
+            try:
+                self._playwright.stop()
+            except Exception:
+                pass
+        self._playwright = None
+        self._closed = True
+
+    # --- Leases ---
+    @contextmanager
+    def context(self, traffic=None, **options):
+        """
+        Yields a fresh, filtered BrowserContext; it is always closed on exit.
+        Its requests are counted in `traffic` (if given) and in the pool totals.
+        """
+        traffic = traffic if traffic is not None else TrafficStats()
+        options.setdefault("user_agent", USER_AGENT)
+        with _context_slots:
+            browser = self._ensure_browser()
+            try:
+                ctx = browser.new_context(**options)
+            except Exception:
+                # Browser died between leases: relaunch once
+                self.crashes += 1
+                self._close_browser()
+                browser = self._ensure_browser()
+                ctx = browser.new_context(**options)
+            self._uses += 1
+            self.leases += 1
+            try:
+                self.policy.install(ctx, traffic)
+                traffic.attach(ctx)
+                yield ctx
+            finally:
+                try:
+                    ctx.close()
+                except Exception:
+                    pass
+                self.traffic.add(traffic)
+                logging.getLogger("vinted").debug(f"Red (contexto): {traffic.summary()}")
+                if self._browser is not None and not self._browser.is_connected():
+                    self.crashes += 1
+                    self._close_browser()
+
+    @contextmanager
+    def page(self, traffic=None, **options):
+        with self.context(traffic=traffic, **options) as ctx:
+            yield ctx.new_page()
+
+    # --- Reporting ---
+    def stats(self):
+        avg_launch = self.launch_seconds / self.launches if self.launches else 0.0
+        avoided = max(0, self.leases - self.launches)
+        return {
+            'leases': self.leases,
+            'launches': self.launches,
+            'crashes': self.crashes,
+            'avg_launch_s': avg_launch,
+            'saved_s': avoided * avg_launch,
+            'requests': self.traffic.requests - self.traffic.blocked,
+            'bytes': self.traffic.bytes,
+            'blocked': self.traffic.blocked,
+        }
+
+
+def current_pool():
+    return getattr(_local, 'pool', None)
+
+
+@contextmanager
+def pool_scope(max_uses=None):
+    """
+    Keeps one pool alive for the duration of a job in this thread.
+    Nested scopes reuse the outer pool.
+    """
+    existing = current_pool()
+    if existing is not None:
+        yield existing
+        return
+
+    pool = BrowserPool(max_uses=max_uses)
+    _local.pool = pool
+    try:
+        yield pool
+    finally:
+        _local.pool = None
+        pool.close()
+        logging.debug(f"BrowserPool cerrado: {pool.stats()}")
+
+
+class _PageTrafficLog:
+    """Logs the traffic between main-frame navigations of one leased page."""
+
+    def __init__(self, label, traffic):
+        self.label = label
+        self.traffic = traffic
+        self.pages = 0
+        self._url = None
+        self._start = None
+
+    def on_navigated(self, frame):
+        if frame.parent_frame is not None:
+            return
+        self.flush()
+        self._url = frame.url
+        self._start = self.traffic.copy()
+
+    def flush(self):
+        if self._start is None or not self._url or self._url == "about:blank":
+            return
+        self.pages += 1
+        delta = self.traffic.since(self._start)
+        self._start = None
+        logging.getLogger("vinted").info(f"[{self.label}] Página {self.pages} ({urlsplit(self._url).path or '/'}): {delta.summary()}")
+
+
+@contextmanager
+def lease_page(label, **options):
+    """
+    Page from the thread's pool (or a short-lived one if no scope is open).
+    Its traffic is logged under `label` for every navigated page and for the
+    whole lease when it ends.
+    """
+    traffic = TrafficStats()
+    pages = _PageTrafficLog(label, traffic)
+    try:
+        with pool_scope() as pool:
+            with pool.page(traffic=traffic, **options) as page:
+                page.on("framenavigated", pages.on_navigated)
+                try:
+                    yield page
+                finally:
+                    pages.flush()
+    finally:
+        if traffic.requests:
+            logging.getLogger("vinted").info(f"[{label}] Red: {traffic.summary()} en {pages.pages} páginas")
@@ -1,10 +1,12 @@
 import os
 from datetime import datetime
-from sqlalchemy import create_engine, Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import create_engine, event, text, Index, UniqueConstraint, Column, Integer, String, Float, Date, DateTime, ForeignKey
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 
 # Ensure data directory exists
-DATA_DIR = '/app/data'
+# VINTED_DATA_DIR overrides the location (e.g. throw-away DBs for benchmarks)
+DATA_DIR = os.environ.get('VINTED_DATA_DIR', '/app/data')
 # Fallback for local development if not running in container structure
 if not os.path.exists(DATA_DIR):
     # Check if we are potentially on windows local dev
@@ -29,7 +31,7 @@ class ScraperLog(Base):
     __tablename__ = 'scraper_logs'
     
     id = Column(Integer, primary_key=True)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     level = Column(String) # INFO, ERROR, WARNING
     message = Column(String)
     
@@ -40,12 +42,23 @@ class PriceHistory(Base):
     __tablename__ = 'price_history'
     
     id = Column(Integer, primary_key=True)
-    product_id = Column(Integer, ForeignKey('products.id'))
+    product_id = Column(Integer, ForeignKey('products.id'), index=True)
     price = Column(Float)
     timestamp = Column(DateTime, default=datetime.utcnow)
     
     product = relationship("Product", back_populates="price_history")
 
+class PriceDaily(Base):
+    __tablename__ = 'price_daily'
+    # Daily rollup of price_history (last/min/max per product and UTC day) for the market page
+    
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    day = Column(Date, primary_key=True)
+    price = Column(Float) # Last price of the day
+    min_price = Column(Float)
+    max_price = Column(Float)
+    samples = Column(Integer, default=1)
+
 class Config(Base):
     __tablename__ = 'config'
     # Singleton table for App Settings
@@ -89,21 +102,79 @@ class SearchConfig(Base):
     max_pages = Column(Integer, default=5)
     max_items = Column(Integer, default=100)
     
+    # Extraction: 'dom' (HTML grid) or 'api' (catalog JSON, falls back to DOM)
+    fetch_mode = Column(String, default="dom")
+    
+    # JSON list of the newest item ids seen on previous runs (incremental scans)
+    seen_watermark = Column(String, nullable=True)
+    
     last_run = Column(DateTime)
     last_check_sold = Column(DateTime)
     
+    # Adaptive scheduling: EWMA of new listings/hour and when to scan next
+    velocity = Column(Float, nullable=True)
+    next_run_at = Column(DateTime, nullable=True)
+    
     products = relationship("Product", back_populates="search_config", cascade="all, delete-orphan")
+    product_links = relationship("ProductSearch", cascade="all, delete-orphan")
+    price_stats = relationship("SearchStats", cascade="all, delete-orphan")
 
     def __repr__(self):
         return f"<SearchConfig(term='{self.term}')>"
 
+class ScanJob(Base):
+    __tablename__ = 'scan_jobs'
+    # Work queue between the UI (enqueues) and the worker process (executes)
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String) # scan, scan_all, sold_check
+    search_config_id = Column(Integer, nullable=True)
+    status = Column(String, default="queued", index=True) # queued, running, done, error
+    result = Column(String, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+
+class SearchStats(Base):
+    __tablename__ = 'search_stats'
+    # Running price aggregates (Welford) per search; brand '' = whole search
+    
+    id = Column(Integer, primary_key=True)
+    search_config_id = Column(Integer, ForeignKey('search_configs.id'), index=True)
+    brand = Column(String, default="")
+    count = Column(Integer, default=0)
+    mean = Column(Float, default=0.0)
+    m2 = Column(Float, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (UniqueConstraint('search_config_id', 'brand'),)
+
+class MetricSample(Base):
+    __tablename__ = 'metric_samples'
+    # Hot-path timings written in batches by metrics.py (p50/p95 page)
+    
+    id = Column(Integer, primary_key=True)
+    timestamp = Column(DateTime, default=datetime.utcnow, index=True)
+    phase = Column(String)
+    search_config_id = Column(Integer, nullable=True)
+    duration_ms = Column(Float)
+    ok = Column(Integer, default=1)
+
+class ProductSearch(Base):
+    __tablename__ = 'product_searches'
+    # Every search whose results contained the product; products.search_config_id is the one that found it first
+    
+    product_id = Column(Integer, ForeignKey('products.id'), primary_key=True)
+    search_config_id = Column(Integer, ForeignKey('search_configs.id'), primary_key=True, index=True)
+    first_seen_at = Column(DateTime, default=datetime.utcnow)
+
 class Product(Base):
     __tablename__ = 'products'
     
     id = Column(Integer, primary_key=True)
-    search_config_id = Column(Integer, ForeignKey('search_configs.id'))
-    title = Column(String)
-    brand = Column(String)
+    search_config_id = Column(Integer, ForeignKey('search_configs.id'), index=True)
+    title = Column(String, index=True)
+    brand = Column(String, index=True)
     price = Column(Float)
     size = Column(String)
     url = Column(String, unique=True)
@@ -112,23 +183,95 @@ class Product(Base):
     
     is_sold = Column(Integer, default=0) # 0=Active, 1=Sold
     sold_at = Column(DateTime, nullable=True)
-    scanned_at = Column(DateTime, default=datetime.utcnow)
+    scanned_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    # Sold checker bookkeeping: last verification and how many times it was found active
+    last_checked_at = Column(DateTime, nullable=True)
+    check_count = Column(Integer, default=0)
     
     search_config = relationship("SearchConfig", back_populates="products")
     price_history = relationship("PriceHistory", back_populates="product", cascade="all, delete-orphan")
+    search_links = relationship("ProductSearch", cascade="all, delete-orphan")
+    price_daily = relationship("PriceDaily", cascade="all, delete-orphan")
+
+    # is_sold alone is too unselective; paired with scanned_at it also serves the ORDER BY
+    __table_args__ = (Index('ix_products_is_sold_scanned_at', 'is_sold', 'scanned_at'),)
 
     def __repr__(self):
         return f"<Product(title='{self.title}', price={self.price})>"
 
 # Setup Database
+# Applied on every new connection: WAL lets the scheduler write while Streamlit reads
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",      # Safe with WAL, no fsync per commit
+    "PRAGMA mmap_size=268435456",     # 256 MB
+    "PRAGMA cache_size=-65536",       # 64 MB (negative = KiB)
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Same names SQLAlchemy gives `index=True` columns, so new and migrated DBs match
+INDEXES = (
+    ("ix_products_scanned_at", "products", "scanned_at"),
+    ("ix_products_is_sold_scanned_at", "products", "is_sold, scanned_at"),
+    ("ix_products_search_config_id", "products", "search_config_id"),
+    ("ix_products_brand", "products", "brand"),
+    ("ix_products_title", "products", "title"),
+    ("ix_price_history_product_id", "price_history", "product_id"),
+    ("ix_scraper_logs_timestamp", "scraper_logs", "timestamp"),
+)
+
+# Full-text index over products.title / brand. External content: the text lives
+# in products only, the triggers keep the index in step with every write
+FTS_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5("
+    "title, brand, content='products', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN "
+    "INSERT INTO products_fts(rowid, title, brand) VALUES (new.id, new.title, new.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, title, brand) VALUES ('delete', old.id, old.title, old.brand); END",
+    "CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF title, brand ON products BEGIN "
+    "INSERT INTO products_fts(products_fts, rowid, title, brand) VALUES ('delete', old.id, old.title, old.brand); "
+    "INSERT INTO products_fts(rowid, title, brand) VALUES (new.id, new.title, new.brand); END",
+)
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+def create_indexes(conn):
+    for name, table, columns in INDEXES:
+        conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})"))
+
+def create_fts(conn):
+    """Creates the FTS5 index and its triggers, filling it if it is new. False if SQLite lacks FTS5."""
+    existed = conn.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")).first() is not None
+    try:
+        for statement in FTS_DDL:
+            conn.execute(text(statement))
+    except OperationalError as e:
+        print(f"Búsqueda de texto completo no disponible: {e}")
+        return False
+    if not existed:
+        conn.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    return True
+
 engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+event.listen(engine, "connect", apply_sqlite_pragmas)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
-    Base.metadata.create_all(bind=engine)
-    
     # Auto-migration for 'condition' column if it doesn't exist
-    from sqlalchemy import inspect, text
+    from sqlalchemy import inspect
+    had_stats = inspect(engine).has_table('search_stats')
+    had_links = inspect(engine).has_table('product_searches')
+    had_rollup = inspect(engine).has_table('price_daily')
+    
+    Base.metadata.create_all(bind=engine)
     inspector = inspect(engine)
     
     # 1. SearchConfig Migrations
@@ -151,6 +294,14 @@ def init_db():
             conn.execute(text("ALTER TABLE search_configs ADD COLUMN max_items INTEGER DEFAULT 100"))
         if 'last_check_sold' not in sc_columns:
             conn.execute(text("ALTER TABLE search_configs ADD COLUMN last_check_sold DATETIME"))
+        if 'fetch_mode' not in sc_columns:
+            conn.execute(text("ALTER TABLE search_configs ADD COLUMN fetch_mode VARCHAR DEFAULT 'dom'"))
+        if 'seen_watermark' not in sc_columns:
+            conn.execute(text("ALTER TABLE search_configs ADD COLUMN seen_watermark VARCHAR"))
+        if 'velocity' not in sc_columns:
+            conn.execute(text("ALTER TABLE search_configs ADD COLUMN velocity FLOAT"))
+        if 'next_run_at' not in sc_columns:
+            conn.execute(text("ALTER TABLE search_configs ADD COLUMN next_run_at DATETIME"))
         
         # 2. Product Migrations
         p_columns = [c['name'] for c in inspector.get_columns('products')]
@@ -163,7 +314,36 @@ def init_db():
              conn.execute(text("ALTER TABLE products ADD COLUMN is_sold INTEGER DEFAULT 0"))
         if 'sold_at' not in p_columns:
              conn.execute(text("ALTER TABLE products ADD COLUMN sold_at DATETIME"))
+        if 'last_checked_at' not in p_columns:
+             conn.execute(text("ALTER TABLE products ADD COLUMN last_checked_at DATETIME"))
+        if 'check_count' not in p_columns:
+             conn.execute(text("ALTER TABLE products ADD COLUMN check_count INTEGER DEFAULT 0"))
+        
+        # 3. Indexes for dashboard / sold checker / logs queries
+        create_indexes(conn)
+        
+        # 4. Full-text title search
+        create_fts(conn)
+        
+        # 5. Search links for products stored before they existed
+        if not had_links:
+            conn.execute(text(
+                "INSERT OR IGNORE INTO product_searches (product_id, search_config_id, first_seen_at) "
+                "SELECT id, search_config_id, scanned_at FROM products WHERE search_config_id IS NOT NULL"
+            ))
         conn.commit()
+    
+    # 6. Seed running price stats / daily rollups for databases created before they existed
+    if not had_stats:
+        from price_stats import recompute_stats
+        db = SessionLocal()
+        recompute_stats(db)
+        db.close()
+    if not had_rollup:
+        from market import rebuild_price_daily
+        db = SessionLocal()
+        rebuild_price_daily(db)
+        db.close()
 
 def get_db():
     db = SessionLocal()
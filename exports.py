@@ -0,0 +1,208 @@
+"""
+Streaming exports of the market analysis data.
+
+Rows are read from SQL in chunks (keyset pagination on price_history.id for
+the raw history, a streamed cursor for the matrix) and written straight to
+a file under static/exports, so memory stays flat whatever the size:
+
+    xlsx     openpyxl write-only workbook, sheets "Matriz" and "RawData"
+    csv      raw history
+    parquet  raw history, one row group per chunk (needs pyarrow)
+
+`progress(done, total)` is called after every chunk.
+
+The page links the file through Streamlit's static file route
+(`server.enableStaticServing`, .streamlit/config.toml), which streams it from
+disk; st.download_button would hold the whole file in the server's memory.
+"""
+import csv
+import os
+import time
+from datetime import datetime
+
+from sqlalchemy import func, select
+
+from database import Product, PriceHistory, PriceDaily
+from market import product_filters
+
+# Streamlit serves <app dir>/static under app/static/
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+EXPORT_DIR = os.path.join(STATIC_DIR, 'exports')
+EXPORT_URL_PATH = "app/static/exports"
+# Streamlit refuses to serve bigger static files
+MAX_STATIC_BYTES = 200 * 1024 * 1024
+EXPORT_FORMATS = {"Excel (.xlsx)": "xlsx", "CSV": "csv", "Parquet": "parquet"}
+CHUNK_SIZE = 5000
+# Export files older than this are deleted when a new one is written
+KEEP_EXPORTS_S = 24 * 3600
+
+HISTORY_COLUMNS = ("product_id", "price_hist", "timestamp", "title", "brand", "price_prod", "size", "url")
+
+
+def _history_select(db, brands, term):
+    return select(
+        PriceHistory.id, PriceHistory.product_id, PriceHistory.price, PriceHistory.timestamp,
+        Product.title, Product.brand, Product.price, Product.size, Product.url
+    ).join(Product, Product.id == PriceHistory.product_id).where(*product_filters(db, brands, term))
+
+
+def count_history(db, brands=(), term=None):
+    return db.query(func.count(PriceHistory.id)).join(
+        Product, Product.id == PriceHistory.product_id).filter(*product_filters(db, brands, term)).scalar() or 0
+
+
+def iter_history(db, brands=(), term=None, chunk_size=CHUNK_SIZE):
+    """Lists of HISTORY_COLUMNS tuples, `chunk_size` rows at a time, in id order."""
+    stmt = _history_select(db, brands, term).order_by(PriceHistory.id).limit(chunk_size)
+    last_id = 0
+    while True:
+        rows = db.execute(stmt.where(PriceHistory.id > last_id)).all()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield [tuple(row[1:]) for row in rows]
+
+
+def matrix_days(db, brands=(), term=None):
+    return [d for (d,) in db.query(PriceDaily.day).join(
+        Product, Product.id == PriceDaily.product_id
+    ).filter(*product_filters(db, brands, term)).distinct().order_by(PriceDaily.day)]
+
+
+def iter_matrix(db, days, brands=(), term=None, chunk_size=CHUNK_SIZE):
+    """
+    (title, [last price per day]) rows of the title x day matrix, in title
+    order. Same semantics as market.price_matrix: the latest product wins
+    when several share a title.
+    """
+    column = {day: i for i, day in enumerate(days)}
+    stmt = select(Product.title, PriceDaily.day, PriceDaily.price).join(
+        PriceDaily, PriceDaily.product_id == Product.id
+    ).where(*product_filters(db, brands, term), Product.title.isnot(None)).order_by(Product.title, PriceDaily.day, Product.id)
+
+    current, values = None, None
+    for title, day, price in db.execute(stmt.execution_options(yield_per=chunk_size)):
+        if title != current:
+            if current is not None:
+                yield current, values
+            current, values = title, [None] * len(days)
+        if price is not None:
+            values[column[day]] = price
+    if current is not None:
+        yield current, values
+
+
+# --- Writers ---
+
+def _report(progress, done, total):
+    if progress is not None:
+        progress(done, total)
+
+
+def write_xlsx(db, path, brands=(), term=None, progress=None):
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def clean(row):
+        # Control characters in scraped titles make openpyxl refuse the cell
+        return [ILLEGAL_CHARACTERS_RE.sub("", v) if isinstance(v, str) else v for v in row]
+
+    days = matrix_days(db, brands, term)
+    n_titles = db.query(func.count(func.distinct(Product.title))).filter(*product_filters(db, brands, term)).scalar() or 0
+    total = n_titles + count_history(db, brands, term)
+    done = 0
+
+    # Write-only: rows go to a temp file as they are appended
+    wb = Workbook(write_only=True)
+    matrix = wb.create_sheet("Matriz")
+    matrix.append(["title"] + [d.isoformat() for d in days])
+    for title, values in iter_matrix(db, days, brands, term):
+        matrix.append(clean([title] + values))
+        done += 1
+        if done % CHUNK_SIZE == 0:
+            _report(progress, done, total)
+
+    raw = wb.create_sheet("RawData")
+    raw.append(list(HISTORY_COLUMNS))
+    for chunk in iter_history(db, brands, term):
+        for row in chunk:
+            raw.append(clean(row))
+        done += len(chunk)
+        _report(progress, done, total)
+    wb.save(path)
+    _report(progress, total, total)
+    return total
+
+
+def write_csv(db, path, brands=(), term=None, progress=None):
+    total = count_history(db, brands, term)
+    done = 0
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(HISTORY_COLUMNS)
+        for chunk in iter_history(db, brands, term):
+            writer.writerows(chunk)
+            done += len(chunk)
+            _report(progress, done, total)
+    _report(progress, total, total)
+    return done
+
+
+def write_parquet(db, path, brands=(), term=None, progress=None):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ("product_id", pa.int64()), ("price_hist", pa.float64()), ("timestamp", pa.timestamp("us")),
+        ("title", pa.string()), ("brand", pa.string()), ("price_prod", pa.float64()),
+        ("size", pa.string()), ("url", pa.string()),
+    ])
+    total = count_history(db, brands, term)
+    done = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in iter_history(db, brands, term):
+            columns = list(zip(*chunk))
+            writer.write_batch(pa.record_batch(
+                [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema))
+            done += len(chunk)
+            _report(progress, done, total)
+    _report(progress, total, total)
+    return done
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+
+
+def _prune_exports():
+    cutoff = time.time() - KEEP_EXPORTS_S
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_market_data(db, fmt, brands=(), term=None, progress=None):
+    """Writes the filtered data as `fmt` under EXPORT_DIR. Returns (path, rows)."""
+    if fmt not in WRITERS:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune_exports()
+    path = os.path.join(EXPORT_DIR, f"vinted_analisis_{datetime.utcnow():%Y%m%d_%H%M%S}.{fmt}")
+    tmp_path = path + ".tmp"
+    try:
+        rows = WRITERS[fmt](db, tmp_path, brands, term, progress)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path, rows
+
+
+def export_url(path):
+    """Relative URL of an export file, or None if it is too big for the static route."""
+    if os.path.getsize(path) > MAX_STATIC_BYTES:
+        return None
+    return f"{EXPORT_URL_PATH}/{os.path.basename(path)}"
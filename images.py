@@ -0,0 +1,201 @@
+"""
+Background image ingestion: pooled HTTP downloads, AVIF encoding in a
+process pool and storage keyed by a stable digest of the image URL.
+
+Scans only queue work here. The file name is known up front
+(`image_filename`), so products are stored with their final
+`local_image_path` and the file shows up once the pipeline gets to it.
+Images already on disk are never downloaded or encoded again, also across
+restarts. When an image cannot be stored, the products waiting for it keep
+the path until `clear_failed` runs after their rows are committed (the
+scan's finish), so the clear never races a page still being saved.
+"""
+import atexit
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from sqlalchemy import bindparam, update
+from urllib3.util.retry import Retry
+
+from database import DATA_DIR, Product
+from scraper import log_to_db
+
+IMAGES_DIR = os.path.join(DATA_DIR, 'images')
+DOWNLOAD_WORKERS = 8
+ENCODE_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+AVIF_QUALITY = 50 # Aggressive compression
+
+
+def image_filename(image_url):
+    """Stable name for an image URL (unlike hash(), not salted per process)."""
+    return hashlib.sha256(image_url.encode('utf-8')).hexdigest()[:32] + ".avif"
+
+
+def _encode_avif(data, filepath):
+    """Runs in a worker process: decode, convert and write atomically."""
+    import PIL.Image
+    import pillow_avif  # registers the AVIF encoder
+
+    img = PIL.Image.open(BytesIO(data))
+    tmp_path = filepath + ".tmp"
+    img.save(tmp_path, "AVIF", quality=AVIF_QUALITY)
+    os.replace(tmp_path, filepath)
+    return os.path.getsize(filepath)
+
+
+class ImagePipeline:
+    def __init__(self, images_dir=IMAGES_DIR, download_workers=DOWNLOAD_WORKERS, encode_workers=ENCODE_WORKERS):
+        self.images_dir = images_dir
+        os.makedirs(images_dir, exist_ok=True)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=download_workers,
+            max_retries=Retry(total=2, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._downloads = ThreadPoolExecutor(max_workers=download_workers, thread_name_prefix="img-download")
+        # spawn: forking a process that runs Playwright/Streamlit threads is unsafe
+        self._encoder = ProcessPoolExecutor(max_workers=encode_workers, mp_context=multiprocessing.get_context("spawn"))
+
+        self._lock = threading.Lock()
+        # filename -> ids of the products stored with it, while downloading
+        self._in_flight = {}
+        # Same for images that could not be stored, until clear_failed
+        self._failed = {}
+
+        # Stats
+        self.processed = 0
+        self.failed = 0
+        self.cache_hits = 0
+        self.bytes_in = 0
+        self._busy_seconds = 0.0
+        self._busy_since = None
+
+    def submit(self, product_id, image_url):
+        """
+        Queues an image and returns the file name it will be stored under.
+        Returns immediately; already stored images count as cache hits.
+        """
+        if not image_url:
+            return None
+        filename = image_filename(image_url)
+        filepath = os.path.join(self.images_dir, filename)
+
+        with self._lock:
+            if os.path.exists(filepath):
+                self.cache_hits += 1
+                return filename
+            if filename in self._in_flight:
+                self._in_flight[filename].add(product_id)
+                return filename
+            if not self._in_flight:
+                self._busy_since = time.perf_counter()
+            self._in_flight[filename] = {product_id}
+
+        self._downloads.submit(self._process, image_url, filename, filepath)
+        return filename
+
+    def _process(self, image_url, filename, filepath):
+        ok = False
+        size = 0
+        try:
+            response = self.session.get(image_url, timeout=10)
+            if response.status_code == 200:
+                size = len(response.content)
+                self._encoder.submit(_encode_avif, response.content, filepath).result()
+                ok = True
+        except Exception as e:
+            log_to_db(f"Error procesando imagen {image_url}: {e}", "WARNING")
+
+        with self._lock:
+            self.bytes_in += size
+            product_ids = self._in_flight.pop(filename)
+            if ok:
+                self.processed += 1
+            else:
+                self.failed += 1
+                self._failed.setdefault(filename, set()).update(product_ids)
+            drained = not self._in_flight
+            if drained and self._busy_since is not None:
+                self._busy_seconds += time.perf_counter() - self._busy_since
+                self._busy_since = None
+
+        if drained:
+            self.log_stats()
+
+    def clear_failed(self, db):
+        """
+        Drops the pre-assigned path of the products whose image could not be
+        stored. Call it once their rows are committed (jobs holds
+        DB_WRITE_LOCK, under which every page is saved). Not committed here.
+        Returns how many paths were cleared.
+        """
+        with self._lock:
+            failed, self._failed = self._failed, {}
+        rows = [
+            {'pid': pid, 'path': filename}
+            for filename, product_ids in failed.items()
+            # Queued again by a later scan and stored this time
+            if not os.path.exists(os.path.join(self.images_dir, filename))
+            for pid in product_ids if pid is not None
+        ]
+        if not rows:
+            return 0
+        products = Product.__table__
+        stmt = update(products).where(
+            products.c.id == bindparam('pid'), products.c.local_image_path == bindparam('path')
+        ).values(local_image_path=None)
+        return db.execute(stmt, rows).rowcount
+
+    def stats(self):
+        with self._lock:
+            busy = self._busy_seconds
+            if self._busy_since is not None:
+                busy += time.perf_counter() - self._busy_since
+            lookups = self.processed + self.failed + self.cache_hits
+            return {
+                'queued': len(self._in_flight),
+                'processed': self.processed,
+                'failed': self.failed,
+                'cache_hits': self.cache_hits,
+                'hit_rate': self.cache_hits / lookups if lookups else 0.0,
+                'images_per_s': self.processed / busy if busy > 0 else 0.0,
+                'mb_downloaded': self.bytes_in / 1e6,
+            }
+
+    def log_stats(self):
+        s = self.stats()
+        log_to_db(
+            f"Imágenes: {s['processed']} procesadas ({s['images_per_s']:.1f} img/s), "
+            f"{s['failed']} fallidas, caché {s['hit_rate']:.0%}, en cola {s['queued']}",
+            "INFO"
+        )
+
+    def shutdown(self, wait=True):
+        self._downloads.shutdown(wait=wait)
+        self._encoder.shutdown(wait=wait)
+        self.session.close()
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_image_pipeline():
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImagePipeline()
+            atexit.register(_pipeline.shutdown)
+        return _pipeline
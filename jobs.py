@@ -0,0 +1,430 @@
+"""
+Scan and sold-check jobs, plus the DB-backed queue the UI uses to request them.
+
+Everything here runs in the worker process (`python -m worker`); the
+Streamlit app only calls `enqueue_job` and reads ScanJob rows.
+"""
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlsplit
+
+from sqlalchemy import update
+
+from database import SessionLocal, SearchConfig, Product, Config, ScanJob
+from scraper import iter_scrape_vinted, send_telegram_alert, browser_job, update_watermark, load_watermark, log_to_db, set_domain_concurrency, WATERMARK_SIZE, VINTED_HOST
+from browser_pool import set_max_open_contexts
+from persistence import save_scan_results
+from images import get_image_pipeline
+from alerts import get_alert_engine, format_alert
+from price_stats import get_stats
+from notifier import get_notifier
+from scheduling import record_scan, due_config_ids, postpone
+from scan_cache import plan_shared_fetches, get_scan_cache, fetch_key, read_cache_ttl
+from sold_check import SoldChecker, read_sold_check_settings, select_candidates
+from metrics import timed, observe, count
+from market import bump_data_version
+
+JOB_KINDS = ("scan", "scan_all", "scan_due", "sold_check")
+HEARTBEAT_KEY = "worker_heartbeat"
+SCAN_WORKERS_KEY = "scan_workers"
+DEFAULT_SCAN_WORKERS = 3
+# Each worker runs its own Chromium; more than this does not fit a small host
+MAX_SCAN_WORKERS = 8
+
+# Scraping runs in parallel; the short save/commit stage is serialised so
+# two searches that find the same listing never race on products.url
+DB_WRITE_LOCK = threading.Lock()
+
+# --- JOBS ---
+
+def _save_batch(db, config, batch, hist_mean, hist_std, alert_engine, send):
+    """Persists one page of results, queues its images and alerts. Returns (new, repriced, linked)."""
+    with DB_WRITE_LOCK:
+        new_products, repriced, linked = save_scan_results(db, config, batch)
+        
+        # Images are queued; the AVIF name is known before the file exists
+        with timed("save.images", config.id):
+            images = get_image_pipeline()
+            for p_obj in new_products:
+                if p_obj.image_url:
+                    p_obj.local_image_path = images.submit(p_obj.id, p_obj.image_url)
+        
+        with timed("save.alerts", config.id):
+            # CHECK ALERTS (whole batch, rules compiled once)
+            for rule, p_obj in alert_engine.evaluate(new_products, hist_mean, hist_std):
+                send(format_alert(rule, p_obj))
+            
+            for p_obj in new_products:
+                # AUTO-Z-SCORE ALERT (Legacy)
+                if hist_mean > 0:
+                     z_score = (p_obj.price - hist_mean) / (hist_std if hist_std > 0 else 1)
+                     if z_score < -1.5: # 1.5 Sigma event
+                         send(f"📉 **Oportunidad Estadística (Z={z_score:.1f})**\n\n{p_obj.title}\n{p_obj.price}€ (Avg: {hist_mean:.1f}€)")
+        
+        with timed("save.commit", config.id):
+            # Cached market analysis queries are stale as soon as the page is visible
+            bump_data_version(db)
+            db.commit()
+    count("products_new", len(new_products), config.id)
+    return len(new_products), repriced, linked
+
+class _ScanSink:
+    """One search's side of a (possibly shared) fetch: baseline, counters and watermark."""
+
+    def __init__(self, db, config, send):
+        self.db = db
+        self.config = config
+        self.send = send
+        # Baseline = running aggregates of this search, before this scan's items
+        self.hist_mean, self.hist_std = get_stats(db, config.id)
+        self.alert_engine = get_alert_engine(db)
+        self.new_count = self.repriced = self.linked = 0
+        # Only the newest ids are kept for the watermark
+        self.watermark_items = []
+
+    def consume(self, batch):
+        if not batch:
+            return
+        if len(self.watermark_items) < WATERMARK_SIZE:
+            self.watermark_items.extend(batch[:WATERMARK_SIZE - len(self.watermark_items)])
+        n_new, n_repriced, n_linked = _save_batch(self.db, self.config, batch, self.hist_mean, self.hist_std, self.alert_engine, self.send)
+        self.new_count += n_new
+        self.repriced += n_repriced
+        self.linked += n_linked
+
+    def finish(self, finished=True):
+        """
+        Records the scan. A fetch that did not run to its end (blocked page,
+        timeout, error) is not a velocity observation: the search is only
+        postponed and keeps its last_run.
+        """
+        config = self.config
+        with DB_WRITE_LOCK:
+            update_watermark(config, self.watermark_items)
+            # Every page of this scan is committed, so failed images can be cleared
+            get_image_pipeline().clear_failed(self.db)
+            if finished:
+                now = datetime.utcnow()
+                # Velocity counts listings new to this search, also when another search stored them first
+                interval_h = record_scan(self.db, config, self.linked, now)
+                config.last_run = now
+                self.db.commit()
+            else:
+                postpone(self.db, config.id)
+        if self.repriced:
+            log_to_db(f"{self.repriced} precios actualizados.", "INFO")
+        if finished:
+            log_to_db(f"Próximo escaneo de '{config.term}' en {interval_h:.1f}h ({config.velocity or 0:.1f} nuevos/h)", "INFO")
+        else:
+            log_to_db(f"El escaneo de '{config.term}' no terminó; no cuenta para su frecuencia y se reintentará más tarde.", "WARNING")
+
+def _fetch(config, ttl_min, result, watermark=None, use_cache=True):
+    """
+    Pages of `config`'s search, from the scan cache while fresh, otherwise
+    scraped and cached once finished. Sets result['finished'] and
+    result['complete'].
+    A cached fetch may have stopped on the ids known when it ran, so it is
+    only reused by a caller that knows all of them too.
+    """
+    if watermark is None:
+        watermark = load_watermark(config)
+    cache = get_scan_cache()
+    key = fetch_key(config)
+    cached = cache.get(key, ttl_min, watermark) if use_cache else None
+    if cached is not None:
+        count("scan_cache_hits", 1, config.id)
+        log_to_db(f"Resultados de '{config.term}' reutilizados de la caché ({len(cached.batches)} páginas).", "INFO")
+        result['finished'] = True
+        result['complete'] = cached.complete
+        yield from cached.batches
+        return
+    
+    outcome = {}
+    fetched = []
+    for batch in iter_scrape_vinted(config, watermark, outcome):
+        if ttl_min > 0:
+            fetched.append(batch)
+        yield batch
+    result['finished'] = outcome.get('finished', False)
+    result['complete'] = outcome.get('complete', False)
+    if result['finished']:
+        cache.put(key, fetched, result['complete'], ttl_min, watermark)
+
+def scan_shared(db, configs, use_cache=True):
+    """
+    Scans a group of searches with one fetch (scan_cache.plan_shared_fetches,
+    fetcher first). Streams page by page: every page is persisted for each
+    search, gets its images queued and its alerts sent before the next one
+    is loaded. `use_cache=False` always scrapes (manual scans).
+    Returns {config_id: new products}.
+    """
+    fetcher = configs[0]
+    started = time.perf_counter()
+    first_alert = []
+    
+    def send(message):
+        if not first_alert:
+            first_alert.append(time.perf_counter() - started)
+        send_telegram_alert(message)
+    
+    sinks = [_ScanSink(db, c, send) for c in configs]
+    ttl_min = read_cache_ttl(db)
+    # Stop on pages every member has already seen
+    watermark = set.intersection(*(load_watermark(c) for c in configs)) if len(configs) > 1 else None
+    if len(configs) > 1:
+        log_to_db(f"Descarga compartida de '{fetcher.term}' para {len(configs)} búsquedas.", "INFO")
+    
+    pages = 0
+    result = {}
+    # In digest mode the whole scan still goes out merged at the end
+    with get_notifier().digest(f"Escaneo {fetcher.term or fetcher.brand_name or ''}".strip()):
+        for batch in _fetch(fetcher, ttl_min, result, watermark, use_cache):
+            pages += 1
+            for sink in sinks:
+                sink.consume(batch)
+    
+    for sink in sinks:
+        sink.finish(result.get('finished', False))
+    
+    observe("scan.total", time.perf_counter() - started, fetcher.id)
+    if first_alert:
+        observe("scan.first_alert", first_alert[0], fetcher.id)
+        log_to_db(f"Primera alerta a {first_alert[0]:.1f}s del inicio del escaneo ({pages} páginas, {time.perf_counter() - started:.1f}s en total)", "INFO")
+    return {sink.config.id: sink.new_count for sink in sinks}
+
+def scrape_and_save(db, config):
+    """Scans one search (see scan_shared). Returns its new products."""
+    return scan_shared(db, [config])[config.id]
+
+def read_scan_workers(db):
+    row = db.query(Config).filter_by(key=SCAN_WORKERS_KEY).first()
+    try:
+        return min(MAX_SCAN_WORKERS, max(1, int(row.value))) if row else DEFAULT_SCAN_WORKERS
+    except ValueError:
+        return DEFAULT_SCAN_WORKERS
+
+def apply_browser_limits(workers):
+    """
+    Sizes the browser caps for `workers` parallel scans: one Vinted page
+    per worker and one more context for the sold-check fallback or a brand
+    lookup running alongside.
+    """
+    set_max_open_contexts(workers + 1)
+    set_domain_concurrency(urlsplit(VINTED_HOST).netloc, workers)
+
+def _scan_worker(groups, totals, worker_idx):
+    """Drains groups of config ids with one browser and one DB session per group."""
+    with browser_job(f"Escaneo programado #{worker_idx}"):
+        while True:
+            try:
+                group = groups.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                totals.append(run_shared_scan(group))
+            except Exception as e:
+                log_to_db(f"Error escaneando búsquedas {group}: {e}", "ERROR")
+                db = SessionLocal()
+                try:
+                    for config_id in group:
+                        postpone(db, config_id)
+                finally:
+                    db.close()
+
+def run_scheduled_scans(workers=None, ids=None):
+    """
+    Scans `ids` (default: every SearchConfig) in that order with `workers`
+    parallel browsers (Config `scan_workers`, at most MAX_SCAN_WORKERS).
+    Overlapping searches are grouped so each group is fetched once. The
+    open-context and per-domain caps follow the configured worker count
+    (apply_browser_limits); callers passing `workers` set them themselves.
+    """
+    db = SessionLocal()
+    try:
+        if ids is None:
+            ids = [cid for (cid,) in db.query(SearchConfig.id).order_by(SearchConfig.id).all()]
+        if workers is None:
+            workers = read_scan_workers(db)
+            apply_browser_limits(workers)
+        configs = {c.id: c for c in db.query(SearchConfig).filter(SearchConfig.id.in_(ids)).all()}
+        plan = plan_shared_fetches([configs[cid] for cid in ids if cid in configs])
+    finally:
+        db.close()
+
+    if len(plan) < len(configs):
+        log_to_db(f"{len(configs)} búsquedas en {len(plan)} descargas (resultados compartidos entre búsquedas solapadas).", "INFO")
+    groups = queue.Queue()
+    for _, members in plan:
+        groups.put([c.id for c in members])
+    totals = []
+    threads = [
+        threading.Thread(target=_scan_worker, args=(groups, totals, i + 1), name=f"scan-worker-{i + 1}")
+        for i in range(min(workers, len(plan)))
+    ]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    return sum(totals)
+
+def run_sold_check_job():
+    """
+    Verifies the `sold_check_budget` unsold products most likely to have
+    changed (sold_check.select_candidates), HTTP first with the browser only
+    for ambiguous answers. Returns the sold count.
+    """
+    db = SessionLocal()
+    try:
+        settings = read_sold_check_settings(db)
+        products = select_candidates(db, settings["sold_check_budget"])
+        checker = SoldChecker(
+            concurrency=settings["sold_check_concurrency"],
+            rate=settings["sold_check_rate"],
+            fallback_budget=settings["sold_check_fallback"]
+        )
+        statuses = checker.check(url for _, url, _ in products)
+
+        now = datetime.utcnow()
+        updates = []
+        counts = {'sold': 0, 'deleted': 0, 'active': 0}
+        for pid, url, checks in products:
+            status = statuses.get(url)
+            if status not in counts:
+                continue  # Unresolved: left for the next run
+            counts[status] += 1
+            updates.append({
+                'id': pid,
+                'is_sold': 0 if status == 'active' else 1,
+                'sold_at': now if status == 'sold' else None,
+                'last_checked_at': now,
+                'check_count': checks + 1
+            })
+        if updates:
+            db.execute(update(Product), updates)
+        db.commit()
+    finally:
+        db.close()
+
+    log_to_db(
+        f"Comprobación de vendidos: {len(products)} productos, {counts['sold']} vendidos, {counts['deleted']} eliminados, "
+        f"{counts['active']} activos | {checker.http_requests} peticiones HTTP, {checker.fallbacks} con navegador, "
+        f"{checker.unresolved} sin resolver",
+        "INFO"
+    )
+    return counts['sold']
+
+def run_single_scan(config_id):
+    # Requested by hand: the user wants what is on Vinted now, not a cached fetch
+    return run_shared_scan([config_id], use_cache=False)
+
+def run_shared_scan(config_ids, use_cache=True):
+    """Scans a plan_shared_fetches group (fetcher first). Returns the new products of all of them."""
+    db = SessionLocal()
+    try:
+        # A search deleted since the plan was made just drops out of its group
+        configs = [c for c in (db.get(SearchConfig, cid) for cid in config_ids) if c is not None]
+        if not configs:
+            raise ValueError(f"Búsqueda {config_ids[0] if len(config_ids) == 1 else config_ids} no existe")
+        return sum(scan_shared(db, configs, use_cache).values())
+    finally:
+        db.close()
+
+# --- QUEUE ---
+
+def enqueue_job(db, kind, search_config_id=None):
+    """Queues a job unless an identical one is already waiting. Returns the ScanJob."""
+    if kind not in JOB_KINDS:
+        raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+    pending = db.query(ScanJob).filter(
+        ScanJob.kind == kind,
+        ScanJob.search_config_id == search_config_id,
+        ScanJob.status.in_(["queued", "running"])
+    ).first()
+    if pending:
+        return pending
+    job = ScanJob(kind=kind, search_config_id=search_config_id, status="queued")
+    db.add(job)
+    db.commit()
+    return job
+
+def claim_next_job(db):
+    """Atomically moves the oldest queued job to 'running'. Returns it or None."""
+    while True:
+        job = db.query(ScanJob).filter_by(status="queued").order_by(ScanJob.id).first()
+        if job is None:
+            return None
+        claimed = db.execute(
+            update(ScanJob)
+            .where(ScanJob.id == job.id, ScanJob.status == "queued")
+            .values(status="running", started_at=datetime.utcnow())
+        ).rowcount
+        db.commit()
+        if claimed:
+            db.refresh(job)
+            return job
+
+def execute_job(job):
+    if job.kind == "scan":
+        n = run_single_scan(job.search_config_id)
+        return f"{n} nuevos"
+    if job.kind == "scan_all":
+        return f"{run_scheduled_scans()} nuevos"
+    if job.kind == "scan_due":
+        db = SessionLocal()
+        try:
+            ids = due_config_ids(db)
+        finally:
+            db.close()
+        return f"{run_scheduled_scans(ids=ids)} nuevos en {len(ids)} búsquedas"
+    if job.kind == "sold_check":
+        return f"{run_sold_check_job()} vendidos"
+    raise ValueError(f"Tipo de trabajo desconocido: {job.kind}")
+
+def process_job_queue():
+    """Runs queued jobs until the queue is empty."""
+    db = SessionLocal()
+    try:
+        while True:
+            job = claim_next_job(db)
+            if job is None:
+                return
+            try:
+                job.result = execute_job(job)
+                job.status = "done"
+            except Exception as e:
+                log_to_db(f"Error en trabajo #{job.id} ({job.kind}): {e}", "ERROR")
+                job.result = str(e)[:500]
+                job.status = "error"
+            job.finished_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+
+def recover_stale_jobs(db):
+    """Jobs left 'running' by a worker that died are marked as failed."""
+    db.query(ScanJob).filter_by(status="running").update(
+        {ScanJob.status: "error", ScanJob.result: "Worker reiniciado", ScanJob.finished_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+
+def write_heartbeat(db):
+    row = db.query(Config).filter_by(key=HEARTBEAT_KEY).first()
+    now = datetime.utcnow().isoformat()
+    if row: row.value = now
+    else: db.add(Config(key=HEARTBEAT_KEY, value=now))
+    db.commit()
+
+def worker_last_seen(db):
+    row = db.query(Config).filter_by(key=HEARTBEAT_KEY).first()
+    if not row or not row.value:
+        return None
+    try:
+        return datetime.fromisoformat(row.value)
+    except ValueError:
+        return None
+
+def prune_finished_jobs(db, keep_days=7):
+    cutoff = datetime.utcnow() - timedelta(days=keep_days)
+    db.query(ScanJob).filter(ScanJob.status.in_(["done", "error"]), ScanJob.finished_at < cutoff).delete(synchronize_session=False)
+    db.commit()
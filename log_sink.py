@@ -0,0 +1,181 @@
+"""
+Buffered SQLite sink for scraper logs.
+
+`log_to_db` used to open a session and commit once per line. Records now go
+to an in-memory queue and a background thread writes them in batches
+(every FLUSH_RECORDS records or FLUSH_INTERVAL_MS, whichever comes first)
+with a single executemany. Old rows are pruned by age and by count, once
+the table exists (the handler is installed on import, before init_db).
+
+Lines not yet committed are only in the memory of the process that logged
+them, usually the worker. The worker serves them as JSON on /logs of its
+metrics HTTP server (metrics.py), and the Logs page reads them from
+WORKER_LOGS_URL (`fetch_worker_pending_lines`).
+"""
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, inspect, select
+
+from database import engine, ScraperLog
+
+WORKER_LOGS_URL = os.environ.get("WORKER_LOGS_URL", f"http://127.0.0.1:{os.environ.get('METRICS_PORT', '9108')}/logs")
+
+FLUSH_RECORDS = 50
+FLUSH_INTERVAL_MS = 1000
+RETENTION_DAYS = 7
+RETENTION_ROWS = 20000
+RETENTION_EVERY_S = 600
+
+
+class BufferedDBLogHandler(logging.Handler):
+    def __init__(self, flush_records=FLUSH_RECORDS, flush_interval_ms=FLUSH_INTERVAL_MS,
+                 retention_days=RETENTION_DAYS, retention_rows=RETENTION_ROWS):
+        super().__init__()
+        self.flush_records = flush_records
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.retention_days = retention_days
+        self.retention_rows = retention_rows
+
+        self._queue = queue.Queue()
+        # Records accepted but not yet committed, for the live view and flush()
+        self._unflushed = deque()
+        self._unflushed_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._last_retention = 0.0
+
+        self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+        self._thread.start()
+
+    def emit(self, record):
+        try:
+            row = {
+                'timestamp': datetime.utcfromtimestamp(record.created),
+                'level': record.levelname,
+                'message': record.getMessage(),
+            }
+        except Exception:
+            self.handleError(record)
+            return
+        with self._unflushed_lock:
+            self._unflushed.append(row)
+        self._queue.put(row)
+
+    # --- Writer thread ---
+    def _run(self):
+        batch = []
+        deadline = None
+        while not (self._stopped.is_set() and self._queue.empty() and not batch):
+            timeout = self.flush_interval if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                batch.append(self._queue.get(timeout=min(timeout, 0.2)))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+            except queue.Empty:
+                pass
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if batch and (len(batch) >= self.flush_records or due or self._flush_requested.is_set() or self._stopped.is_set()):
+                self._write(batch)
+                batch = []
+                deadline = None
+            if not batch and self._queue.empty():
+                self._flush_requested.clear()
+
+            if time.monotonic() - self._last_retention > RETENTION_EVERY_S:
+                self._apply_retention()
+
+    def _write(self, batch):
+        try:
+            with engine.begin() as conn:
+                conn.execute(ScraperLog.__table__.insert(), batch)
+        except Exception as e:
+            print(f"Failed to log to DB: {e}")
+        with self._unflushed_lock:
+            for _ in range(len(batch)):
+                if self._unflushed:
+                    self._unflushed.popleft()
+
+    def _apply_retention(self):
+        self._last_retention = time.monotonic()
+        table = ScraperLog.__table__
+        try:
+            with engine.begin() as conn:
+                # Fresh database: nothing to prune until init_db creates the table
+                if not inspect(conn).has_table(table.name):
+                    return
+                if self.retention_days:
+                    cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+                    conn.execute(delete(table).where(table.c.timestamp < cutoff))
+                if self.retention_rows:
+                    max_id = conn.execute(select(func.max(table.c.id))).scalar()
+                    if max_id and max_id > self.retention_rows:
+                        conn.execute(delete(table).where(table.c.id <= max_id - self.retention_rows))
+        except Exception as e:
+            print(f"Failed to prune logs: {e}")
+
+    # --- Public helpers ---
+    def pending_lines(self):
+        """Records not yet committed to SQLite, oldest first."""
+        with self._unflushed_lock:
+            return list(self._unflushed)
+
+    def flush(self, timeout=5.0):
+        """Asks the writer to commit what it has and waits until the buffer is empty."""
+        self._flush_requested.set()
+        end = time.monotonic() + timeout
+        while time.monotonic() < end:
+            with self._unflushed_lock:
+                if not self._unflushed:
+                    return
+            time.sleep(0.02)
+
+    def close(self):
+        self._stopped.set()
+        self._thread.join(timeout=5.0)
+        super().close()
+
+
+_handler = None
+_handler_lock = threading.Lock()
+
+
+def install_db_log_handler(logger_name="vinted"):
+    """Attaches the (single) buffered handler to `logger_name`. Idempotent."""
+    global _handler
+    with _handler_lock:
+        if _handler is None:
+            _handler = BufferedDBLogHandler()
+            logging.getLogger(logger_name).addHandler(_handler)
+            atexit.register(_handler.close)
+        return _handler
+
+
+def get_db_log_handler():
+    return _handler
+
+
+def pending_log_lines():
+    """This process' uncommitted records as JSON-ready dicts, oldest first."""
+    if _handler is None:
+        return []
+    return [dict(row, timestamp=row['timestamp'].isoformat()) for row in _handler.pending_lines()]
+
+
+def fetch_worker_pending_lines(url=WORKER_LOGS_URL, timeout=1.0):
+    """The worker's uncommitted records (timestamps as datetime), or None if it cannot be reached."""
+    import requests
+    try:
+        response = requests.get(url, timeout=timeout)
+        response.raise_for_status()
+        rows = response.json()
+    except (requests.RequestException, ValueError):
+        return None
+    return [dict(row, timestamp=datetime.fromisoformat(row['timestamp'])) for row in rows]
@@ -0,0 +1,156 @@
+"""
+Market analysis queries.
+
+The "📈 Análisis de Mercado" page used to load price_history and products
+whole into pandas on every rerun. Here the filters (brands, title text) are
+WHERE clauses, the title one through the FTS5 index (product_search.py).
+The price matrix and the brand chart read `price_daily` (one row per
+product and UTC day, upserted with every price_history insert) and the
+matrix is fetched one page of titles at a time.
+
+The page caches each result under its arguments plus `data_version`, a
+Config counter bumped with every committed scan page and every deletion of
+products, so cached results are reused until the data changes.
+`python -m market` rebuilds the rollup (dropping rows of deleted products
+left by older versions).
+"""
+from datetime import datetime
+
+import pandas as pd
+from sqlalchemy import func, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import Config, Product, PriceDaily
+from product_search import match_clause
+
+DATA_VERSION_KEY = "data_version"
+MATRIX_PAGE_SIZE = 50
+
+
+# --- Rollup maintenance ---
+
+def record_daily_prices(db, rows, day=None):
+    """
+    Folds new price_history rows ({'product_id', 'price'}) into price_daily
+    for `day` (default today, UTC). Not committed here.
+    """
+    rows = [r for r in rows if r.get('price') is not None]
+    if not rows:
+        return
+    day = day or datetime.utcnow().date()
+    stmt = sqlite_insert(PriceDaily)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[PriceDaily.product_id, PriceDaily.day],
+        set_={
+            'price': stmt.excluded.price,
+            'min_price': func.min(PriceDaily.min_price, stmt.excluded.price),
+            'max_price': func.max(PriceDaily.max_price, stmt.excluded.price),
+            'samples': PriceDaily.samples + 1,
+        }
+    )
+    db.execute(stmt, [
+        {'product_id': r['product_id'], 'day': day, 'price': r['price'], 'min_price': r['price'], 'max_price': r['price'], 'samples': 1}
+        for r in rows
+    ])
+
+
+def rebuild_price_daily(db):
+    """Rebuilds price_daily from price_history. Commits."""
+    db.execute(text("DELETE FROM price_daily"))
+    db.execute(text("""
+        INSERT INTO price_daily (product_id, day, price, min_price, max_price, samples)
+        SELECT h.product_id, date(h.timestamp),
+               (SELECT h2.price FROM price_history h2
+                 WHERE h2.product_id = h.product_id AND date(h2.timestamp) = date(h.timestamp) AND h2.price IS NOT NULL
+                 ORDER BY h2.timestamp DESC, h2.id DESC LIMIT 1),
+               MIN(h.price), MAX(h.price), COUNT(*)
+          FROM price_history h
+          JOIN products p ON p.id = h.product_id
+         WHERE h.price IS NOT NULL
+         GROUP BY h.product_id, date(h.timestamp)
+    """))
+    db.commit()
+
+
+def get_data_version(db):
+    row = db.query(Config).filter_by(key=DATA_VERSION_KEY).first()
+    try:
+        return int(row.value) if row and row.value else 0
+    except ValueError:
+        return 0
+
+
+def bump_data_version(db):
+    """Invalidates the cached market queries. Not committed here."""
+    row = db.query(Config).filter_by(key=DATA_VERSION_KEY).first()
+    if row is None:
+        db.add(Config(key=DATA_VERSION_KEY, value="1"))
+    else:
+        row.value = str(get_data_version(db) + 1)
+
+
+# --- Queries ---
+
+def product_filters(db, brands=(), term=None):
+    """WHERE clauses on Product for the page filters (title text through the FTS index)."""
+    clauses = []
+    if brands:
+        clauses.append(Product.brand.in_(list(brands)))
+    title_match = match_clause(db, term, column="title") if term else None
+    if title_match is not None:
+        clauses.append(title_match)
+    return clauses
+
+
+def list_brands(db):
+    return [b for (b,) in db.query(Product.brand).filter(Product.brand.isnot(None)).distinct().order_by(Product.brand)]
+
+
+def summary(db, brands=(), term=None):
+    """(price records, distinct titles) matching the filters."""
+    where = product_filters(db, brands, term)
+    records = db.query(func.coalesce(func.sum(PriceDaily.samples), 0)).join(
+        Product, Product.id == PriceDaily.product_id).filter(*where).scalar()
+    titles = db.query(func.count(func.distinct(Product.title))).filter(*where).scalar()
+    return int(records or 0), int(titles or 0)
+
+
+def brand_means(db, brands=(), term=None):
+    """Mean daily price per brand, as a Series for st.bar_chart."""
+    rows = db.query(Product.brand, func.avg(PriceDaily.price)).join(
+        PriceDaily, PriceDaily.product_id == Product.id
+    ).filter(*product_filters(db, brands, term)).group_by(Product.brand).order_by(Product.brand).all()
+    return pd.Series({str(brand): mean for brand, mean in rows}, name="price", dtype=float)
+
+
+def price_matrix(db, brands=(), term=None, page=0, page_size=MATRIX_PAGE_SIZE):
+    """
+    Title x day matrix of the last price of the day, for one page of titles
+    (alphabetical). page_size=None returns every title; exports.py streams
+    the full matrix instead.
+    """
+    where = product_filters(db, brands, term)
+    if page_size:
+        titles = db.query(Product.title).filter(*where).distinct().order_by(Product.title)
+        titles = [t for (t,) in titles.offset(page * page_size).limit(page_size)]
+        if not titles:
+            return pd.DataFrame()
+        where.append(Product.title.in_(titles))
+
+    rows = db.query(Product.title, PriceDaily.day, PriceDaily.price).join(
+        PriceDaily, PriceDaily.product_id == Product.id
+    ).filter(*where).order_by(PriceDaily.day, Product.id).all()
+    frame = pd.DataFrame(rows, columns=["title", "day", "price"])
+    if frame.empty:
+        return frame
+    return frame.pivot_table(index="title", columns="day", values="price", aggfunc="last")
+
+
+if __name__ == "__main__":
+    from database import init_db, SessionLocal
+    init_db()
+    db = SessionLocal()
+    rebuild_price_daily(db)
+    n = db.query(PriceDaily).count()
+    db.close()
+    print(f"Resumen diario reconstruido: {n} filas.")
@@ -0,0 +1,245 @@
+"""
+Hot-path timing metrics.
+
+    with timed("scrape.navigation", config_id):
+        page.goto(...)
+
+Every observation lands in an in-memory histogram per (phase, search) and
+in a buffer that a background thread writes to `metric_samples` every
+FLUSH_INTERVAL_S with one executemany; the Streamlit "Métricas" page reads
+that table for p50/p95. `start_metrics_server` exposes the histograms,
+error and event counters in Prometheus text format (the worker starts it on
+METRICS_PORT, 127.0.0.1 by default), and on /logs the log lines the worker
+has not committed yet (log_sink.py).
+"""
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlalchemy import delete
+
+from database import engine, MetricSample
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+FLUSH_INTERVAL_S = 5
+FLUSH_SAMPLES = 500
+RETENTION_DAYS = 7
+RETENTION_EVERY_S = 600
+
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "9108"))
+
+logger = logging.getLogger("vinted")
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.count += 1
+        self.sum += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+                break
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    parts = [f'{k}="{_escape(v)}"' for k, v in labels.items() if v is not None]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class MetricsRegistry:
+    def __init__(self, flush_interval_s=FLUSH_INTERVAL_S, retention_days=RETENTION_DAYS):
+        self.flush_interval_s = flush_interval_s
+        self.retention_days = retention_days
+        self._lock = threading.Lock()
+        self._histograms = {}   # (phase, config_id) -> Histogram
+        self._errors = {}       # (phase, config_id) -> int
+        self._events = {}       # (event, config_id) -> int
+        self._pending = []
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._last_retention = 0.0
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self._thread.start()
+
+    # --- Recording ---
+    def observe(self, phase, seconds, config_id=None, ok=True):
+        key = (phase, config_id)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = Histogram()
+            self._histograms[key].observe(seconds)
+            if not ok:
+                self._errors[key] = self._errors.get(key, 0) + 1
+            self._pending.append({
+                'timestamp': datetime.utcnow(),
+                'phase': phase,
+                'search_config_id': config_id,
+                'duration_ms': seconds * 1000.0,
+                'ok': 1 if ok else 0,
+            })
+            if len(self._pending) >= FLUSH_SAMPLES:
+                self._wake.set()
+
+    def count(self, event, n=1, config_id=None):
+        key = (event, config_id)
+        with self._lock:
+            self._events[key] = self._events.get(key, 0) + n
+
+    @contextmanager
+    def timed(self, phase, config_id=None):
+        start = time.perf_counter()
+        ok = True
+        try:
+            yield
+        except BaseException:
+            ok = False
+            raise
+        finally:
+            self.observe(phase, time.perf_counter() - start, config_id, ok)
+
+    # --- Prometheus ---
+    def render_prometheus(self):
+        with self._lock:
+            histograms = {k: (list(h.buckets), h.count, h.sum) for k, h in self._histograms.items()}
+            errors = dict(self._errors)
+            events = dict(self._events)
+
+        lines = [
+            "# HELP vinted_phase_duration_seconds Duration of scraper/persistence/alert phases.",
+            "# TYPE vinted_phase_duration_seconds histogram",
+        ]
+        for (phase, config_id), (buckets, count, total) in sorted(histograms.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f"vinted_phase_duration_seconds_bucket{_labels(phase=phase, config=config_id, le=bound)} {cumulative}")
+            lines.append(f"vinted_phase_duration_seconds_bucket{_labels(phase=phase, config=config_id, le='+Inf')} {count}")
+            lines.append(f"vinted_phase_duration_seconds_sum{_labels(phase=phase, config=config_id)} {total:.6f}")
+            lines.append(f"vinted_phase_duration_seconds_count{_labels(phase=phase, config=config_id)} {count}")
+
+        lines += [
+            "# HELP vinted_phase_errors_total Phases that ended with an exception.",
+            "# TYPE vinted_phase_errors_total counter",
+        ]
+        for (phase, config_id), n in sorted(errors.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            lines.append(f"vinted_phase_errors_total{_labels(phase=phase, config=config_id)} {n}")
+
+        lines += [
+            "# HELP vinted_events_total Items scraped, products inserted, alerts sent...",
+            "# TYPE vinted_events_total counter",
+        ]
+        for (event, config_id), n in sorted(events.items(), key=lambda kv: (kv[0][0], str(kv[0][1]))):
+            lines.append(f"vinted_events_total{_labels(event=event, config=config_id)} {n}")
+        return "\n".join(lines) + "\n"
+
+    # --- Writer thread ---
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval_s)
+            self._wake.clear()
+            self.flush()
+            if time.monotonic() - self._last_retention > RETENTION_EVERY_S:
+                self._apply_retention()
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return
+        try:
+            with engine.begin() as conn:
+                conn.execute(MetricSample.__table__.insert(), batch)
+        except Exception as e:
+            print(f"Failed to write metrics: {e}")
+
+    def _apply_retention(self):
+        self._last_retention = time.monotonic()
+        table = MetricSample.__table__
+        try:
+            with engine.begin() as conn:
+                conn.execute(delete(table).where(table.c.timestamp < datetime.utcnow() - timedelta(days=self.retention_days)))
+        except Exception as e:
+            print(f"Failed to prune metrics: {e}")
+
+    def close(self):
+        self._stopped.set()
+        self._wake.set()
+        self._thread.join(timeout=5.0)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_metrics():
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+            atexit.register(_registry.close)
+        return _registry
+
+
+def timed(phase, config_id=None):
+    return get_metrics().timed(phase, config_id)
+
+
+def observe(phase, seconds, config_id=None, ok=True):
+    get_metrics().observe(phase, seconds, config_id, ok)
+
+
+def count(event, n=1, config_id=None):
+    get_metrics().count(event, n, config_id)
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/logs":
+            from log_sink import pending_log_lines
+            body = json.dumps(pending_log_lines()).encode("utf-8")
+            content_type = "application/json; charset=utf-8"
+        elif path in ("/metrics", "/"):
+            body = get_metrics().render_prometheus().encode("utf-8")
+            content_type = "text/plain; version=0.0.4; charset=utf-8"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_metrics_server(host=METRICS_HOST, port=METRICS_PORT):
+    """Serves /metrics from a daemon thread. Returns the server, or None if the port is taken."""
+    try:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        logger.warning(f"No se pudo abrir el endpoint de métricas en {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    logger.info(f"Métricas Prometheus en http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,283 @@
+"""
+Background Telegram dispatcher.
+
+`send` only enqueues; one worker thread delivers messages over a pooled
+requests Session, paced by token buckets (per chat and global, matching
+Telegram's limits) and retrying 429/5xx with the server's `retry_after`
+or exponential backoff. Credentials are read from Config and cached until
+`telegram_settings_version` changes (`invalidate_telegram_settings`, called
+by the UI on save), so new settings reach the worker process with its next
+message.
+
+Digest mode (Config `telegram_digest` = "1") merges all alerts raised inside
+a `digest()` block, e.g. one scan, into as few messages as fit Telegram's
+4096 character limit.
+
+The API base URL and credentials can be injected, so the dispatcher can be
+exercised against a local stub server.
+"""
+import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import SessionLocal, Config
+from metrics import observe
+
+TELEGRAM_API_URL = "https://api.telegram.org"
+MESSAGE_LIMIT = 4096
+DIGEST_SEPARATOR = "\n\n— — —\n\n"
+
+# Telegram: ~1 msg/s per chat, ~30 msg/s per bot
+PER_CHAT_RATE = 1.0
+PER_CHAT_BURST = 3
+GLOBAL_RATE = 30.0
+MAX_RETRIES = 5
+BACKOFF_BASE_S = 1.0
+CREDENTIALS_TTL_S = 60
+SETTINGS_VERSION_KEY = "telegram_settings_version"
+SETTINGS_KEYS = ("telegram_token", "telegram_chat_id", "telegram_digest")
+
+logger = logging.getLogger("vinted")
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def split_digest(messages, header=None, limit=MESSAGE_LIMIT):
+    """
+    Packs messages into chunks under `limit` characters (long ones are cut).
+    The header opens the first chunk, together with at least the start of
+    the first message.
+    """
+    chunks = []
+    current = ""
+    for i, msg in enumerate(messages):
+        if i == 0 and header:
+            room = max(0, limit - len(header) - len(DIGEST_SEPARATOR))
+            current = f"{header}{DIGEST_SEPARATOR}{msg[:room]}"[:limit]
+            continue
+        msg = msg[:limit]
+        candidate = f"{current}{DIGEST_SEPARATOR}{msg}" if current else msg
+        if len(candidate) <= limit:
+            current = candidate
+        else:
+            chunks.append(current)
+            current = msg
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class TelegramNotifier:
+    def __init__(self, api_url=TELEGRAM_API_URL, credentials=None, digest_enabled=None,
+                 per_chat_rate=PER_CHAT_RATE, per_chat_burst=PER_CHAT_BURST, global_rate=GLOBAL_RATE):
+        self.api_url = api_url.rstrip("/")
+        self._fixed_credentials = credentials
+        self._fixed_digest = digest_enabled
+        self._settings = None
+        self._settings_version = None
+        self._settings_loaded = 0.0
+
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self._chat_buckets = {}
+        self._global_bucket = TokenBucket(global_rate, global_rate)
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+
+        # Stats
+        self.sent = 0
+        self.failed = 0
+        self.retries = 0
+
+        self._thread = threading.Thread(target=self._run, name="telegram-notifier", daemon=True)
+        self._thread.start()
+
+    # --- Settings ---
+    def _load_settings(self):
+        db = SessionLocal()
+        try:
+            # One small lookup per call; the settings themselves only when they changed
+            version = _settings_version(db)
+            if (self._settings is None or version != self._settings_version
+                    or time.monotonic() - self._settings_loaded > CREDENTIALS_TTL_S):
+                self._settings = {c.key: c.value for c in db.query(Config).filter(Config.key.in_(SETTINGS_KEYS)).all()}
+                self._settings_version = version
+                self._settings_loaded = time.monotonic()
+        finally:
+            db.close()
+        return self._settings
+
+    def credentials(self):
+        if self._fixed_credentials:
+            return self._fixed_credentials
+        s = self._load_settings()
+        if s.get("telegram_token") and s.get("telegram_chat_id"):
+            return s["telegram_token"], s["telegram_chat_id"]
+        return None
+
+    def digest_enabled(self):
+        if self._fixed_digest is not None:
+            return self._fixed_digest
+        return self._load_settings().get("telegram_digest") == "1"
+
+    def invalidate_settings(self):
+        """Drops this process' cached settings (see invalidate_telegram_settings for all processes)."""
+        self._settings = None
+
+    # --- Producer side ---
+    def send(self, message):
+        buffer = getattr(self._local, 'digest', None)
+        if buffer is not None:
+            buffer.append(message)
+        else:
+            self._queue.put(message)
+
+    @contextmanager
+    def digest(self, title="Resumen del escaneo"):
+        """
+        Collects the messages sent in this thread and queues them merged on exit.
+        Passes through when digest mode is off or a digest is already open.
+        """
+        try:
+            enabled = getattr(self._local, 'digest', None) is None and self.digest_enabled()
+        except Exception:
+            enabled = False
+        if not enabled:
+            yield
+            return
+
+        self._local.digest = []
+        try:
+            yield
+        finally:
+            messages, self._local.digest = self._local.digest, None
+            if len(messages) == 1:
+                self._queue.put(messages[0])
+            elif messages:
+                for chunk in split_digest(messages, header=f"📬 **{title}: {len(messages)} alertas**"):
+                    self._queue.put(chunk)
+
+    def flush(self, timeout=30.0):
+        """Waits until queued messages are delivered (or dropped)."""
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < end:
+            time.sleep(0.05)
+
+    # --- Worker ---
+    def _bucket(self, chat_id):
+        if chat_id not in self._chat_buckets:
+            self._chat_buckets[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+        return self._chat_buckets[chat_id]
+
+    def _run(self):
+        while True:
+            message = self._queue.get()
+            try:
+                self._deliver(message)
+            except Exception as e:
+                self.failed += 1
+                logger.warning(f"Error enviando Telegram: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, message):
+        creds = self.credentials()
+        if not creds:
+            return
+        token, chat_id = creds
+        url = f"{self.api_url}/bot{token}/sendMessage"
+        payload = {"chat_id": chat_id, "text": message, "parse_mode": "Markdown"}
+
+        for attempt in range(MAX_RETRIES + 1):
+            self._bucket(chat_id).acquire()
+            self._global_bucket.acquire()
+            start = time.perf_counter()
+            try:
+                response = self.session.post(url, json=payload, timeout=10)
+            except requests.RequestException as e:
+                observe("telegram.send", time.perf_counter() - start, ok=False)
+                wait, reason = BACKOFF_BASE_S * 2 ** attempt, str(e)
+            else:
+                observe("telegram.send", time.perf_counter() - start, ok=response.status_code == 200)
+                if response.status_code == 200:
+                    self.sent += 1
+                    return
+                if response.status_code == 429:
+                    try:
+                        retry_after = response.json().get("parameters", {}).get("retry_after")
+                    except ValueError:
+                        retry_after = None
+                    wait = float(retry_after or response.headers.get("Retry-After") or BACKOFF_BASE_S * 2 ** attempt)
+                    reason = "429"
+                elif response.status_code >= 500:
+                    wait, reason = BACKOFF_BASE_S * 2 ** attempt, str(response.status_code)
+                else:
+                    # 400/401/403: retrying will not help
+                    self.failed += 1
+                    logger.warning(f"Telegram rechazó el mensaje ({response.status_code}): {response.text[:200]}")
+                    return
+            if attempt < MAX_RETRIES:
+                self.retries += 1
+                time.sleep(wait)
+
+        self.failed += 1
+        logger.warning(f"Error enviando Telegram tras {MAX_RETRIES} reintentos ({reason})")
+
+
+def _settings_version(db):
+    row = db.query(Config).filter_by(key=SETTINGS_VERSION_KEY).first()
+    return row.value if row else "0"
+
+
+def invalidate_telegram_settings(db):
+    """Call after the token / chat id / digest option change. Commits."""
+    row = db.query(Config).filter_by(key=SETTINGS_VERSION_KEY).first()
+    if not row:
+        db.add(Config(key=SETTINGS_VERSION_KEY, value="1"))
+    else:
+        row.value = str(int(row.value or 0) + 1)
+    db.commit()
+    if _notifier is not None:
+        _notifier.invalidate_settings()
+
+
+_notifier = None
+_notifier_lock = threading.Lock()
+
+
+def get_notifier():
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = TelegramNotifier()
+        return _notifier
@@ -0,0 +1,137 @@
+"""
+Batch persistence stage for scan results.
+
+Replaces the per-row `filter_by(url=...)` + `commit()` loop: all scraped URLs
+are resolved with chunked IN queries, new products and their first
+PriceHistory rows are inserted in bulk and price changes are applied with a
+single executemany. The running price stats of the affected searches and
+the daily price rollup are updated in the same transaction, and every
+scraped product is linked to `config` in product_searches (a product found
+by several searches belongs to all of them). Nothing is committed here; the
+caller commits once per scan.
+"""
+from sqlalchemy import func, insert, update
+
+from database import Product, PriceHistory, ProductSearch
+from price_stats import apply_price_changes
+from market import record_daily_prices, bump_data_version
+from metrics import timed
+
+# SQLite caps bound parameters per statement (999 on older builds)
+IN_CHUNK_SIZE = 900
+# Minimum change (in €) recorded as a new price point
+PRICE_CHANGE_THRESHOLD = 0.5
+
+
+def _chunks(seq, size):
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+
+def load_existing(db, urls):
+    """Returns {url: (id, price, brand, search_config_id)} for the URLs already stored."""
+    existing = {}
+    for chunk in _chunks(list(urls), IN_CHUNK_SIZE):
+        rows = db.query(Product.id, Product.url, Product.price, Product.brand, Product.search_config_id).filter(Product.url.in_(chunk)).all()
+        for pid, url, price, brand, config_id in rows:
+            existing[url] = (pid, price, brand, config_id)
+    return existing
+
+
+def link_products(db, config_id, product_ids):
+    """Links products to a search, skipping existing links. Returns how many were new."""
+    product_ids = list(product_ids)
+    linked = set()
+    for chunk in _chunks(product_ids, IN_CHUNK_SIZE):
+        linked.update(pid for (pid,) in db.query(ProductSearch.product_id).filter(
+            ProductSearch.search_config_id == config_id, ProductSearch.product_id.in_(chunk)))
+    rows = [{'product_id': pid, 'search_config_id': config_id} for pid in product_ids if pid not in linked]
+    if rows:
+        db.execute(insert(ProductSearch), rows)
+    return len(rows)
+
+
+def delete_search_config(db, config):
+    """
+    Deletes a search and the products only it found. Products other
+    searches also link to are handed to the oldest of them (ownership and
+    running stats) instead of being deleted with it. Not committed here.
+    """
+    heirs = db.query(Product.id, Product.brand, Product.price, func.min(ProductSearch.search_config_id)).join(
+        ProductSearch, ProductSearch.product_id == Product.id
+    ).filter(Product.search_config_id == config.id, ProductSearch.search_config_id != config.id).group_by(Product.id).all()
+    if heirs:
+        db.execute(update(Product), [{'id': pid, 'search_config_id': heir} for pid, _, _, heir in heirs])
+        added = {}
+        for _, brand, price, heir in heirs:
+            added.setdefault(heir, []).append((brand, price))
+        for heir, pairs in added.items():
+            apply_price_changes(db, heir, pairs)
+    # The cascade below must see the new owners, not a stale collection
+    db.expire(config, ['products'])
+    db.delete(config)
+    bump_data_version(db)
+    return len(heirs)
+
+
+def save_scan_results(db, config, results):
+    """
+    Upserts one scan's results for `config`.
+    Returns (new_products, repriced_count, linked_count); new products are
+    flushed, so they have ids. linked_count = products new to this search,
+    whether or not another search stored them first.
+    """
+    # Same URL can appear twice when a listing is bumped between pages
+    unique = {}
+    for item in results:
+        if item.get('url') and item['url'] not in unique:
+            unique[item['url']] = item
+
+    with timed("save.lookup", config.id):
+        existing = load_existing(db, unique.keys())
+
+    new_products = []
+    price_updates = []
+    history_rows = []
+    # Running stats per search: (brand, price) pairs
+    stats_added = {}
+    stats_removed = {}
+    for url, item in unique.items():
+        price = item.get('price')
+        if url not in existing:
+            new_products.append(Product(
+                search_config_id=config.id,
+                title=item.get('title'),
+                brand=item.get('brand'),
+                price=price,
+                size=item.get('size'),
+                url=url,
+                image_url=item.get('image_url')
+            ))
+            continue
+
+        pid, old_price, brand, owner_id = existing[url]
+        if price is not None and (old_price is None or abs(old_price - price) > PRICE_CHANGE_THRESHOLD):
+            price_updates.append({'id': pid, 'price': price})
+            history_rows.append({'product_id': pid, 'price': price})
+            stats_removed.setdefault(owner_id, []).append((brand, old_price))
+            stats_added.setdefault(owner_id, []).append((brand, price))
+
+    with timed("save.insert", config.id):
+        if new_products:
+            # One batched INSERT ... RETURNING id for the whole scan
+            db.add_all(new_products)
+            db.flush()
+            history_rows.extend({'product_id': p.id, 'price': p.price} for p in new_products)
+            stats_added.setdefault(config.id, []).extend((p.brand, p.price) for p in new_products)
+
+        if price_updates:
+            db.execute(update(Product), price_updates)
+        if history_rows:
+            db.execute(insert(PriceHistory), history_rows)
+            record_daily_prices(db, history_rows)
+        for config_id in set(stats_added) | set(stats_removed):
+            apply_price_changes(db, config_id, stats_added.get(config_id, ()), stats_removed.get(config_id, ()))
+        linked = link_products(db, config.id, [v[0] for v in existing.values()] + [p.id for p in new_products])
+
+    return new_products, len(price_updates), linked
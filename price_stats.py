@@ -0,0 +1,133 @@
+"""
+Running price statistics per SearchConfig (and per brand inside it).
+
+Count, mean and M2 (sum of squared deviations) are updated with Welford's
+algorithm as products are inserted or repriced, so the z-score baseline of a
+scan is one row lookup instead of loading every Product of the search.
+`recompute_stats` rebuilds everything from the products table:
+
+    python -m price_stats
+"""
+import math
+from datetime import datetime
+
+from sqlalchemy import func
+
+from database import SessionLocal, Product, SearchStats
+
+ALL_BRANDS = ""
+
+
+def welford_add(count, mean, m2, x):
+    count += 1
+    delta = x - mean
+    mean += delta / count
+    m2 += delta * (x - mean)
+    return count, mean, m2
+
+
+def welford_remove(count, mean, m2, x):
+    if count <= 1:
+        return 0, 0.0, 0.0
+    new_count = count - 1
+    new_mean = (count * mean - x) / new_count
+    m2 -= (x - mean) * (x - new_mean)
+    return new_count, new_mean, max(m2, 0.0)
+
+
+def merge(a, b):
+    """Chan et al. merge of two (count, mean, m2) triples."""
+    n_a, mean_a, m2_a = a
+    n_b, mean_b, m2_b = b
+    n = n_a + n_b
+    if n == 0:
+        return 0, 0.0, 0.0
+    delta = mean_b - mean_a
+    mean = mean_a + delta * n_b / n
+    m2 = m2_a + m2_b + delta * delta * n_a * n_b / n
+    return n, mean, m2
+
+
+def _norm_brand(brand):
+    return (brand or "").strip().lower()
+
+
+def _get_row(db, config_id, brand, cache):
+    key = (config_id, brand)
+    if key not in cache:
+        row = db.query(SearchStats).filter_by(search_config_id=config_id, brand=brand).first()
+        if row is None:
+            row = SearchStats(search_config_id=config_id, brand=brand, count=0, mean=0.0, m2=0.0)
+            db.add(row)
+            db.flush()
+        cache[key] = row
+    return cache[key]
+
+
+def apply_price_changes(db, config_id, added=(), removed=()):
+    """
+    Updates the aggregates of one search.
+    `added` / `removed` are (brand, price) pairs; a reprice is a remove of the
+    old price plus an add of the new one. Not committed here.
+    """
+    cache = {}
+    for changes, op in ((removed, welford_remove), (added, welford_add)):
+        for brand, price in changes:
+            if price is None:
+                continue
+            brand = _norm_brand(brand)
+            # Brand '' is the whole search, so unknown brands only count there
+            for key in ([ALL_BRANDS, brand] if brand else [ALL_BRANDS]):
+                row = _get_row(db, config_id, key, cache)
+                row.count, row.mean, row.m2 = op(row.count or 0, row.mean or 0.0, row.m2 or 0.0, float(price))
+                row.updated_at = datetime.utcnow()
+
+
+def get_stats(db, config_id, brand=ALL_BRANDS):
+    """(mean, std) of the current prices of a search; (0, 0) without history."""
+    row = db.query(SearchStats).filter_by(search_config_id=config_id, brand=_norm_brand(brand)).first()
+    if not row or not row.count:
+        return 0.0, 0.0
+    return row.mean, math.sqrt(row.m2 / row.count)
+
+
+def recompute_stats(db, config_id=None):
+    """Rebuilds the aggregates from products (all searches, or one). Commits."""
+    brand_col = func.lower(func.trim(func.coalesce(Product.brand, "")))
+    q = db.query(
+        Product.search_config_id,
+        brand_col,
+        func.count(Product.price),
+        func.avg(Product.price),
+        func.avg(Product.price * Product.price),
+    ).filter(Product.price.isnot(None)).group_by(Product.search_config_id, brand_col)
+    stale = db.query(SearchStats)
+    if config_id is not None:
+        q = q.filter(Product.search_config_id == config_id)
+        stale = stale.filter(SearchStats.search_config_id == config_id)
+    stale.delete(synchronize_session=False)
+
+    totals = {}
+    rows = []
+    for cid, brand, n, mean, mean_sq in q.all():
+        if not n:
+            continue
+        m2 = max(n * (mean_sq - mean * mean), 0.0)
+        if brand:
+            rows.append(SearchStats(search_config_id=cid, brand=brand, count=n, mean=mean, m2=m2))
+        totals[cid] = merge(totals.get(cid, (0, 0.0, 0.0)), (n, mean, m2))
+
+    for cid, (n, mean, m2) in totals.items():
+        rows.append(SearchStats(search_config_id=cid, brand=ALL_BRANDS, count=n, mean=mean, m2=m2))
+    db.add_all(rows)
+    db.commit()
+    return len(totals)
+
+
+if __name__ == "__main__":
+    from database import init_db
+    init_db()
+    db = SessionLocal()
+    n = recompute_stats(db)
+    db.close()
+    print(f"Estadísticas recalculadas para {n} búsquedas.")
@@ -0,0 +1,78 @@
+"""
+Product search over the `products_fts` FTS5 index (title and brand).
+
+User text is turned into an FTS5 query of quoted prefix terms, all
+required: "nike air" -> "nike"* "air"*. Accents and case are ignored by the
+tokenizer. Results are ranked by bm25 among the newest RANK_POOL matches:
+scoring every match of a very common word costs hundreds of ms on a
+million products, and the newest listings are the ones worth showing.
+Without FTS5 (SQLite built without it) the same calls fall back to a LIKE
+scan.
+"""
+import re
+
+from sqlalchemy import Column, Integer, MetaData, Table, literal_column, select, text
+
+from database import Product
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+SEARCH_COLUMNS = ("title", "brand")
+RANK_POOL = 2000
+
+# FTS5 answers "newest N matches" from the rowid order without scoring them
+SEARCH_SQL = text(
+    "SELECT rowid FROM products_fts WHERE products_fts MATCH :q AND rowid >= coalesce(("
+    "SELECT min(rowid) FROM (SELECT rowid FROM products_fts WHERE products_fts MATCH :q ORDER BY rowid DESC LIMIT :pool)"
+    "), 0) ORDER BY rank LIMIT :limit"
+)
+
+# Only for building queries; the table itself is created by database.create_fts
+products_fts = Table("products_fts", MetaData(), Column("rowid", Integer))
+
+_fts_available = None
+
+
+def fts_available(db):
+    global _fts_available
+    if _fts_available is None:
+        _fts_available = db.execute(text("SELECT 1 FROM sqlite_master WHERE name = 'products_fts'")).first() is not None
+    return _fts_available
+
+
+def fts_query(user_text, column=None):
+    """FTS5 MATCH expression for free text, or None if it has no words."""
+    tokens = TOKEN_RE.findall(user_text or "")
+    if not tokens:
+        return None
+    terms = " ".join('"' + t.replace('"', '""') + '"*' for t in tokens)
+    if column:
+        if column not in SEARCH_COLUMNS:
+            raise ValueError(f"Columna de búsqueda desconocida: {column}")
+        return f"{column} : ({terms})"
+    return terms
+
+
+def _fts_select(query):
+    return select(products_fts.c.rowid).where(literal_column("products_fts").match(query))
+
+
+def match_clause(db, user_text, column=None):
+    """WHERE clause on Product for free text (None if there is nothing to match)."""
+    query = fts_query(user_text, column)
+    if query is None:
+        return None
+    if not fts_available(db):
+        target = getattr(Product, column) if column else Product.title
+        return target.icontains(user_text.strip(), autoescape=True)
+    return Product.id.in_(_fts_select(query))
+
+
+def search_products(db, user_text, limit=200, column=None):
+    """Ids of the products matching `user_text`, best match first."""
+    query = fts_query(user_text, column)
+    if query is None:
+        return []
+    if not fts_available(db):
+        return [pid for (pid,) in db.query(Product.id).filter(match_clause(db, user_text, column))
+                .order_by(Product.scanned_at.desc()).limit(limit)]
+    return [pid for (pid,) in db.execute(SEARCH_SQL, {"q": query, "pool": max(RANK_POOL, limit), "limit": limit})]
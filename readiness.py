@@ -0,0 +1,154 @@
+"""
+Page readiness signals and the politeness policy.
+
+The scraper used to sleep a fixed time after every navigation and click
+(2-4 s, 3 s, 2 s). The helpers here return as soon as a concrete signal
+fires instead: the first grid item appears or changes (which also means
+the catalog API response behind it has arrived) or the network goes idle.
+Each one has a timeout and returns False on expiry instead of raising. In
+API mode the in-page fetch is awaited directly, so it needs no signal.
+`grid_is_empty` tells an expired grid wait on a page that loaded without
+items (no results, past the last page) from a page that never loaded.
+
+Human-like jitter is a separate PolitenessPolicy read from Config
+(`politeness_min_s` / `politeness_max_s`, both 0 to disable) so it can be
+tuned without paying for it in readiness.
+"""
+import random
+import threading
+import time
+
+from database import SessionLocal, Config
+
+GRID_TIMEOUT_MS = 10000
+NETWORK_IDLE_TIMEOUT_MS = 5000
+
+DEFAULT_POLITENESS_MIN_S = 0.5
+DEFAULT_POLITENESS_MAX_S = 1.5
+POLITENESS_TTL_S = 60
+
+FIRST_ITEM_HREF_JS = """
+(selector) => {
+    const link = document.querySelector(selector + ' a');
+    return link ? link.getAttribute('href') : null;
+}
+"""
+
+# No grid item on a fully loaded document
+GRID_EMPTY_JS = """
+(selector) => document.readyState === 'complete' && !document.querySelector(selector)
+"""
+
+# Resolves once the first grid item exists and links somewhere else than `previous`
+GRID_CHANGED_JS = """
+([selector, previous]) => {
+    const link = document.querySelector(selector + ' a');
+    return !!link && link.getAttribute('href') !== previous;
+}
+"""
+
+
+def first_item_href(page, selector):
+    try:
+        return page.evaluate(FIRST_ITEM_HREF_JS, selector)
+    except Exception:
+        return None
+
+
+def wait_for_grid(page, selector, timeout_ms=GRID_TIMEOUT_MS):
+    """True once at least one grid item is attached."""
+    try:
+        page.wait_for_selector(selector, timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def grid_is_empty(page, selector):
+    """True if the page finished loading and has no grid item (end of the catalog)."""
+    try:
+        return bool(page.evaluate(GRID_EMPTY_JS, selector))
+    except Exception:
+        return False
+
+
+def wait_for_grid_change(page, selector, previous_href, timeout_ms=GRID_TIMEOUT_MS):
+    """True once the first grid item differs from `previous_href` (survives navigations)."""
+    try:
+        page.wait_for_function(GRID_CHANGED_JS, arg=[selector, previous_href], timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def wait_for_network_idle(page, timeout_ms=NETWORK_IDLE_TIMEOUT_MS):
+    """True once there were no requests for 500 ms."""
+    try:
+        page.wait_for_load_state("networkidle", timeout=timeout_ms)
+        return True
+    except Exception:
+        return False
+
+
+def click_next_page(page, button, selector, timeout_ms=GRID_TIMEOUT_MS):
+    """
+    Clicks a pagination button and waits until the grid shows the next page,
+    i.e. its first item changes. Covers both a full navigation and the
+    client-side render that follows the catalog API response.
+    """
+    previous = first_item_href(page, selector)
+    button.click()
+    return wait_for_grid_change(page, selector, previous, timeout_ms)
+
+
+class PolitenessPolicy:
+    """Random pause between page loads so requests are not machine-regular."""
+
+    def __init__(self, min_s=DEFAULT_POLITENESS_MIN_S, max_s=DEFAULT_POLITENESS_MAX_S):
+        self.min_s = max(0.0, min_s)
+        self.max_s = max(self.min_s, max_s)
+
+    def delay(self):
+        return random.uniform(self.min_s, self.max_s)
+
+    def pause(self):
+        seconds = self.delay()
+        if seconds > 0:
+            time.sleep(seconds)
+        return seconds
+
+
+_politeness = None
+_politeness_loaded = 0.0
+_politeness_lock = threading.Lock()
+
+
+def get_politeness():
+    """Policy from Config, cached for POLITENESS_TTL_S."""
+    global _politeness, _politeness_loaded
+    with _politeness_lock:
+        if _politeness is None or time.monotonic() - _politeness_loaded > POLITENESS_TTL_S:
+            values = {}
+            try:
+                db = SessionLocal()
+                try:
+                    values = {c.key: c.value for c in db.query(Config).filter(
+                        Config.key.in_(["politeness_min_s", "politeness_max_s"])).all()}
+                finally:
+                    db.close()
+            except Exception:
+                pass
+            try:
+                _politeness = PolitenessPolicy(
+                    float(values.get("politeness_min_s", DEFAULT_POLITENESS_MIN_S)),
+                    float(values.get("politeness_max_s", DEFAULT_POLITENESS_MAX_S)),
+                )
+            except ValueError:
+                _politeness = PolitenessPolicy()
+            _politeness_loaded = time.monotonic()
+        return _politeness
+
+
+def invalidate_politeness():
+    global _politeness
+    _politeness = None
@@ -0,0 +1,197 @@
+"""
+Request filtering and traffic counters for Playwright contexts.
+
+The scraper only reads DOM text, attributes (image URLs included) and JSON,
+so images, media, fonts and third-party analytics/ads are aborted before
+they leave the browser. The policy comes from Config and can be relaxed
+from the Config page for debugging:
+
+    net_filter          "0" disables filtering
+    net_block_types     resource types to abort (default image,media,font)
+    net_allow_patterns  URL substrings/regexes that are never blocked (one per
+                        line; plain URLs match literally, invalid regexes are skipped)
+
+Every context gets a TrafficStats with requests, bytes and blocked counts.
+"""
+import logging
+import re
+
+from database import SessionLocal, Config
+
+logger = logging.getLogger("vinted")
+
+# Playwright's request.resource_type values
+RESOURCE_TYPES = ("document", "stylesheet", "image", "media", "font", "script", "texttrack",
+                  "xhr", "fetch", "eventsource", "websocket", "manifest", "other")
+DEFAULT_BLOCK_TYPES = ("image", "media", "font")
+# Third-party analytics, ads and tracking pixels seen on vinted.es
+DEFAULT_BLOCK_PATTERNS = (
+    r"google-analytics\.com",
+    r"googletagmanager\.com",
+    r"doubleclick\.net",
+    r"googlesyndication\.com",
+    r"adservice\.google\.",
+    r"facebook\.(net|com)/.*(tr|fbevents)",
+    r"connect\.facebook\.net",
+    r"hotjar\.com",
+    r"criteo\.(com|net)",
+    r"bing\.com/(bat|action)",
+    r"tiktok\.com/.*(pixel|analytics)",
+    r"snapchat\.com",
+    r"pinterest\.com/(ct|v3)",
+    r"datadoghq\.(com|eu)",
+    r"browser-intake-",
+    r"sentry\.io",
+    r"adnxs\.com",
+    r"amazon-adsystem\.com",
+    r"taboola\.com",
+)
+
+
+# A line without these is a plain URL/host and is matched literally
+REGEX_CHARS = frozenset("\\^$*+[](){}|")
+
+
+def compile_pattern(line):
+    """Regex for one line of a pattern list; raises re.error if it is an invalid regex."""
+    line = line.strip()
+    if not any(c in REGEX_CHARS for c in line):
+        return re.compile(re.escape(line))
+    return re.compile(line)
+
+
+def invalid_patterns(lines):
+    """[(line, error)] of the lines that do not compile."""
+    invalid = []
+    for line in lines:
+        if line and line.strip():
+            try:
+                compile_pattern(line)
+            except re.error as e:
+                invalid.append((line.strip(), str(e)))
+    return invalid
+
+
+def _compile(patterns):
+    compiled = []
+    for line in patterns:
+        if not line or not line.strip():
+            continue
+        try:
+            compiled.append(compile_pattern(line).pattern)
+        except re.error as e:
+            logger.warning(f"Patrón de red inválido ignorado '{line.strip()}': {e}")
+    return re.compile("|".join(f"(?:{p})" for p in compiled)) if compiled else None
+
+
+class RoutePolicy:
+    def __init__(self, block_types=DEFAULT_BLOCK_TYPES, block_patterns=DEFAULT_BLOCK_PATTERNS,
+                 allow_patterns=(), enabled=True):
+        self.enabled = enabled
+        self.block_types = frozenset(t.strip() for t in block_types if t.strip())
+        self._block_re = _compile(block_patterns)
+        self._allow_re = _compile(allow_patterns)
+
+    def should_block(self, resource_type, url):
+        if not self.enabled:
+            return False
+        if self._allow_re is not None and self._allow_re.search(url):
+            return False
+        if resource_type in self.block_types:
+            return True
+        return self._block_re is not None and self._block_re.search(url) is not None
+
+    def install(self, context, traffic=None):
+        """Routes every request of `context` through the policy."""
+        if not self.enabled:
+            return
+
+        def handle(route):
+            request = route.request
+            if self.should_block(request.resource_type, request.url):
+                if traffic is not None:
+                    traffic.blocked += 1
+                route.abort("blockedbyclient")
+            else:
+                route.continue_()
+
+        context.route("**/*", handle)
+
+
+class TrafficStats:
+    """Requests, bytes and blocked requests of one context (one page lease) or a whole pool."""
+
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.blocked = 0
+        self.failed = 0
+
+    def attach(self, target):
+        """Listens on a BrowserContext (all its pages) or a single Page."""
+        target.on("request", self._on_request)
+        target.on("requestfinished", self._on_finished)
+        target.on("requestfailed", self._on_failed)
+
+    def _on_request(self, request):
+        self.requests += 1
+
+    def _on_finished(self, request):
+        try:
+            sizes = request.sizes()
+            self.bytes += sizes["responseBodySize"] + sizes["responseHeadersSize"]
+        except Exception:
+            pass
+
+    def _on_failed(self, request):
+        # Aborted-by-policy requests also land here
+        self.failed += 1
+
+    def add(self, other):
+        self.requests += other.requests
+        self.bytes += other.bytes
+        self.blocked += other.blocked
+        self.failed += other.failed
+
+    def copy(self):
+        snapshot = TrafficStats()
+        snapshot.add(self)
+        return snapshot
+
+    def since(self, snapshot):
+        """Traffic counted after `snapshot` (a copy() of these stats) was taken."""
+        delta = TrafficStats()
+        delta.requests = self.requests - snapshot.requests
+        delta.bytes = self.bytes - snapshot.bytes
+        delta.blocked = self.blocked - snapshot.blocked
+        delta.failed = self.failed - snapshot.failed
+        return delta
+
+    def summary(self):
+        # Blocked requests are also seen by the "request" event
+        return f"{self.requests - self.blocked} peticiones, {self.bytes / 1024:.0f} KB, {self.blocked} bloqueadas"
+
+
+def load_route_policy():
+    """Builds the policy from Config; falls back to the defaults if the DB is unavailable."""
+    try:
+        db = SessionLocal()
+        try:
+            values = {c.key: c.value for c in db.query(Config).filter(
+                Config.key.in_(["net_filter", "net_block_types", "net_allow_patterns"])).all()}
+        finally:
+            db.close()
+    except Exception as e:
+        logger.warning(f"No se pudo leer la política de red, se usan los valores por defecto: {e}")
+        return RoutePolicy()
+
+    block_types = values.get("net_block_types")
+    try:
+        return RoutePolicy(
+            block_types=block_types.split(",") if block_types is not None else DEFAULT_BLOCK_TYPES,
+            allow_patterns=(values.get("net_allow_patterns") or "").splitlines(),
+            enabled=values.get("net_filter", "1") != "0",
+        )
+    except Exception as e:
+        logger.warning(f"Política de red inválida, se usan los valores por defecto: {e}")
+        return RoutePolicy()
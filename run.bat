@@ -52,6 +52,7 @@ playwright install chromium
 :: 5. RUN
 echo [4/4] Iniciando App...
 echo SI SE ABRE EL NAVEGADOR: No lo cierres, dejalo ejecutando.
+start "Vinted Worker" cmd /k python -m worker
 streamlit run app.py
 
 pause
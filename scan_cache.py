@@ -0,0 +1,131 @@
+"""
+Shared fetches between overlapping searches.
+
+Two searches hit the same catalog pages when their build_search_url output
+is the same after normalisation (parameter order, `+` vs spaces, 10 vs
+10.0...) and they have the same page budget and fetch mode.
+
+`plan_shared_fetches` groups a cycle's searches so each group is fetched
+once; `ScanCache` keeps a finished fetch for `scan_cache_ttl_min` minutes
+so a search with the same normalised URL (next due batch) reuses it
+instead of opening the browser again. A fetch may have stopped early on
+the item ids it already knew, so it is only served to a search whose
+watermark contains all of them; a new search (empty watermark) only
+reuses a fetch that had no ids to stop on. Manual scans bypass the cache.
+"""
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl, urlencode
+
+from database import Config
+from scraper import build_search_url
+
+DEFAULT_TTL_MIN = 10
+# Query parameters that do not change the result set
+VOLATILE_PARAMS = ("page", "per_page", "time", "search_id")
+
+
+def _norm_value(key, value):
+    value = value.replace("+", " ").strip()
+    if key == "search_text":
+        return " ".join(value.lower().split())
+    try:
+        number = float(value)
+    except ValueError:
+        return value
+    return str(int(number)) if number.is_integer() else str(number)
+
+
+def normalize_search_url(url, drop=()):
+    """Canonical form of a catalog URL: sorted parameters, normalised values, volatile ones removed."""
+    parts = urlsplit(url)
+    params = sorted(
+        (key, _norm_value(key, value))
+        for key, value in parse_qsl(parts.query, keep_blank_values=False)
+        if key not in VOLATILE_PARAMS and key not in drop
+    )
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}?{urlencode(params)}"
+
+
+def _budget(config):
+    return f"pages={config.max_pages or 0}&items={config.max_items or 0}&mode={config.fetch_mode or 'dom'}"
+
+
+def fetch_key(config):
+    """Cache key: normalised search URL plus the page budget and fetch mode."""
+    return f"{normalize_search_url(build_search_url(config))}|{_budget(config)}"
+
+
+def plan_shared_fetches(configs):
+    """
+    Groups SearchConfigs into [(fetcher, members)], members including the
+    fetcher: searches with the same fetch_key share one fetch. A search
+    with a narrower price range is not served by a wider fetch: the wide
+    fetch rarely stops early on ids every member has seen, and when it does
+    not finish the narrow one has to be fetched anyway.
+    """
+    groups = {}
+    for config in configs:
+        groups.setdefault(fetch_key(config), []).append(config)
+    # Keep the caller's order (scheduling priority): dicts keep insertion order
+    return [(members[0], members) for members in groups.values()]
+
+
+def read_cache_ttl(db):
+    """Minutes a finished fetch is reused (Config `scan_cache_ttl_min`, 0 disables)."""
+    row = db.query(Config).filter_by(key="scan_cache_ttl_min").first()
+    try:
+        return max(0.0, float(row.value)) if row and row.value else DEFAULT_TTL_MIN
+    except ValueError:
+        return DEFAULT_TTL_MIN
+
+
+class CachedFetch:
+    def __init__(self, batches, complete, watermark=frozenset()):
+        self.batches = batches
+        self.complete = complete
+        # Ids the fetch was allowed to stop on
+        self.watermark = frozenset(watermark or ())
+        self.fetched_at = time.monotonic()
+
+
+class ScanCache:
+    """Finished fetches (list of page batches) by fetch_key, in memory of the worker process."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, ttl_min, watermark=frozenset()):
+        """Fresh entry for `key` whose stop ids are all in `watermark`, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if (entry is None or time.monotonic() - entry.fetched_at > ttl_min * 60
+                    or not entry.watermark <= set(watermark or ())):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry
+
+    def put(self, key, batches, complete, ttl_min, watermark=frozenset()):
+        if ttl_min <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # Expired entries are dropped on write so memory stays bounded by live searches
+            for stale in [k for k, e in self._entries.items() if now - e.fetched_at > ttl_min * 60]:
+                del self._entries[stale]
+            self._entries[key] = CachedFetch(batches, complete, watermark)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_cache = ScanCache()
+
+
+def get_scan_cache():
+    return _cache
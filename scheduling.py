@@ -0,0 +1,128 @@
+"""
+Adaptive per-search scan scheduling.
+
+Each SearchConfig keeps an EWMA of its new listings per hour (`velocity`),
+updated after every scan from the new-item count and the time since
+`last_run`. The browser budget is the one of the old fixed schedule (every
+search once per `scheduler_interval` hours); it is split with scan
+frequencies proportional to sqrt(velocity), which minimises the average
+time a listing waits to be seen, and every interval is clamped to
+[scheduler_min_interval, scheduler_max_interval]. Due searches are popped
+from a heap ordered by `next_run_at`.
+"""
+import heapq
+import math
+from datetime import datetime, timedelta
+
+from database import SearchConfig, Config
+
+DEFAULT_INTERVAL_H = 6
+DEFAULT_MIN_INTERVAL_MIN = 20
+DEFAULT_MAX_INTERVAL_H = 48
+
+# EWMA time constant: an observation spanning TAU hours weighs ~63%
+VELOCITY_TAU_H = 12.0
+# Floor so a quiet search is still polled now and then
+MIN_VELOCITY = 0.05
+# Gaps longer than this (worker down, search paused) say nothing about the rate
+MAX_OBSERVATION_H = 7 * 24
+
+
+def _config_value(db, key, default, cast):
+    row = db.query(Config).filter_by(key=key).first()
+    try:
+        return cast(row.value) if row and row.value else default
+    except ValueError:
+        return default
+
+
+def read_budget(db):
+    """(base interval h, min interval h, max interval h) from Config."""
+    base_h = max(_config_value(db, "scheduler_interval", DEFAULT_INTERVAL_H, float), 0.1)
+    min_h = _config_value(db, "scheduler_min_interval", DEFAULT_MIN_INTERVAL_MIN, float) / 60.0
+    max_h = _config_value(db, "scheduler_max_interval", DEFAULT_MAX_INTERVAL_H, float)
+    return base_h, min_h, max(max_h, min_h)
+
+
+def update_velocity(velocity, new_count, elapsed_h):
+    """Time-weighted EWMA of new items/hour; returns the old value for unusable gaps."""
+    if elapsed_h <= 0 or elapsed_h > MAX_OBSERVATION_H:
+        return velocity
+    rate = new_count / elapsed_h
+    if velocity is None:
+        return rate
+    alpha = 1 - math.exp(-elapsed_h / VELOCITY_TAU_H)
+    return velocity + alpha * (rate - velocity)
+
+
+def allocate_intervals(velocities, base_h, min_h, max_h):
+    """
+    {config_id: velocity or None} -> {config_id: interval hours}.
+    Total scans/hour stays len(velocities) / base_h unless the bounds prevent it.
+    Unknown velocities get the average weight of the known ones.
+    """
+    if not velocities:
+        return {}
+    known = [math.sqrt(max(v, MIN_VELOCITY)) for v in velocities.values() if v is not None]
+    default_w = sum(known) / len(known) if known else 1.0
+    free = {cid: math.sqrt(max(v, MIN_VELOCITY)) if v is not None else default_w for cid, v in velocities.items()}
+
+    budget = len(velocities) / base_h
+    intervals = {}
+    # Clamp the ones out of bounds and spread what is left over the rest
+    while free:
+        remaining = budget - sum(1 / h for h in intervals.values())
+        total = sum(free.values())
+        ideal = {cid: total / (remaining * w) if remaining > 0 else math.inf for cid, w in free.items()}
+        # Hot searches first: capping them frees budget for the others
+        clamped = {cid: min_h for cid, h in ideal.items() if h < min_h}
+        if not clamped:
+            clamped = {cid: max_h for cid, h in ideal.items() if h > max_h}
+        if not clamped:
+            intervals.update(ideal)
+            break
+        intervals.update(clamped)
+        for cid in clamped:
+            del free[cid]
+    return intervals
+
+
+def record_scan(db, config, new_count, now=None):
+    """
+    Updates the velocity and next_run_at of `config` after a scan.
+    Call before `config.last_run` is moved to `now`. Not committed here.
+    Returns the interval in hours.
+    """
+    now = now or datetime.utcnow()
+    if config.last_run is not None:
+        elapsed_h = (now - config.last_run).total_seconds() / 3600
+        config.velocity = update_velocity(config.velocity, new_count, elapsed_h)
+
+    velocities = dict(db.query(SearchConfig.id, SearchConfig.velocity).all())
+    velocities[config.id] = config.velocity
+    interval_h = allocate_intervals(velocities, *read_budget(db))[config.id]
+    config.next_run_at = now + timedelta(hours=interval_h)
+    return interval_h
+
+
+def postpone(db, config_id, now=None):
+    """Moves a failed search one base interval ahead so it is not retried every tick. Commits."""
+    now = now or datetime.utcnow()
+    config = db.get(SearchConfig, config_id)
+    if config is not None:
+        config.next_run_at = now + timedelta(hours=read_budget(db)[0])
+        db.commit()
+
+
+def due_config_ids(db, now=None):
+    """Ids of searches whose next_run_at has passed, most overdue first (never scanned first of all)."""
+    now = now or datetime.utcnow()
+    heap = [
+        (next_run or datetime.min, -(velocity or 0), cid)
+        for cid, next_run, velocity in db.query(SearchConfig.id, SearchConfig.next_run_at, SearchConfig.velocity).all()
+    ]
+    heapq.heapify(heap)
+    due = []
+    while heap and heap[0][0] <= now:
+        due.append(heapq.heappop(heap)[2])
+    return due
@@ -1,79 +1,83 @@
+import json
 import logging
-import time
-import random
 import os
-import requests
-from io import BytesIO
-import PIL.Image
-import pillow_avif
-from playwright.sync_api import sync_playwright
-from datetime import datetime
+import re
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 
 # --- CONFIGURATION & CONSTANTS ---
-from database import SessionLocal, ScraperLog, Config
+from notifier import get_notifier
+from log_sink import install_db_log_handler
+from browser_pool import lease_page, pool_scope, current_pool
+from readiness import wait_for_grid, grid_is_empty, click_next_page, wait_for_network_idle, get_politeness
+from metrics import timed, observe, count
 
 # Logging setup - also log to DB
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-def log_to_db(message, level="INFO"):
-    """Writes log message to SQLite so Streamlit can read it."""
-    logging.info(message) # Keep console logging for Docker logs
-    try:
-        db = SessionLocal()
-        log_entry = ScraperLog(level=level, message=message, timestamp=datetime.utcnow())
-        db.add(log_entry)
-        db.commit()
-        db.close()
-    except Exception as e:
-        print(f"Failed to log to DB: {e}")
+logger = logging.getLogger("vinted")
+install_db_log_handler(logger.name)
 
-# --- TELEGRAM NOTIFIER ---
-def send_telegram_alert(message):
-    try:
-        db = SessionLocal()
-        token = db.query(Config).filter_by(key="telegram_token").first()
-        chat_id = db.query(Config).filter_by(key="telegram_chat_id").first()
-        db.close()
-        
-        if token and chat_id:
-            url = f"https://api.telegram.org/bot{token.value}/sendMessage"
-            payload = {
-                "chat_id": chat_id.value,
-                "text": message,
-                "parse_mode": "Markdown"
-            }
-            requests.post(url, json=payload, timeout=10)
-    except Exception as e:
-        log_to_db(f"Error enviando Telegram: {e}", "WARNING")
+LOG_LEVELS = {"INFO": logging.INFO, "WARNING": logging.WARNING, "ERROR": logging.ERROR}
+
+def log_to_db(message, level="INFO"):
+    """Logs to the console and, through the buffered sink, to SQLite so Streamlit can read it."""
+    logger.log(LOG_LEVELS.get(level, logging.INFO), message)
 
-# --- IMAGE PROCESSING ---
-def download_image_as_avif(image_url, product_id):
+@contextmanager
+def browser_job(job_name):
     """
-    Downloads image, converts to AVIF, saves to /app/data/images/{id}.avif
-    Returns relative path.
+    Runs a batch of scraper calls on one shared Chromium and logs how much
+    launch time the pool saved compared to one launch per call, plus the
+    job's network traffic after request filtering.
     """
-    try:
-        if not image_url: return None
-        
-        # Ensure dir exists
-        save_dir = "/app/data/images"
-        if not os.path.exists(save_dir):
-            os.makedirs(save_dir, exist_ok=True)
-            
-        filename = f"{product_id}.avif"
-        filepath = os.path.join(save_dir, filename)
-        
-        # Download
-        response = requests.get(image_url, timeout=10)
-        if response.status_code == 200:
-            img = PIL.Image.open(BytesIO(response.content))
-            # Convert
-            img.save(filepath, "AVIF", quality=50) # Aggressive compression
-            return filename
-    except Exception as e:
-        log_to_db(f"Error procesando imagen {image_url}: {e}", "WARNING")
-        return None
-    return None
+    if current_pool() is not None:
+        yield current_pool()
+        return
+
+    with pool_scope() as pool:
+        yield pool
+    stats = pool.stats()
+    log_to_db(
+        f"[{job_name}] Navegador: {stats['leases']} usos, {stats['launches']} lanzamientos, "
+        f"~{stats['saved_s']:.1f}s ahorrados (lanzamiento medio {stats['avg_launch_s']:.2f}s) | "
+        f"Red: {stats['requests']} peticiones, {stats['bytes'] / 1024:.0f} KB, {stats['blocked']} bloqueadas",
+        "INFO"
+    )
+
+# --- CONCURRENCY ---
+# Global cap of simultaneous scans/checks per target host, whatever the
+# number of scan workers
+DEFAULT_DOMAIN_CONCURRENCY = 3
+DOMAIN_CONCURRENCY = {}
+_domain_slots = {}
+_domain_lock = threading.Lock()
+
+def set_domain_concurrency(host, limit):
+    limit = max(1, int(limit))
+    with _domain_lock:
+        if DOMAIN_CONCURRENCY.get(host) == limit:
+            return
+        DOMAIN_CONCURRENCY[host] = limit
+        _domain_slots.pop(host, None)
+
+@contextmanager
+def domain_slot(url):
+    host = urlsplit(url).netloc
+    with _domain_lock:
+        if host not in _domain_slots:
+            _domain_slots[host] = threading.BoundedSemaphore(DOMAIN_CONCURRENCY.get(host, DEFAULT_DOMAIN_CONCURRENCY))
+        slot = _domain_slots[host]
+    with slot:
+        yield
+
+# --- TELEGRAM NOTIFIER ---
+def send_telegram_alert(message):
+    """Queues a Telegram message; the background notifier delivers it."""
+    count("alerts_queued")
+    get_notifier().send(message)
 
 # --- CONSTANTS (EXTENDED with real IDs or search logic) ---
 # Note: Full ID list is massive. We implement key ones and enable text fallback.
@@ -121,11 +125,21 @@ VINTED_CONDITION_IDS = {
     "Satisfactorio": "4"
 }
 
-BASE_URL = "https://www.vinted.es/catalog"
+# VINTED_HOST can point the scraper at a local fixture server (benchmarks)
+VINTED_HOST = os.environ.get("VINTED_HOST", "https://www.vinted.es").rstrip("/")
+BASE_URL = f"{VINTED_HOST}/catalog"
+CATALOG_API_URL = f"{VINTED_HOST}/api/v2/catalog/items"
+BRANDS_API_URL = f"{VINTED_HOST}/api/v2/catalog/brands"
+API_PER_PAGE = 96
 
-def build_search_url(config):
+FETCH_MODES = {
+    "HTML (DOM)": "dom",
+    "API JSON": "api"
+}
+
+def _search_params(config):
     """
-    Constructs the Vinted search URL based on SearchConfig object (enhanced).
+    Search filters of a SearchConfig as (key, value) pairs, in URL order.
     """
     query_params = []
     
@@ -139,182 +153,404 @@ def build_search_url(config):
             search_text = config.brand_name
             
     if search_text:
-        query_params.append(f"search_text={search_text.replace(' ', '+')}")
+        query_params.append(("search_text", search_text.replace(' ', '+')))
     
     # 2. Price
-    if config.min_price is not None: query_params.append(f"price_from={config.min_price}")
-    if config.max_price is not None: query_params.append(f"price_to={config.max_price}")
+    if config.min_price is not None: query_params.append(("price_from", config.min_price))
+    if config.max_price is not None: query_params.append(("price_to", config.max_price))
         
     # 3. Size
     if config.sizes:
         for s in config.sizes.split(','):
-            if s in VINTED_SIZE_IDS: query_params.append(f"size_ids[]={VINTED_SIZE_IDS[s]}")
+            if s in VINTED_SIZE_IDS: query_params.append(("size_ids[]", VINTED_SIZE_IDS[s]))
             
     # 4. Condition
     if config.condition:
         for c in config.condition.split(','):
-            if c in VINTED_CONDITION_IDS: query_params.append(f"status_ids[]={VINTED_CONDITION_IDS[c]}")
+            if c in VINTED_CONDITION_IDS: query_params.append(("status_ids[]", VINTED_CONDITION_IDS[c]))
     
     # 5. Colors (New)
     if hasattr(config, 'color_ids') and config.color_ids:
         for c_name in config.color_ids.split(','):
             if c_name in VINTED_COLOR_IDS:
-                query_params.append(f"color_ids[]={VINTED_COLOR_IDS[c_name]}")
+                query_params.append(("color_ids[]", VINTED_COLOR_IDS[c_name]))
 
     # 6. Catalogs (New)
     if hasattr(config, 'catalog_ids') and config.catalog_ids:
         for cat_name in config.catalog_ids.split(','):
             if cat_name in VINTED_CATALOG_IDS:
-                query_params.append(f"catalog[]={VINTED_CATALOG_IDS[cat_name]}")
+                query_params.append(("catalog[]", VINTED_CATALOG_IDS[cat_name]))
 
-    query_params.append("order=newest_first")
-    
+    query_params.append(("order", "newest_first"))
+    return query_params
+
+def build_search_url(config):
+    """
+    Constructs the Vinted search URL based on SearchConfig object (enhanced).
+    """
+    query_params = [f"{k}={v}" for k, v in _search_params(config)]
     url = f"{BASE_URL}?{'&'.join(query_params)}"
     return url
 
-def scrape_vinted(search_config):
-    results = []
+def build_catalog_api_url(config, page_idx):
+    """
+    Same filters as build_search_url, in the shape /api/v2/catalog/items expects
+    (comma separated id lists, explicit pagination).
+    """
+    grouped = {}
+    for key, value in _search_params(config):
+        key = "catalog_ids" if key == "catalog[]" else key.replace("[]", "")
+        grouped.setdefault(key, []).append(str(value))
+
+    query_params = [f"page={page_idx}", f"per_page={API_PER_PAGE}"]
+    query_params += [f"{k}={','.join(v)}" for k, v in grouped.items()]
+    return f"{CATALOG_API_URL}?{'&'.join(query_params)}"
+
+# --- INCREMENTAL SCANS ---
+# Results are sorted newest first, so once a whole page is already known the
+# rest of the pagination was seen on a previous run.
+WATERMARK_SIZE = 500
+ITEM_ID_RE = re.compile(r'/items/(\d+)')
+
+def item_id_from_url(url):
+    """Vinted item id from a product URL (falls back to the URL itself)."""
+    match = ITEM_ID_RE.search(url or "")
+    return match.group(1) if match else url
+
+def load_watermark(config):
+    raw = getattr(config, 'seen_watermark', None)
+    if not raw:
+        return set()
+    try:
+        return set(json.loads(raw))
+    except (TypeError, ValueError):
+        return set()
+
+def update_watermark(config, results):
+    """Prepends this run's item ids to the stored watermark, newest first."""
+    previous = []
+    if getattr(config, 'seen_watermark', None):
+        try:
+            previous = json.loads(config.seen_watermark)
+        except (TypeError, ValueError):
+            previous = []
+
+    merged = []
+    seen = set()
+    for item_id in [item_id_from_url(r['url']) for r in results] + previous:
+        if item_id not in seen:
+            seen.add(item_id)
+            merged.append(item_id)
+    config.seen_watermark = json.dumps(merged[:WATERMARK_SIZE])
+
+def page_fully_known(page_items, watermark):
+    return bool(watermark) and bool(page_items) and all(
+        item_id_from_url(item['url']) in watermark for item in page_items
+    )
+
+GRID_ITEM_SELECTOR = 'div[data-testid="grid-item"]'
+PRICE_RE = re.compile(r'(\d+[,.]\d{2})\s?€?')
+
+# Runs inside the page and returns plain data for every grid item.
+# Title fallback order: [data-testid*="title"] -> link title -> img alt (if the title caught a price).
+GRID_EXTRACT_JS = """
+(selector) => Array.from(document.querySelectorAll(selector)).map((item) => {
+    let title = "";
+    const titleEl = item.querySelector('[data-testid*="title"]');
+    if (titleEl) {
+        title = titleEl.innerText.trim();
+    } else {
+        const linkEl = item.querySelector('a[data-testid="item-box-overlay"]') || item.querySelector('a');
+        if (linkEl) title = linkEl.getAttribute('title') || "";
+    }
+    const img = item.querySelector('img');
+    if (title.includes('€') && img) {
+        title = img.getAttribute('alt') || title;
+    }
+    const link = item.querySelector('a');
+    const subtitle = item.querySelector('p[data-testid="grid-item-subtitle"]');
+    return {
+        title: title,
+        url: link ? link.getAttribute('href') : null,
+        text: item.innerText,
+        image_url: img ? img.getAttribute('src') : null,
+        brand: subtitle ? subtitle.innerText : null
+    };
+})
+"""
+
+def parse_grid_item(raw):
+    """Turns one GRID_EXTRACT_JS record into a result dict (None if it has no link)."""
+    url = raw.get('url')
+    if not url:
+        return None
+    if not url.startswith("http"): url = f"{VINTED_HOST}{url}"
+
+    # Vinted prices format: "10,00 €"
+    price = 0.0
+    price_match = PRICE_RE.search(raw.get('text') or "")
+    if price_match:
+        price = float(price_match.group(1).replace(',', '.'))
+
+    return {
+        'title': raw.get('title') or "",
+        'price': price,
+        'url': url,
+        'image_url': raw.get('image_url'),
+        'brand': raw.get('brand') or "Desconocida",
+        # Size is not exposed separately in the grid (sometimes mixed with brand)
+        'size': "N/A"
+    }
+
+# In-page fetch so the request carries the session cookies set by the catalog page
+FETCH_JSON_JS = """
+async (url) => {
+    try {
+        const response = await fetch(url, {headers: {"Accept": "application/json"}, credentials: "include"});
+        if (!response.ok) return {error: response.status};
+        return await response.json();
+    } catch (e) {
+        return {error: String(e)};
+    }
+}
+"""
+
+def parse_api_item(raw):
+    """Maps one /api/v2/catalog/items entry to the same dict parse_grid_item returns."""
+    url = raw.get('url') or raw.get('path')
+    if not url:
+        return None
+    if not url.startswith("http"): url = f"{VINTED_HOST}{url}"
+
+    price = raw.get('price')
+    if isinstance(price, dict):
+        price = price.get('amount')
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        price = 0.0
+
+    photo = raw.get('photo') or {}
+    return {
+        'title': raw.get('title') or "",
+        'price': price,
+        'url': url,
+        'image_url': photo.get('url'),
+        'brand': raw.get('brand_title') or "Desconocida",
+        'size': raw.get('size_title') or "N/A"
+    }
+
+def _mark_complete(outcome):
+    # The scan reached already-seen items or the last page, not its budget
+    if outcome is not None:
+        outcome['complete'] = True
+
+def scrape_catalog_api(page, search_config, watermark=None, outcome=None):
+    """
+    Reads the catalog through the JSON API from an already opened Vinted page,
+    yielding one list of items per page.
+    Raises before the first batch if the first page is not usable, so the
+    caller can fall back to the DOM.
+    """
+    if watermark is None:
+        watermark = load_watermark(search_config)
+    config_id = getattr(search_config, 'id', None)
+    page_idx = 1
+    total_items = 0
+    
+    while True:
+        if search_config.max_pages and page_idx > search_config.max_pages:
+            log_to_db(f"Límite de páginas ({search_config.max_pages}) alcanzado.", "INFO")
+            break
+        if search_config.max_items and total_items >= search_config.max_items:
+            log_to_db(f"Límite de items ({search_config.max_items}) alcanzado.", "INFO")
+            break
+
+        log_to_db(f"Procesando página {page_idx} (API)...", "INFO")
+        with timed("scrape.api_fetch", config_id):
+            data = page.evaluate(FETCH_JSON_JS, build_catalog_api_url(search_config, page_idx))
+        
+        if not data or 'items' not in data:
+            error = data.get('error') if isinstance(data, dict) else data
+            if page_idx == 1:
+                raise RuntimeError(f"respuesta de API inválida: {error}")
+            log_to_db(f"API sin datos en página {page_idx} ({error}), se detiene la paginación.", "WARNING")
+            break
+        
+        if not data['items']:
+            _mark_complete(outcome)
+            break
+        
+        page_items = []
+        for raw in data['items']:
+            if search_config.max_items and total_items >= search_config.max_items: break
+            item = parse_api_item(raw)
+            if item:
+                page_items.append(item)
+                total_items += 1
+        
+        if page_items:
+            yield page_items
+        
+        if page_fully_known(page_items, watermark):
+            log_to_db(f"Página {page_idx} ya vista en el escaneo anterior. Fin incremental.", "INFO")
+            _mark_complete(outcome)
+            break
+        
+        total_pages = (data.get('pagination') or {}).get('total_pages')
+        if total_pages and page_idx >= total_pages:
+            _mark_complete(outcome)
+            break
+        page_idx += 1
+
+def scrape_catalog_dom(page, search_config, watermark=None, outcome=None):
+    """
+    Parses the HTML catalog grid of an already opened Vinted page, following
+    the "next" button and yielding one list of items per page.
+    """
+    if watermark is None:
+        watermark = load_watermark(search_config)
+    politeness = get_politeness()
+    config_id = getattr(search_config, 'id', None)
+    page_idx = 1
+    total_items = 0
+    
+    while True:
+        # Breaks if limits reached
+        if search_config.max_pages and page_idx > search_config.max_pages:
+            log_to_db(f"Límite de páginas ({search_config.max_pages}) alcanzado.", "INFO")
+            break
+        if search_config.max_items and total_items >= search_config.max_items:
+            log_to_db(f"Límite de items ({search_config.max_items}) alcanzado.", "INFO")
+            break
+
+        log_to_db(f"Procesando página {page_idx}...", "INFO")
+        
+        start = time.perf_counter()
+        ready = wait_for_grid(page, GRID_ITEM_SELECTOR)
+        # A loaded page without items is the end of the catalog, not a readiness failure
+        end_of_catalog = not ready and grid_is_empty(page, GRID_ITEM_SELECTOR)
+        observe("scrape.readiness", time.perf_counter() - start, config_id, ok=ready or end_of_catalog)
+        if end_of_catalog:
+            log_to_db("No hay más productos (fin del catálogo).", "INFO")
+            _mark_complete(outcome)
+            break
+        if not ready:
+            log_to_db(f"La página {page_idx} no cargó a tiempo.", "WARNING")
+            break
+        
+        with timed("scrape.extraction", config_id):
+            # One round trip for the whole grid instead of ~10 RPCs per item
+            raw_items = page.evaluate(GRID_EXTRACT_JS, GRID_ITEM_SELECTOR)
+            
+            page_items = []
+            for raw in raw_items or []:
+                if search_config.max_items and total_items >= search_config.max_items: break
+                
+                item = parse_grid_item(raw)
+                if item:
+                    page_items.append(item)
+                    total_items += 1
+        
+        if not raw_items:
+            _mark_complete(outcome)
+            break
+        
+        if page_items:
+            yield page_items
+        
+        if page_fully_known(page_items, watermark):
+            log_to_db(f"Página {page_idx} ya vista en el escaneo anterior. Fin incremental.", "INFO")
+            _mark_complete(outcome)
+            break
+        
+        # Next Page logic
+        page_idx += 1
+        try:
+            # Generic next button check or URL manipulation
+            # Vinted usually uses URL params, so we can check if "Next" button exists
+            next_btn = page.query_selector('a[data-testid="pagination-next-button"]');
+            if not next_btn or "disabled" in (next_btn.get_attribute('class') or ""):
+                 _mark_complete(outcome)
+                 break
+            politeness.pause()
+            start = time.perf_counter()
+            loaded = click_next_page(page, next_btn, GRID_ITEM_SELECTOR)
+            observe("scrape.pagination", time.perf_counter() - start, config_id, ok=loaded)
+            if not loaded:
+                log_to_db(f"La página {page_idx} no cargó a tiempo.", "WARNING")
+                break
+        except:
+            break
+
+def iter_scrape_vinted(search_config, watermark=None, outcome=None):
+    """
+    Streams a search: yields one list of items per catalog page as soon as
+    it is parsed, so the caller can persist and alert before pagination ends.
+    Errors end the stream (pages already yielded stay valid).
+    `watermark` overrides the search's own seen ids (shared fetches).
+    `outcome`, if given, gets 'finished' (no error) and 'complete' (stopped
+    on seen items or the last page rather than on the budget).
+    """
     term = search_config.term or getattr(search_config, 'brand_name', None) or "Sin término"
+    fetch_mode = getattr(search_config, 'fetch_mode', None) or "dom"
+    config_id = getattr(search_config, 'id', None)
     log_to_db(f"Iniciando búsqueda avanzada: {term}")
 
     search_url = build_search_url(search_config)
     log_to_db(f"URL: {search_url}")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+    total = 0
+    try:
+        with domain_slot(search_url), lease_page(
+            f"Escaneo {term}",
             # Human-like viewport
             viewport={"width": 1366, "height": 768},
             locale="es-ES"
-        )
-        
-        page = context.new_page()
-        
-        try:
+        ) as page:
             log_to_db("Navegando a Vinted...", "INFO")
-            page.goto(search_url, timeout=60000)
-            
-            # Anti-bot / Cookie handling
-            try:
-                page.click('#onetrust-accept-btn-handler', timeout=3000)
-            except: pass
-
-            time.sleep(random.uniform(2, 4)) 
-            
-            # --- PARSING AND PAGINATION ---
-
-            page_idx = 1
-            total_items = 0
-            
-            while True:
-                # Breaks if limits reached
-                if search_config.max_pages and page_idx > search_config.max_pages:
-                    log_to_db(f"Límite de páginas ({search_config.max_pages}) alcanzado.", "INFO")
-                    break
-                if search_config.max_items and total_items >= search_config.max_items:
-                    log_to_db(f"Límite de items ({search_config.max_items}) alcanzado.", "INFO")
-                    break
-
-                log_to_db(f"Procesando página {page_idx}...", "INFO")
+            with timed("scrape.navigation", config_id):
+                # The grid / API readiness checks below replace waiting for every subresource
+                page.goto(search_url, timeout=60000, wait_until="domcontentloaded")
                 
+                # Anti-bot / Cookie handling
                 try:
-                    page.wait_for_selector('div[data-testid="grid-item"]', timeout=10000)
-                except Exception:
-                    log_to_db("No se encontraron más productos o fin de paginación.", "WARNING")
-                    break
-                
-                items = page.query_selector_all('div[data-testid="grid-item"]')
-                
-                if not items:
-                    break
-                    
-                for item in items:
-                    if search_config.max_items and total_items >= search_config.max_items: break
-                    
-                    try:
-                        # --- ROBUST PARSING STRATEGY ---
-                        # Title: looking for specific header or class to avoid polluting with price
-                        # Usually it is inside a hierarchy. Let's find the product info container.
-                        title_cand = ""
-                        
-                        # Strategy 1: specific data-testid
-                        title_el = item.query_selector('[data-testid*="title"]')
-                        if title_el:
-                            title_cand = title_el.inner_text().strip()
-                        else:
-                            # Strategy 2: second text block usually (after user info)
-                            # This is risky, let's try finding the link which usually contains the title in aria-label or within
-                            link_el = item.query_selector('a[data-testid="item-box-overlay"]') or item.query_selector('a')
-                            if link_el:
-                                title_cand = link_el.get_attribute('title') or ""
-                        
-                        # Fallback clean-up if title still looks messy
-                        # Remove price patterns if accidentally caught
-                        if "€" in title_cand:
-                            # Heuristic: split by newline and take valid part? 
-                            # If parser failed, we might use the image alt text
-                            img = item.query_selector('img')
-                            if img: title_cand = img.get_attribute('alt') or title_cand
-
-                        url_el = item.query_selector('a')
-                        url = url_el.get_attribute('href') if url_el else None
-                        
-                        # Price
-                        price_str = "0.0"
-                        # Try finding element with price text content
-                        # Vinted prices format: "10,00 €"
-                        text_content = item.inner_text()
-                        # Regex filter for price might be safer than selecting random divs
-                        import re
-                        price_match = re.search(r'(\d+[,.]\d{2})\s?€?', text_content)
-                        if price_match:
-                            price_str = price_match.group(1).replace(',', '.')
-                        
-                        # Brand (often hidden or in specific footer)
-                        brand = item.query_selector('p[data-testid="grid-item-subtitle"]') # Common for brand/size
-                        brand_txt = brand.inner_text() if brand else "Desconocida"
-                        
-                        # Size (sometimes mixed with brand)
-                        size_txt = "N/A"
-                        # Try to parse from subtitle if format is "Brand / Size"
-                        
-                        if url:
-                            if not url.startswith("http"): url = f"https://www.vinted.es{url}"
-                            
-                            results.append({
-                                'title': title_cand,
-                                'price': float(price_str) if price_str else 0.0,
-                                'url': url,
-                                'image_url': item.query_selector('img').get_attribute('src') if item.query_selector('img') else None,
-                                'brand': brand_txt,
-                                'size': size_txt
-                            })
-                            total_items += 1
-                            
-                    except Exception as e:
-                        continue
-                
-                # Next Page logic
-                page_idx += 1
+                    page.click('#onetrust-accept-btn-handler', timeout=3000)
+                except: pass
+
+            api_ok = False
+            if fetch_mode == "api":
                 try:
-                    # Generic next button check or URL manipulation
-                    # Vinted usually uses URL params, so we can check if "Next" button exists
-                    next_btn = page.query_selector('a[data-testid="pagination-next-button"]');
-                    if not next_btn or "disabled" in next_btn.get_attribute('class'):
-                         break
-                    next_btn.click()
-                    page.wait_for_timeout(3000) # Wait for load
-                    # Alternatively, update URL param logic if loop handles goto
-                except:
-                    break
+                    for batch in scrape_catalog_api(page, search_config, watermark, outcome):
+                        api_ok = True
+                        total += len(batch)
+                        count("items_scraped", len(batch), config_id)
+                        yield batch
+                    api_ok = True
+                except Exception as e:
+                    if api_ok:
+                        raise
+                    log_to_db(f"Modo API falló ({e}). Usando parser HTML.", "WARNING")
             
-            browser.close()
+            if not api_ok:
+                get_politeness().pause()
+                for batch in scrape_catalog_dom(page, search_config, watermark, outcome):
+                    total += len(batch)
+                    count("items_scraped", len(batch), config_id)
+                    yield batch
             
-        except Exception as e:
-            log_to_db(f"Error crítico en scraper: {e}", "ERROR")
+            if outcome is not None:
+                outcome['finished'] = True
+    except Exception as e:
+        log_to_db(f"Error crítico en scraper: {e}", "ERROR")
 
-    log_to_db(f"Búsqueda finalizada. {len(results)} items extraídos.", "INFO")
+    log_to_db(f"Búsqueda finalizada. {total} items extraídos.", "INFO")
+
+def scrape_vinted(search_config):
+    """List-returning wrapper around iter_scrape_vinted."""
+    results = []
+    for batch in iter_scrape_vinted(search_config):
+        results.extend(batch)
     return results
 
 def fetch_vinted_brands(keyword=""):
@@ -325,16 +561,8 @@ def fetch_vinted_brands(keyword=""):
     brands = []
     log_to_db(f"Buscando marcas: '{keyword}'", "INFO")
     
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        # Use a context to keep cookies if needed, or just new page
-        context = browser.new_context(
-            user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-            locale="es-ES"
-        )
-        page = context.new_page()
-        
-        try:
+    try:
+        with domain_slot(VINTED_HOST), lease_page("Marcas", locale="es-ES") as page:
             # Vinted hidden API for brands usually accessed via:
             # https://www.vinted.es/api/v2/catalog/brands?search_text=nike
             # But access is protected.
@@ -342,16 +570,17 @@ def fetch_vinted_brands(keyword=""):
             # Let's try navigating to the catalog page and intercepting the response or using a specific search page.
             
             # METHOD A: Use the autocomplete API endpoint (often easiest if cookies set)
-            page.goto("https://www.vinted.es", timeout=30000)
+            page.goto(VINTED_HOST, timeout=30000)
             try: page.click('#onetrust-accept-btn-handler')
             except: pass
             
-            # Wait for session
-            time.sleep(2)
+            # Wait for session (cookies are set by the requests of the home page)
+            wait_for_network_idle(page)
+            get_politeness().pause()
             
             # Direct API call via page context (to use auth/cookies)
             # URL: /api/v2/catalog/brands?search_text={keyword}
-            api_url = f"https://www.vinted.es/api/v2/catalog/brands?search_text={keyword}" if keyword else "https://www.vinted.es/api/v2/catalog/brands"
+            api_url = f"{BRANDS_API_URL}?search_text={keyword}" if keyword else BRANDS_API_URL
             
             # JavaScript evaluation to fetch data
             data = page.evaluate(f'''async () => {{
@@ -369,24 +598,29 @@ def fetch_vinted_brands(keyword=""):
             
             log_to_db(f"Encontradas {len(brands)} marcas.", "INFO")
             
-        except Exception as e:
-             log_to_db(f"Error buscando marcas: {e}", "ERROR")
-             
-        browser.close()
+    except Exception as e:
+         log_to_db(f"Error buscando marcas: {e}", "ERROR")
         
     return brands
 
-def verify_sold_status(product_url):
+def _check_sold_page(product_url):
     """
-    Checks a specific product URL to see if it's sold or deleted.
-    Returns: 'sold', 'active', 'deleted'
+    Browser check of one product page: 'sold', 'active' or 'deleted' (404 or
+    redirect to the home page); None if the answer could not be trusted.
     """
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page(user_agent="Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36")
-        try:
-            page.goto(product_url, timeout=30000)
-            
+    try:
+        with domain_slot(product_url), lease_page("Comprobación vendido") as page:
+            response = page.goto(product_url, timeout=30000)
+            if response is None:
+                return None
+            if response.status in (404, 410):
+                return 'deleted'
+            if response.status >= 400:
+                return None
+            # Removed items redirect to the home page
+            if urlsplit(page.url).path in ("", "/"):
+                return 'deleted'
+
             # Check for 'Sold' text (Vinted specific classes or text)
             # Usually strict text search is safest vs Class changes
             content = page.content().lower()
@@ -401,16 +635,21 @@ def verify_sold_status(product_url):
                 if not buy_btn:
                     # If no buy button, often sold or reserved
                     return 'sold'
-            
-            # Check title to ensure page loaded
-            if page.title() == "Vinted": # Redirected to home
-                return 'deleted'
-                
+
             return 'active'
-        except Exception:
-            return 'deleted' # Assume deleted if 404/Timeout
-        finally:
-            browser.close()
+    except Exception:
+        return None
+
+def verify_sold_status(product_url):
+    """
+    Checks a specific product URL to see if it's sold or deleted.
+    Returns: 'sold', 'active', 'deleted', or None if the page could not be
+    checked (timeouts and load errors are not a deletion).
+    """
+    start = time.perf_counter()
+    status = _check_sold_page(product_url)
+    observe("sold.browser_check", time.perf_counter() - start, ok=status is not None)
+    return status
 
 if __name__ == "__main__":
     pass# Test function
@@ -0,0 +1,313 @@
+"""
+HTTP-first sold-status verification.
+
+Each product is checked over a pooled requests Session: first the item JSON
+endpoint (/api/v2/items/<id>) and, when that is not usable, the item page
+itself, whose embedded state carries the same is_sold / is_closed flags.
+Requests run with bounded concurrency (asyncio over a thread pool) and a
+global request rate. Only products whose answer is ambiguous or blocked go
+through the old Playwright check, up to a fallback budget.
+
+`classify_item_status` is pure: status code + body in, status out.
+
+Which products get the budget is decided by `select_candidates`: each unsold
+product is scored by the probability that its status changed since it was
+last checked (see `change_probability`) and the top ones are taken.
+"""
+import asyncio
+import heapq
+import json
+import logging
+import math
+import re
+import threading
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from browser_pool import USER_AGENT
+from database import Config, Product, SearchStats
+from notifier import TokenBucket
+from metrics import observe
+from scraper import VINTED_HOST, ITEM_ID_RE, _check_sold_page, browser_job
+
+SOLD = "sold"
+ACTIVE = "active"
+DELETED = "deleted"
+UNKNOWN = "unknown"
+BLOCKED = "blocked"
+FINAL_STATUSES = (SOLD, ACTIVE, DELETED)
+
+ITEM_API_URL = f"{VINTED_HOST}/api/v2/items/{{item_id}}"
+
+DEFAULT_BUDGET = 2000          # Products per sold-check run
+DEFAULT_CONCURRENCY = 8        # HTTP requests in flight
+DEFAULT_RATE = 8.0             # HTTP requests per second
+DEFAULT_FALLBACK_BUDGET = 50   # Browser checks per run
+API_DISABLE_AFTER = 3          # 401/403 answers before the run stops trying the JSON endpoint
+BLOCKED_STREAK_ABORT = 15      # Consecutive blocked answers before the fast path gives up
+REQUEST_TIMEOUT_S = 15
+
+FLAG_KEYS = ("is_sold", "is_closed", "is_draft", "is_deleted")
+# Anti-bot interstitials that come back with a 200
+BLOCK_MARKERS = ("captcha-delivery.com", "datadome", "cf-chl-", "challenge-platform")
+NEXT_DATA_RE = re.compile(r'<script[^>]*id="__NEXT_DATA__"[^>]*>(.*?)</script>', re.S)
+# Flags inside streamed (possibly JS-escaped) page state
+FLAG_RE = re.compile(r'\\?"(is_sold|is_closed|is_draft|is_deleted)\\?"\s*:\s*(true|false)')
+FLAG_WINDOW = 4000
+TITLE_RE = re.compile(r"<title>(.*?)</title>", re.S | re.I)
+
+logger = logging.getLogger("vinted")
+
+
+def _status_from_flags(flags):
+    if not flags:
+        return UNKNOWN
+    if flags.get("is_deleted") or flags.get("is_draft"):
+        return DELETED
+    if flags.get("is_sold") or flags.get("is_closed"):
+        return SOLD
+    return ACTIVE
+
+
+def _find_item(obj, item_id):
+    """Depth-first search for the dict describing item `item_id` in page state."""
+    stack = [obj]
+    while stack:
+        node = stack.pop()
+        if isinstance(node, dict):
+            if str(node.get("id")) == str(item_id) and any(k in node for k in FLAG_KEYS):
+                return node
+            stack.extend(node.values())
+        elif isinstance(node, list):
+            stack.extend(node)
+    return None
+
+
+def _flags_near_id(body, item_id):
+    """Flags that follow the item's own `"id":<item_id>` in inline state."""
+    match = re.search(r'\\?"id\\?"\s*:\s*' + re.escape(str(item_id)) + r'\b', body)
+    if not match:
+        return {}
+    flags = {}
+    for name, value in FLAG_RE.findall(body[match.end():match.end() + FLAG_WINDOW]):
+        flags.setdefault(name, value == "true")
+    return flags
+
+
+def classify_item_status(status_code, body, content_type="", item_id=None, final_url=None):
+    """
+    Maps one HTTP answer for an item (JSON endpoint or HTML page) to
+    sold / active / deleted, or unknown / blocked when it cannot tell.
+    """
+    if status_code in (404, 410):
+        return DELETED
+    if status_code in (401, 403, 429) or status_code >= 500:
+        return BLOCKED
+    if status_code != 200 or not body:
+        return UNKNOWN
+
+    if "json" in (content_type or "") or body.lstrip().startswith("{"):
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return UNKNOWN
+        item = data.get("item") if isinstance(data, dict) else None
+        if not isinstance(item, dict):
+            return UNKNOWN
+        return _status_from_flags({k: item[k] for k in FLAG_KEYS if k in item})
+
+    if any(marker in body for marker in BLOCK_MARKERS):
+        return BLOCKED
+    # Removed items redirect to the home page
+    if final_url and urlsplit(final_url).path in ("", "/"):
+        return DELETED
+
+    next_data = NEXT_DATA_RE.search(body)
+    if next_data and item_id is not None:
+        try:
+            item = _find_item(json.loads(next_data.group(1)), item_id)
+        except ValueError:
+            item = None
+        if item is not None:
+            return _status_from_flags({k: item[k] for k in FLAG_KEYS if k in item})
+    if item_id is not None:
+        status = _status_from_flags(_flags_near_id(body, item_id))
+        if status != UNKNOWN:
+            return status
+
+    # Markup heuristics of the browser check
+    if 'data-testid="item-status-banner"' in body:
+        return SOLD
+    if 'data-testid="item-buy-button"' in body:
+        return ACTIVE
+    title = TITLE_RE.search(body)
+    if title and title.group(1).strip() == "Vinted":
+        return DELETED
+    return UNKNOWN
+
+
+# Selection policy. Hazard = chance per day that a listing sells or is removed.
+BASE_HAZARD_PER_DAY = 0.08
+PRICE_ELASTICITY = 1.5       # Cheaper than the search mean -> sells faster
+HAZARD_PRICE_RANGE = (0.25, 4.0)
+AGE_HALF_LIFE_DAYS = 21.0    # Listings unsold after weeks sell more slowly
+ACTIVE_CHECK_DECAY = 0.85    # Each "still active" answer lowers the hazard
+MIN_RECHECK_HOURS = 12
+
+
+def change_probability(age_days, days_since_check, price=None, mean_price=None, active_checks=0):
+    """
+    P(status changed since the last check) under a constant hazard over the
+    unchecked window. The hazard scales with price relative to the search
+    mean, decays with listing age and with every check that found it active.
+    """
+    hazard = BASE_HAZARD_PER_DAY
+    if price and mean_price and price > 0 and mean_price > 0:
+        lo, hi = HAZARD_PRICE_RANGE
+        hazard *= min(hi, max(lo, (mean_price / price) ** PRICE_ELASTICITY))
+    hazard *= 0.5 ** (max(age_days, 0.0) / AGE_HALF_LIFE_DAYS)
+    hazard *= ACTIVE_CHECK_DECAY ** (active_checks or 0)
+    return 1.0 - math.exp(-hazard * max(days_since_check, 0.0))
+
+
+def select_candidates(db, budget, now=None):
+    """
+    The `budget` unsold products with the highest change probability, as
+    (id, url, check_count) tuples. Products checked in the last
+    MIN_RECHECK_HOURS are skipped.
+    """
+    now = now or datetime.utcnow()
+    means = dict(db.query(SearchStats.search_config_id, SearchStats.mean).filter(SearchStats.brand == "").all())
+    rows = db.query(
+        Product.id, Product.url, Product.price, Product.search_config_id,
+        Product.scanned_at, Product.last_checked_at, Product.check_count
+    ).filter(Product.is_sold == 0).yield_per(5000)
+
+    def scored():
+        for pid, url, price, config_id, scanned_at, last_checked, checks in rows:
+            first_seen = scanned_at or now
+            since = last_checked or first_seen
+            if last_checked and (now - last_checked).total_seconds() < MIN_RECHECK_HOURS * 3600:
+                continue
+            p = change_probability(
+                (now - first_seen).total_seconds() / 86400,
+                (now - since).total_seconds() / 86400,
+                price, means.get(config_id), checks
+            )
+            yield p, pid, url, checks or 0
+
+    # Streamed into a heap of `budget` entries, not a list of every unsold product
+    return [(pid, url, checks) for _, pid, url, checks in heapq.nlargest(budget, scored())]
+
+
+SETTINGS = {
+    "sold_check_budget": DEFAULT_BUDGET,
+    "sold_check_concurrency": DEFAULT_CONCURRENCY,
+    "sold_check_rate": DEFAULT_RATE,
+    "sold_check_fallback": DEFAULT_FALLBACK_BUDGET,
+}
+
+
+def read_sold_check_settings(db):
+    """{setting: value} from Config, with the defaults above."""
+    rows = {c.key: c.value for c in db.query(Config).filter(Config.key.in_(list(SETTINGS))).all()}
+    values = {}
+    for key, default in SETTINGS.items():
+        try:
+            values[key] = type(default)(rows[key]) if rows.get(key) else default
+        except ValueError:
+            values[key] = default
+    return values
+
+
+class SoldChecker:
+    def __init__(self, concurrency=DEFAULT_CONCURRENCY, rate=DEFAULT_RATE, fallback_budget=DEFAULT_FALLBACK_BUDGET):
+        self.concurrency = max(1, concurrency)
+        self.fallback_budget = fallback_budget
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=self.concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update({"User-Agent": USER_AGENT, "Accept-Language": "es-ES,es;q=0.9"})
+        self._bucket = TokenBucket(rate, max(1.0, rate))
+        self._lock = threading.Lock()
+        self._api_rejections = 0
+        self._blocked_streak = 0
+        self.aborted = False
+
+        # Stats
+        self.http_requests = 0
+        self.fallbacks = 0
+        self.unresolved = 0
+
+    # --- HTTP fast path ---
+    def _get(self, url, item_id, accept):
+        self._bucket.acquire()
+        with self._lock:
+            self.http_requests += 1
+        start = time.perf_counter()
+        try:
+            r = self.session.get(url, headers={"Accept": accept}, timeout=REQUEST_TIMEOUT_S)
+        except requests.RequestException:
+            observe("sold.http_check", time.perf_counter() - start, ok=False)
+            return UNKNOWN, None
+        status = classify_item_status(r.status_code, r.text, r.headers.get("Content-Type", ""), item_id, r.url)
+        observe("sold.http_check", time.perf_counter() - start, ok=status != BLOCKED)
+        return status, r.status_code
+
+    def check_http(self, url):
+        """Status of one product over HTTP (unknown/blocked when it cannot tell)."""
+        if self.aborted:
+            return UNKNOWN
+        match = ITEM_ID_RE.search(url or "")
+        item_id = match.group(1) if match else None
+
+        status = UNKNOWN
+        if item_id and self._api_rejections < API_DISABLE_AFTER:
+            status, code = self._get(ITEM_API_URL.format(item_id=item_id), item_id, "application/json")
+            if code in (401, 403):
+                with self._lock:
+                    self._api_rejections += 1
+        if status not in FINAL_STATUSES:
+            status, _ = self._get(url, item_id, "text/html")
+
+        with self._lock:
+            self._blocked_streak = self._blocked_streak + 1 if status == BLOCKED else 0
+            if self._blocked_streak >= BLOCKED_STREAK_ABORT and not self.aborted:
+                self.aborted = True
+                logger.warning(f"Comprobación HTTP bloqueada {BLOCKED_STREAK_ABORT} veces seguidas; se detiene la vía rápida.")
+        return status
+
+    async def _check_all_http(self, urls):
+        loop = asyncio.get_running_loop()
+        slots = asyncio.Semaphore(self.concurrency)
+
+        async def one(url):
+            async with slots:
+                return url, await loop.run_in_executor(executor, self.check_http, url)
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="sold-check") as executor:
+            return dict(await asyncio.gather(*(one(u) for u in urls)))
+
+    # --- Entry point ---
+    def check(self, urls):
+        """{url: status}; unresolved products are left as unknown/blocked."""
+        statuses = asyncio.run(self._check_all_http(list(urls)))
+
+        ambiguous = [u for u, s in statuses.items() if s not in FINAL_STATUSES]
+        if ambiguous and self.fallback_budget > 0:
+            with browser_job("Comprobación de vendidos (navegador)"):
+                for url in ambiguous[:self.fallback_budget]:
+                    start = time.perf_counter()
+                    status = _check_sold_page(url)
+                    observe("sold.browser_check", time.perf_counter() - start, ok=status is not None)
+                    # A page that did not load stays unresolved, it is not a deletion
+                    statuses[url] = status or UNKNOWN
+                    self.fallbacks += 1
+        self.unresolved = sum(1 for s in statuses.values() if s not in FINAL_STATUSES)
+        return statuses
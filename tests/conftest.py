@@ -0,0 +1,11 @@
+import os
+import sys
+import tempfile
+
+# The modules create their SQLite database and log sink on import
+os.environ.setdefault("VINTED_DATA_DIR", tempfile.mkdtemp(prefix="vinted-tests-"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import init_db  # noqa: E402
+
+init_db()
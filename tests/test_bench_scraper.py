@@ -0,0 +1,67 @@
+import json
+import os
+import sys
+import urllib.error
+import urllib.request
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+import bench_scraper  # noqa: E402
+from fixture_server import start_fixture_server, item_status, PER_PAGE, TOTAL_PAGES  # noqa: E402
+from sold_check import classify_item_status, SOLD, ACTIVE, DELETED  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def base_url():
+    server, url = start_fixture_server()
+    yield url
+    server.shutdown()
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as resp:
+            return resp.status, resp.read().decode("utf-8"), resp.headers.get("Content-Type", "")
+    except urllib.error.HTTPError as e:
+        return e.code, e.read().decode("utf-8"), e.headers.get("Content-Type", "")
+
+
+def test_catalog_api_pages_are_stable_and_newest_first(base_url):
+    url = f"{base_url}/api/v2/catalog/items?search_text=nike&per_page={PER_PAGE}&page="
+    first = json.loads(get(url + "1")[1])
+    second = json.loads(get(url + "2")[1])
+    assert json.loads(get(url + "1")[1]) == first
+    assert first["pagination"]["total_pages"] == TOTAL_PAGES
+    ids = [it["id"] for it in first["items"] + second["items"]]
+    assert len(ids) == 2 * PER_PAGE
+    assert ids == sorted(ids, reverse=True)
+
+
+@pytest.mark.parametrize("item_id", [8_000_000, 8_000_001, 8_000_002, 8_000_003])
+def test_item_pages_classify_as_their_fixture_status(base_url, item_id):
+    expected = {"sold": SOLD, "deleted": DELETED, "active": ACTIVE}[item_status(item_id)]
+    status, body, content_type = get(f"{base_url}/api/v2/items/{item_id}")
+    assert classify_item_status(status, body, content_type, item_id) == expected
+
+
+def test_percentile_and_phase_result():
+    assert bench_scraper._percentile([], 0.5) is None
+    assert bench_scraper._percentile([3, 1, 2], 0.5) == 2
+    assert bench_scraper._percentile([1, 2, 3, 4], 0.95) == 4
+    result = bench_scraper.phase_result(2.0, [0.1, 0.2, 0.3], items=10, pages=4)
+    assert (result["items_per_s"], result["pages_per_s"], result["p50_ms"], result["max_ms"]) == (5.0, 2.0, 200.0, 300.0)
+
+
+def test_compare_flags_regressions_in_the_right_direction(tmp_path, capsys):
+    def report(name, **phase):
+        path = tmp_path / name
+        path.write_text(json.dumps({"revision": name, "phases": {"scrape_api": phase}}))
+        return str(path)
+
+    old = report("old", wall_s=10.0, items_per_s=100.0)
+    assert bench_scraper.compare(old, report("faster", wall_s=8.0, items_per_s=125.0), 0.1) == 0
+    assert bench_scraper.compare(old, report("slower", wall_s=12.0, items_per_s=100.0), 0.1) == 1
+    assert bench_scraper.compare(old, report("fewer", wall_s=10.0, items_per_s=80.0), 0.1) == 1
+    assert bench_scraper.compare(old, report("skipped", skipped="no chromium"), 0.1) == 0
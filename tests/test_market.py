@@ -0,0 +1,67 @@
+from datetime import date, datetime
+
+import pytest
+
+from database import SessionLocal, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats, SearchConfig
+from market import record_daily_prices, rebuild_price_daily
+
+DAY = date(2026, 3, 1)
+NEXT_DAY = date(2026, 3, 2)
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def add_product(db, n=1):
+    product = Product(url=f"https://www.vinted.es/items/{n}-x", price=10.0)
+    db.add(product)
+    db.flush()
+    return product.id
+
+
+def daily(db, pid, day):
+    row = db.query(PriceDaily).filter_by(product_id=pid, day=day).one()
+    return row.price, row.min_price, row.max_price, row.samples
+
+
+def test_same_day_is_folded_into_one_row(db):
+    pid = add_product(db)
+    record_daily_prices(db, [{'product_id': pid, 'price': 20.0}], day=DAY)
+    record_daily_prices(db, [{'product_id': pid, 'price': 12.0}], day=DAY)
+    record_daily_prices(db, [{'product_id': pid, 'price': 15.0}, {'product_id': pid, 'price': None}], day=DAY)
+    db.commit()
+    assert daily(db, pid, DAY) == (15.0, 12.0, 20.0, 3)
+
+
+def test_new_day_starts_a_new_row(db):
+    pid = add_product(db)
+    record_daily_prices(db, [{'product_id': pid, 'price': 20.0}], day=DAY)
+    record_daily_prices(db, [{'product_id': pid, 'price': 18.0}], day=NEXT_DAY)
+    record_daily_prices(db, [{'product_id': pid, 'price': None}], day=NEXT_DAY)
+    db.commit()
+    assert daily(db, pid, DAY) == (20.0, 20.0, 20.0, 1)
+    assert daily(db, pid, NEXT_DAY) == (18.0, 18.0, 18.0, 1)
+
+
+def test_rebuild_matches_the_incremental_rollup(db):
+    pid = add_product(db)
+    history = [(DAY, 9, 20.0), (DAY, 10, 12.0), (DAY, 11, 15.0), (NEXT_DAY, 9, 18.0)]
+    for day, hour, price in history:
+        db.add(PriceHistory(product_id=pid, price=price, timestamp=datetime(day.year, day.month, day.day, hour)))
+        record_daily_prices(db, [{'product_id': pid, 'price': price}], day=day)
+    # History of a product that no longer exists is not rolled up
+    db.add(PriceHistory(product_id=pid + 1000, price=1.0, timestamp=datetime(2026, 3, 1, 9)))
+    db.commit()
+    incremental = {(r.product_id, r.day): (r.price, r.min_price, r.max_price, r.samples) for r in db.query(PriceDaily)}
+
+    rebuild_price_daily(db)
+    db.expire_all()
+    rebuilt = {(r.product_id, r.day): (r.price, r.min_price, r.max_price, r.samples) for r in db.query(PriceDaily)}
+    assert rebuilt == incremental
@@ -0,0 +1,122 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from notifier import TelegramNotifier, TokenBucket, split_digest, DIGEST_SEPARATOR
+
+
+class StubTelegram:
+    """Local sendMessage endpoint: records every call and answers from a script (default 200)."""
+
+    def __init__(self):
+        self.calls = []
+        self.responses = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                stub.calls.append((time.monotonic(), self.path, body))
+                status, answer = stub.responses.pop(0) if stub.responses else (200, {"ok": True})
+                data = json.dumps(answer).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def texts(self):
+        return [body["text"] for _, _, body in self.calls]
+
+
+@pytest.fixture
+def stub():
+    server = StubTelegram()
+    yield server
+    server.server.shutdown()
+
+
+def make_notifier(stub, digest=False, **rates):
+    return TelegramNotifier(api_url=stub.url, credentials=("TOKEN", "42"), digest_enabled=digest, **rates)
+
+
+def test_token_bucket_paces_after_the_burst():
+    bucket = TokenBucket(rate=20, capacity=2)
+    start = time.monotonic()
+    for _ in range(6):
+        bucket.acquire()
+    # 2 from the burst, 4 more at 20/s
+    assert time.monotonic() - start >= 4 / 20 * 0.9
+
+
+def test_messages_are_paced_per_chat(stub):
+    notifier = make_notifier(stub, per_chat_rate=10, per_chat_burst=1)
+    start = time.monotonic()
+    for i in range(4):
+        notifier.send(f"alerta {i}")
+    notifier.flush(timeout=5)
+
+    assert stub.texts() == [f"alerta {i}" for i in range(4)]
+    assert all(path == "/botTOKEN/sendMessage" for _, path, _ in stub.calls)
+    # Server-side gaps jitter with connection setup; the span from the first send does not
+    assert stub.calls[-1][0] - start >= 3 / 10 * 0.9
+
+
+def test_429_waits_retry_after_then_delivers(stub):
+    stub.responses = [(429, {"ok": False, "error_code": 429, "parameters": {"retry_after": 0.3}})]
+    notifier = make_notifier(stub)
+    notifier.send("alerta")
+    notifier.flush(timeout=5)
+
+    assert stub.texts() == ["alerta", "alerta"]
+    assert stub.calls[1][0] - stub.calls[0][0] >= 0.3
+    assert (notifier.sent, notifier.retries, notifier.failed) == (1, 1, 0)
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.responses = [(400, {"ok": False, "description": "Bad Request"})]
+    notifier = make_notifier(stub)
+    notifier.send("alerta")
+    notifier.flush(timeout=5)
+    assert len(stub.calls) == 1
+    assert (notifier.sent, notifier.failed) == (0, 1)
+
+
+def test_digest_merges_one_scan_into_one_message(stub):
+    notifier = make_notifier(stub, digest=True)
+    with notifier.digest("Escaneo nike"):
+        for i in range(3):
+            notifier.send(f"alerta {i}")
+    notifier.flush(timeout=5)
+
+    (text,) = stub.texts()
+    assert text.startswith("📬 **Escaneo nike: 3 alertas**")
+    assert text.split(DIGEST_SEPARATOR)[1:] == ["alerta 0", "alerta 1", "alerta 2"]
+
+
+def test_split_digest_packs_under_the_limit():
+    chunks = split_digest(["a" * 40, "b" * 40, "c" * 40], limit=100)
+    assert chunks == ["a" * 40 + DIGEST_SEPARATOR + "b" * 40, "c" * 40]
+    assert all(len(c) <= 100 for c in chunks)
+
+
+def test_split_digest_never_sends_the_header_alone():
+    chunks = split_digest(["a" * 150, "b" * 20], header="HEADER", limit=100)
+    assert chunks[0].startswith("HEADER" + DIGEST_SEPARATOR + "a")
+    assert len(chunks[0]) == 100
+    assert chunks[1:] == ["b" * 20]
+
+
+def test_split_digest_cuts_long_messages():
+    chunks = split_digest(["x" * 250], limit=100)
+    assert chunks == ["x" * 100]
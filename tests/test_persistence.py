@@ -0,0 +1,88 @@
+import pytest
+
+from database import SessionLocal, SearchConfig, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats
+from market import get_data_version
+from persistence import save_scan_results, delete_search_config, PRICE_CHANGE_THRESHOLD
+from price_stats import get_stats
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def item(n, price, brand="Nike"):
+    return {'url': f"https://www.vinted.es/items/{n}-x", 'title': f"item {n}", 'price': price, 'brand': brand}
+
+
+def add_config(db, term):
+    config = SearchConfig(term=term)
+    db.add(config)
+    db.commit()
+    return config
+
+
+def test_new_products_are_stored_once_with_history(db):
+    config = add_config(db, "nike")
+    new, repriced, linked = save_scan_results(db, config, [item(1, 10.0), item(2, 20.0), item(1, 10.0), {'url': None}])
+    db.commit()
+    assert (len(new), repriced, linked) == (2, 0, 2)
+    assert all(p.id for p in new)
+    assert db.query(Product).count() == 2
+    assert db.query(PriceHistory).count() == 2
+    assert db.query(PriceDaily).count() == 2
+    assert get_stats(db, config.id)[0] == pytest.approx(15.0)
+
+
+def test_only_real_price_changes_are_recorded(db):
+    config = add_config(db, "nike")
+    save_scan_results(db, config, [item(1, 10.0), item(2, 20.0)])
+    db.commit()
+    new, repriced, linked = save_scan_results(db, config, [item(1, 10.0 + PRICE_CHANGE_THRESHOLD), item(2, 30.0), item(3, 5.0)])
+    db.commit()
+    assert (len(new), repriced, linked) == (1, 1, 1)
+    assert db.query(Product).filter_by(url=item(1, 0)['url']).one().price == 10.0
+    assert db.query(Product).filter_by(url=item(2, 0)['url']).one().price == 30.0
+    assert db.query(PriceHistory).count() == 4
+    assert get_stats(db, config.id)[0] == pytest.approx((10.0 + 30.0 + 5.0) / 3)
+
+
+def test_product_found_by_another_search_is_linked_not_duplicated(db):
+    first, second = add_config(db, "nike"), add_config(db, "nike air")
+    save_scan_results(db, first, [item(1, 10.0)])
+    db.commit()
+    new, repriced, linked = save_scan_results(db, second, [item(1, 12.0)])
+    db.commit()
+    assert (len(new), repriced, linked) == (0, 1, 1)
+    product = db.query(Product).one()
+    assert product.search_config_id == first.id
+    assert {ps.search_config_id for ps in db.query(ProductSearch)} == {first.id, second.id}
+    # The reprice is accounted to the owner's stats
+    assert get_stats(db, first.id)[0] == pytest.approx(12.0)
+    # Linking again is a no-op
+    assert save_scan_results(db, second, [item(1, 12.0)])[2] == 0
+
+
+def test_delete_hands_shared_products_to_the_oldest_other_search(db):
+    owner, older, newer = add_config(db, "a"), add_config(db, "b"), add_config(db, "c")
+    save_scan_results(db, owner, [item(1, 10.0), item(2, 20.0, "Adidas")])
+    save_scan_results(db, newer, [item(1, 10.0), item(2, 20.0, "Adidas")])
+    save_scan_results(db, older, [item(2, 20.0, "Adidas")])
+    save_scan_results(db, owner, [item(3, 30.0)])
+    db.commit()
+    version = get_data_version(db)
+
+    assert delete_search_config(db, owner) == 2
+    db.commit()
+    owners = {p.url: p.search_config_id for p in db.query(Product)}
+    assert owners == {item(1, 0)['url']: newer.id, item(2, 0)['url']: older.id}
+    assert db.query(ProductSearch).filter_by(search_config_id=owner.id).count() == 0
+    assert db.query(SearchStats).filter_by(search_config_id=owner.id).count() == 0
+    assert get_stats(db, newer.id, "nike")[0] == pytest.approx(10.0)
+    assert get_stats(db, older.id, "adidas")[0] == pytest.approx(20.0)
+    assert get_data_version(db) == version + 1
@@ -0,0 +1,74 @@
+import math
+import random
+import statistics
+
+import pytest
+
+from database import SessionLocal, SearchConfig, Product, SearchStats
+from price_stats import welford_add, welford_remove, merge, apply_price_changes, get_stats, recompute_stats
+
+
+def fold(prices):
+    state = (0, 0.0, 0.0)
+    for price in prices:
+        state = welford_add(*state, price)
+    return state
+
+
+def test_welford_add_matches_population_stats():
+    prices = [12.5, 30.0, 7.0, 19.99, 45.0]
+    count, mean, m2 = fold(prices)
+    assert count == len(prices)
+    assert mean == pytest.approx(statistics.fmean(prices))
+    assert math.sqrt(m2 / count) == pytest.approx(statistics.pstdev(prices))
+
+
+def test_welford_remove_undoes_add():
+    rng = random.Random(7)
+    prices = [round(rng.uniform(5, 80), 2) for _ in range(50)]
+    state = fold(prices)
+    for price in prices[25:]:
+        state = welford_remove(*state, price)
+    expected = fold(prices[:25])
+    assert state[0] == expected[0]
+    assert state[1] == pytest.approx(expected[1])
+    assert state[2] == pytest.approx(expected[2])
+
+
+def test_welford_remove_last_value_resets():
+    assert welford_remove(*fold([10.0]), 10.0) == (0, 0.0, 0.0)
+
+
+def test_merge_equals_folding_everything():
+    a, b = [1.0, 2.0, 3.0], [10.0, 20.0]
+    merged = merge(fold(a), fold(b))
+    expected = fold(a + b)
+    assert merged[0] == expected[0]
+    assert merged[1] == pytest.approx(expected[1])
+    assert merged[2] == pytest.approx(expected[2])
+
+
+def test_running_stats_match_recompute():
+    db = SessionLocal()
+    config = SearchConfig(term="stats")
+    db.add(config)
+    db.flush()
+    products = [Product(search_config_id=config.id, url=f"stats-{i}", brand=brand, price=price)
+                for i, (brand, price) in enumerate([("Nike", 10.0), ("nike ", 20.0), ("Adidas", 40.0), (None, 30.0)])]
+    db.add_all(products)
+    apply_price_changes(db, config.id, added=[(p.brand, p.price) for p in products])
+    # Reprice one product: remove the old price, add the new one
+    apply_price_changes(db, config.id, added=[("Nike", 16.0)], removed=[("Nike", 10.0)])
+    products[0].price = 16.0
+    db.commit()
+
+    running = {brand: get_stats(db, config.id, brand) for brand in ("", "nike", "adidas")}
+    recompute_stats(db, config.id)
+    for brand, (mean, std) in running.items():
+        assert (mean, std) == pytest.approx(get_stats(db, config.id, brand))
+    assert get_stats(db, config.id, "NIKE ")[0] == pytest.approx(18.0)
+    db.query(SearchStats).filter_by(search_config_id=config.id).delete()
+    db.query(Product).filter_by(search_config_id=config.id).delete()
+    db.delete(config)
+    db.commit()
+    db.close()
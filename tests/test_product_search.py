@@ -0,0 +1,58 @@
+import pytest
+
+from database import SessionLocal, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats, SearchConfig
+from product_search import fts_query, search_products, match_clause, fts_available
+
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+        session.query(model).delete()
+    session.commit()
+    yield session
+    session.close()
+
+
+def add(db, title, brand=None):
+    product = Product(url=f"https://www.vinted.es/items/{title}", title=title, brand=brand, price=10.0)
+    db.add(product)
+    db.commit()
+    return product.id
+
+
+def test_fts_query_quotes_prefix_terms():
+    assert fts_query("nike air") == '"nike"* "air"*'
+    assert fts_query('  Nike "AND" air-max ') == '"Nike"* "AND"* "air"* "max"*'
+    assert fts_query("nike", column="brand") == 'brand : ("nike"*)'
+    assert fts_query("") is None
+    assert fts_query("  -- * ") is None
+    assert fts_query(None) is None
+    with pytest.raises(ValueError):
+        fts_query("nike", column="url")
+
+
+def test_search_is_prefix_accent_and_case_insensitive(db):
+    assert fts_available(db)
+    jacket = add(db, "Chaqueta vaquera Levi's", "Levi's")
+    shoes = add(db, "Zapatillas Nike Air Max", "Nike")
+    shirt = add(db, "Camiseta nike running", "Adidas")
+    assert set(search_products(db, "zapa NIKE")) == {shoes}
+    assert set(search_products(db, "chaquéta")) == {jacket}
+    assert set(search_products(db, "nike")) == {shoes, shirt}
+    assert search_products(db, "nike", column="brand") == [shoes]
+    assert search_products(db, "") == []
+    assert {p.id for p in db.query(Product).filter(match_clause(db, "vaq"))} == {jacket}
+
+
+def test_index_follows_updates_and_deletes(db):
+    pid = add(db, "Bolso de piel")
+    other = add(db, "Bolso de tela")
+    product = db.get(Product, pid)
+    product.title = "Mochila de piel"
+    db.commit()
+    assert search_products(db, "bolso") == [other]
+    assert search_products(db, "mochila") == [pid]
+    db.delete(db.get(Product, other))
+    db.commit()
+    assert search_products(db, "bolso") == []
@@ -0,0 +1,85 @@
+import pytest
+
+import readiness
+from database import SessionLocal, Config
+from readiness import PolitenessPolicy, get_politeness, invalidate_politeness, click_next_page, wait_for_grid, grid_is_empty
+
+SELECTOR = "div.feed-grid__item"
+
+
+class FakePage:
+    """Grid whose first item link is `href`; waits fail unless the condition already holds."""
+
+    def __init__(self, href=None, loaded=True):
+        self.href = href
+        self.loaded = loaded
+        self.waited = []
+
+    def evaluate(self, script, selector):
+        if script is readiness.GRID_EMPTY_JS:
+            return self.loaded and self.href is None
+        return self.href
+
+    def wait_for_selector(self, selector, timeout):
+        self.waited.append(timeout)
+        if self.href is None:
+            raise TimeoutError(selector)
+
+    def wait_for_function(self, script, arg, timeout):
+        self.waited.append(timeout)
+        if self.href is None or self.href == arg[1]:
+            raise TimeoutError(script)
+
+
+class FakeButton:
+    def __init__(self, page, next_href):
+        self.page, self.next_href = page, next_href
+
+    def click(self):
+        self.page.href = self.next_href
+
+
+def test_waits_return_false_on_timeout_instead_of_raising():
+    page = FakePage()
+    assert wait_for_grid(page, SELECTOR, timeout_ms=50) is False
+    assert grid_is_empty(page, SELECTOR) is True
+    page.href = "/items/1"
+    assert wait_for_grid(page, SELECTOR) is True
+    assert grid_is_empty(page, SELECTOR) is False
+    assert grid_is_empty(FakePage(loaded=False), SELECTOR) is False
+
+
+def test_click_next_page_waits_for_a_different_first_item():
+    page = FakePage("/items/1")
+    assert click_next_page(page, FakeButton(page, "/items/9"), SELECTOR) is True
+    # A click that does not change the grid (last page, blocked render) times out
+    assert click_next_page(page, FakeButton(page, "/items/9"), SELECTOR, timeout_ms=50) is False
+    assert page.waited[-1] == 50
+
+
+def test_politeness_bounds():
+    policy = PolitenessPolicy(2.0, 1.0)
+    assert policy.min_s == policy.max_s == 2.0
+    assert PolitenessPolicy(-1, 0).pause() == 0.0
+    assert all(0.5 <= PolitenessPolicy(0.5, 1.5).delay() <= 1.5 for _ in range(100))
+
+
+@pytest.mark.parametrize("values, expected", [
+    ({"politeness_min_s": "0", "politeness_max_s": "0"}, (0.0, 0.0)),
+    ({"politeness_min_s": "1", "politeness_max_s": "3"}, (1.0, 3.0)),
+    ({"politeness_min_s": "x", "politeness_max_s": "3"}, (readiness.DEFAULT_POLITENESS_MIN_S, readiness.DEFAULT_POLITENESS_MAX_S)),
+])
+def test_politeness_is_read_from_config(values, expected):
+    db = SessionLocal()
+    for key, value in values.items():
+        row = db.query(Config).filter_by(key=key).first() or Config(key=key)
+        row.value = value
+        db.add(row)
+    db.commit()
+    invalidate_politeness()
+    policy = get_politeness()
+    assert (policy.min_s, policy.max_s) == expected
+    db.query(Config).filter(Config.key.in_(list(values))).delete()
+    db.commit()
+    db.close()
+    invalidate_politeness()
@@ -0,0 +1,72 @@
+import pytest
+
+import scan_cache
+from database import SessionLocal, Config, SearchConfig
+from scan_cache import normalize_search_url, fetch_key, read_cache_ttl, ScanCache, DEFAULT_TTL_MIN
+
+
+def test_normalize_search_url_equivalences():
+    a = "https://www.vinted.es/catalog?search_text=Nike+Air&price_to=10.0&price_from=5&page=2"
+    b = "https://WWW.vinted.es/catalog/?price_from=5.0&search_text=nike%20%20air&price_to=10&time=123"
+    assert normalize_search_url(a) == normalize_search_url(b)
+    assert normalize_search_url(a) != normalize_search_url(a.replace("price_to=10.0", "price_to=11"))
+    assert "price_to" not in normalize_search_url(a, drop=("price_to",))
+
+
+def test_fetch_key_includes_the_budget():
+    one = SearchConfig(term="nike air", max_pages=3, fetch_mode="dom")
+    same = SearchConfig(term="Nike  Air", max_pages=3, fetch_mode="dom")
+    deeper = SearchConfig(term="nike air", max_pages=5, fetch_mode="dom")
+    api = SearchConfig(term="nike air", max_pages=3, fetch_mode="api")
+    assert fetch_key(one) == fetch_key(same)
+    assert len({fetch_key(one), fetch_key(deeper), fetch_key(api)}) == 3
+
+
+def test_entry_needs_a_caller_watermark_containing_its_stop_ids():
+    cache = ScanCache()
+    cache.put("k", [["page"]], True, ttl_min=10, watermark={"1", "2"})
+    assert cache.get("k", 10, {"1", "2", "3"}).batches == [["page"]]
+    assert cache.get("k", 10, {"1"}) is None
+    assert cache.get("k", 10, set()) is None
+    assert cache.get("other", 10, {"1", "2"}) is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_entry_without_stop_ids_serves_any_watermark():
+    cache = ScanCache()
+    cache.put("k", [], True, ttl_min=10)
+    assert cache.get("k", 10, set()) is not None
+    assert cache.get("k", 10, {"9"}) is not None
+
+
+def test_entries_expire_and_ttl_zero_does_not_store(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(scan_cache.time, "monotonic", lambda: now[0])
+    cache = ScanCache()
+    cache.put("k", [], True, ttl_min=10)
+    now[0] += 9 * 60
+    assert cache.get("k", 10) is not None
+    now[0] += 2 * 60
+    assert cache.get("k", 10) is None
+    cache.put("zero", [], True, ttl_min=0)
+    assert cache.get("zero", 10) is None
+    cache.put("k", [], True, ttl_min=10)
+    cache.clear()
+    assert cache.get("k", 10) is None
+
+
+@pytest.mark.parametrize("value, expected", [(None, DEFAULT_TTL_MIN), ("", DEFAULT_TTL_MIN), ("abc", DEFAULT_TTL_MIN),
+                                             ("0", 0.0), ("-5", 0.0), ("2.5", 2.5)])
+def test_read_cache_ttl(value, expected):
+    db = SessionLocal()
+    row = db.query(Config).filter_by(key="scan_cache_ttl_min").first()
+    previous = row.value if row else None
+    if row is None:
+        row = Config(key="scan_cache_ttl_min")
+        db.add(row)
+    row.value = value
+    db.commit()
+    assert read_cache_ttl(db) == expected
+    row.value = previous
+    db.commit()
+    db.close()
@@ -0,0 +1,115 @@
+import pytest
+
+import jobs
+from scraper import item_id_from_url, load_watermark
+from database import SessionLocal, Config, SearchConfig, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats
+from scan_cache import plan_shared_fetches, get_scan_cache
+
+PAGE_SIZE = 2
+
+
+class FakeCatalog:
+    """Newest-first listings; paginates like the scraper and stops on known pages."""
+
+    def __init__(self):
+        self.items = []
+        self.loads = []
+        # Simulates a blocked page or a timeout: pages so far are yielded, the fetch does not finish
+        self.fail = False
+
+    def add(self, price):
+        item_id = len(self.items) + 1000
+        self.items.insert(0, {'url': f"https://www.vinted.es/items/{item_id}-x", 'title': f"item {item_id}",
+                              'price': price, 'brand': "Nike", 'size': "M", 'image_url': None})
+
+    def __call__(self, config, watermark=None, outcome=None):
+        watermark = watermark if watermark is not None else load_watermark(config)
+        low, high = config.min_price or 0, config.max_price or float("inf")
+        matching = [i for i in self.items if low <= i['price'] <= high]
+        for start in range(0, len(matching), PAGE_SIZE):
+            page = matching[start:start + PAGE_SIZE]
+            self.loads.append(config.id)
+            yield page
+            if self.fail:
+                return
+            if all(item_id_from_url(i['url']) in watermark for i in page):
+                break
+        outcome['finished'] = True
+        outcome['complete'] = True
+
+
+@pytest.fixture
+def catalog(monkeypatch):
+    db = SessionLocal()
+    for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+        db.query(model).delete()
+    ttl = db.query(Config).filter_by(key="scan_cache_ttl_min").first() or Config(key="scan_cache_ttl_min")
+    ttl.value = "0"
+    db.add(ttl)
+    db.commit()
+    db.close()
+    get_scan_cache().clear()
+    fake = FakeCatalog()
+    monkeypatch.setattr(jobs, "iter_scrape_vinted", fake)
+    monkeypatch.setattr(jobs, "send_telegram_alert", lambda message: None)
+    return fake
+
+
+def add_configs(*configs):
+    db = SessionLocal()
+    db.add_all(configs)
+    db.commit()
+    ids = [c.id for c in configs]
+    db.close()
+    return ids
+
+
+def test_only_identical_searches_share_a_fetch():
+    wide = SearchConfig(id=1, term="nike", max_pages=5)
+    same = SearchConfig(id=2, term="Nike ", max_pages=5)
+    narrow = SearchConfig(id=3, term="nike", max_price=30, max_pages=5)
+    plan = plan_shared_fetches([wide, narrow, same])
+    assert [(f.id, [m.id for m in members]) for f, members in plan] == [(1, [1, 2]), (3, [3])]
+
+
+def test_wide_and_narrow_pair_loads_no_more_pages_than_separate_scans(catalog):
+    for n in range(10):
+        catalog.add(price=10 + 10 * n)
+    wide_id, narrow_id = add_configs(SearchConfig(term="nike", max_pages=20), SearchConfig(term="nike", max_price=40, max_pages=20))
+
+    jobs.run_scheduled_scans(workers=1)
+    # 10 items in 5 pages for the wide search, 4 in 2 for the narrow one
+    assert catalog.loads.count(wide_id) == 5
+    assert catalog.loads.count(narrow_id) == 2
+
+    # One new cheap listing: each search loads its new page plus the known one it stops on
+    catalog.loads.clear()
+    catalog.add(price=15)
+    jobs.run_scheduled_scans(workers=1)
+    assert catalog.loads.count(wide_id) == 2
+    assert catalog.loads.count(narrow_id) == 2
+    assert len(catalog.loads) == 4
+
+
+def test_failed_fetch_does_not_count_as_a_scan(catalog):
+    for n in range(4):
+        catalog.add(price=10 + n)
+    (config_id,) = add_configs(SearchConfig(term="nike", max_pages=20))
+    jobs.run_scheduled_scans(workers=1)
+
+    db = SessionLocal()
+    config = db.get(SearchConfig, config_id)
+    last_run, velocity = config.last_run, config.velocity
+    db.close()
+
+    catalog.fail = True
+    catalog.add(price=12)
+    jobs.run_scheduled_scans(workers=1)
+
+    db = SessionLocal()
+    config = db.get(SearchConfig, config_id)
+    assert (config.last_run, config.velocity) == (last_run, velocity)
+    assert config.next_run_at > last_run
+    # The page that did load is still saved
+    assert db.query(Product).count() == 5
+    db.close()
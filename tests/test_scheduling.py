@@ -0,0 +1,48 @@
+import pytest
+
+from scheduling import update_velocity, allocate_intervals, MAX_OBSERVATION_H
+
+
+def test_first_observation_is_the_rate():
+    assert update_velocity(None, 12, 4) == pytest.approx(3.0)
+
+
+def test_unusable_gaps_keep_the_old_velocity():
+    assert update_velocity(2.0, 50, 0) == 2.0
+    assert update_velocity(2.0, 50, -1) == 2.0
+    assert update_velocity(2.0, 50, MAX_OBSERVATION_H + 1) == 2.0
+    assert update_velocity(None, 50, 0) is None
+
+
+def test_velocity_moves_towards_the_rate_more_for_longer_gaps():
+    short = update_velocity(1.0, 5, 1)   # rate 5/h
+    long = update_velocity(1.0, 60, 12)  # rate 5/h
+    assert 1.0 < short < long < 5.0
+
+
+def total_rate(intervals):
+    return sum(1 / h for h in intervals.values())
+
+
+def test_allocation_keeps_the_scan_budget():
+    velocities = {1: 0.5, 2: 2.0, 3: 8.0}
+    intervals = allocate_intervals(velocities, base_h=6, min_h=0.1, max_h=1000)
+    assert total_rate(intervals) == pytest.approx(len(velocities) / 6)
+    assert intervals[3] < intervals[2] < intervals[1]
+    # sqrt allocation: 4x the velocity gives half the interval
+    assert intervals[1] / intervals[2] == pytest.approx(2.0)
+
+
+def test_allocation_respects_the_bounds():
+    velocities = {1: 100.0, 2: 0.0, 3: 1.0}
+    intervals = allocate_intervals(velocities, base_h=6, min_h=3, max_h=9)
+    assert intervals[1] == 3
+    assert intervals[2] == 9
+    assert all(3 <= h <= 9 for h in intervals.values())
+
+
+def test_unknown_velocity_gets_the_average_weight():
+    intervals = allocate_intervals({1: 1.0, 2: 4.0, 3: None}, base_h=6, min_h=0.1, max_h=1000)
+    assert intervals[2] < intervals[3] < intervals[1]
+    assert allocate_intervals({1: None, 2: None}, base_h=6, min_h=1, max_h=48) == pytest.approx({1: 6.0, 2: 6.0})
+    assert allocate_intervals({}, base_h=6, min_h=1, max_h=48) == {}
@@ -0,0 +1,103 @@
+import contextlib
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import sold_check
+from database import SessionLocal, Product, ProductSearch, PriceHistory, PriceDaily, SearchStats, SearchConfig
+from sold_check import (classify_item_status, change_probability, select_candidates, SoldChecker,
+                        SOLD, ACTIVE, DELETED, UNKNOWN, BLOCKED, MIN_RECHECK_HOURS)
+
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "sold_check")
+ITEM_URL = "https://www.vinted.es/items/{}-producto"
+
+
+def fixture(name):
+    with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("api_sold.json", SOLD),
+    ("api_active.json", ACTIVE),
+    ("api_draft.json", DELETED),
+    ("api_no_item.json", UNKNOWN),
+])
+def test_item_api(name, expected):
+    assert classify_item_status(200, fixture(name), "application/json; charset=utf-8") == expected
+
+
+@pytest.mark.parametrize("name, item_id, expected", [
+    # The flags of the item itself, not of the similar items listed on its page
+    ("page_next_data_sold.html", 4812345678, SOLD),
+    ("page_inline_state_active.html", 4812345679, ACTIVE),
+    ("page_status_banner.html", None, SOLD),
+    ("page_buy_button.html", None, ACTIVE),
+    ("page_datadome.html", 4812345678, BLOCKED),
+])
+def test_item_page(name, item_id, expected):
+    url = ITEM_URL.format(item_id)
+    assert classify_item_status(200, fixture(name), "text/html", item_id, url) == expected
+
+
+def test_redirect_to_home_is_deleted():
+    assert classify_item_status(200, fixture("page_home.html"), "text/html", 4812345678, "https://www.vinted.es/") == DELETED
+
+
+@pytest.mark.parametrize("code, expected", [
+    (404, DELETED), (410, DELETED), (403, BLOCKED), (429, BLOCKED), (503, BLOCKED), (302, UNKNOWN),
+])
+def test_status_codes(code, expected):
+    assert classify_item_status(code, "", "text/html") == expected
+
+
+def test_empty_body_is_unknown():
+    assert classify_item_status(200, "", "text/html") == UNKNOWN
+
+
+def test_browser_fallback_failure_stays_unresolved(monkeypatch):
+    urls = [ITEM_URL.format(1), ITEM_URL.format(2), ITEM_URL.format(3)]
+    http = {urls[0]: ACTIVE, urls[1]: BLOCKED, urls[2]: UNKNOWN}
+    browser = {urls[1]: None, urls[2]: "deleted"}
+    monkeypatch.setattr(SoldChecker, "check_http", lambda self, url: http[url])
+    monkeypatch.setattr(sold_check, "_check_sold_page", browser.get)
+    monkeypatch.setattr(sold_check, "browser_job", lambda label: contextlib.nullcontext())
+
+    checker = SoldChecker(fallback_budget=5)
+    statuses = checker.check(urls)
+    assert statuses == {urls[0]: ACTIVE, urls[1]: UNKNOWN, urls[2]: DELETED}
+    assert checker.fallbacks == 2
+    assert checker.unresolved == 1
+
+
+def test_change_probability_ordering():
+    base = change_probability(2, 2)
+    assert 0 < base < 1
+    assert change_probability(2, 4) > base
+    assert change_probability(2, 2, price=10, mean_price=40) > base > change_probability(2, 2, price=40, mean_price=10)
+    assert change_probability(60, 2) < base
+    assert change_probability(2, 2, active_checks=3) < base
+    assert change_probability(2, 0) == 0.0
+
+
+def test_select_candidates_ranks_by_change_probability():
+    db = SessionLocal()
+    for model in (PriceDaily, PriceHistory, ProductSearch, Product, SearchStats, SearchConfig):
+        db.query(model).delete()
+    now = datetime(2026, 3, 10, 12)
+    days = lambda n: now - timedelta(days=n)
+    products = {
+        "stale": Product(url="stale", price=20, scanned_at=days(5), last_checked_at=days(4)),
+        "fresh": Product(url="fresh", price=20, scanned_at=days(1)),
+        "checked": Product(url="checked", price=20, scanned_at=days(5), last_checked_at=now - timedelta(hours=MIN_RECHECK_HOURS - 1)),
+        "sold": Product(url="sold", price=20, scanned_at=days(5), is_sold=1),
+        "survivor": Product(url="survivor", price=20, scanned_at=days(5), last_checked_at=days(4), check_count=6),
+    }
+    db.add_all(products.values())
+    db.commit()
+    assert [url for _, url, _ in select_candidates(db, 10, now)] == ["stale", "survivor", "fresh"]
+    assert [url for _, url, _ in select_candidates(db, 1, now)] == ["stale"]
+    db.query(Product).delete()
+    db.commit()
+    db.close()
@@ -0,0 +1,157 @@
+"""
+Standalone scheduler/worker process.
+
+    python -m worker           # run forever
+    python -m worker --check   # exit 0 if a worker heartbeat is recent (Docker healthcheck)
+
+Owns the periodic scans and sold checks and executes the "scan now" jobs the
+Streamlit UI enqueues in the scan_jobs table. Run exactly one per database;
+any number of dashboards can be open against it.
+"""
+import asyncio
+import signal
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from apscheduler.schedulers.background import BackgroundScheduler
+
+# Fix for Windows asyncio loop (NotImplementedError in Playwright)
+if sys.platform.startswith("win"):
+    asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
+
+from database import SessionLocal, Config, init_db
+from scraper import log_to_db
+from jobs import (
+    enqueue_job, process_job_queue, recover_stale_jobs, write_heartbeat,
+    worker_last_seen, prune_finished_jobs
+)
+from scheduling import due_config_ids
+from metrics import start_metrics_server, METRICS_PORT
+from notifier import get_notifier
+
+POLL_SECONDS = 5
+HEARTBEAT_SECONDS = 30
+SETTINGS_SECONDS = 60
+DUE_SCANS_SECONDS = 60
+HEARTBEAT_MAX_AGE = timedelta(minutes=2)
+# docker stop sends SIGKILL 10 s after SIGTERM
+SHUTDOWN_FLUSH_S = 8
+
+_current_schedule = {}
+
+
+def read_schedule_settings(db):
+    active_setting = db.query(Config).filter_by(key="scheduler_active").first()
+    interval_setting = db.query(Config).filter_by(key="scheduler_interval").first()
+    is_active = active_setting.value == "1" if active_setting else True
+    interval = int(interval_setting.value) if interval_setting else 6
+    return is_active, interval
+
+
+def enqueue(kind):
+    db = SessionLocal()
+    try:
+        enqueue_job(db, kind)
+    finally:
+        db.close()
+
+
+def enqueue_due_scans():
+    """Queues one batch with every search whose next_run_at has passed."""
+    db = SessionLocal()
+    try:
+        if due_config_ids(db):
+            enqueue_job(db, "scan_due")
+    finally:
+        db.close()
+
+
+def apply_schedule(scheduler):
+    """(Re)creates the periodic jobs when the settings in Config changed."""
+    db = SessionLocal()
+    try:
+        settings = read_schedule_settings(db)
+    finally:
+        db.close()
+    if _current_schedule.get('settings') == settings:
+        return
+    _current_schedule['settings'] = settings
+
+    for job_id in ('main_scan', 'sold_check'):
+        if scheduler.get_job(job_id): scheduler.remove_job(job_id)
+
+    is_active, interval = settings
+    if is_active:
+        # Periodic work goes through the same queue as the UI requests
+        # Each search has its own next_run_at (scheduling.py); `interval` is the average budget
+        scheduler.add_job(enqueue_due_scans, 'interval', seconds=DUE_SCANS_SECONDS, id='main_scan', next_run_time=datetime.now())
+        scheduler.add_job(enqueue, 'interval', hours=24, args=["sold_check"], id='sold_check')
+    log_to_db(f"Programación: activa={is_active}, intervalo medio={interval}h", "INFO")
+
+
+def heartbeat():
+    db = SessionLocal()
+    try:
+        write_heartbeat(db)
+    finally:
+        db.close()
+
+
+def housekeeping(scheduler):
+    apply_schedule(scheduler)
+    db = SessionLocal()
+    try:
+        prune_finished_jobs(db)
+    finally:
+        db.close()
+
+
+def check_health():
+    db = SessionLocal()
+    try:
+        last = worker_last_seen(db)
+    finally:
+        db.close()
+    return last is not None and datetime.utcnow() - last < HEARTBEAT_MAX_AGE
+
+
+def main():
+    init_db()
+    db = SessionLocal()
+    try:
+        recover_stale_jobs(db)
+    finally:
+        db.close()
+
+    if METRICS_PORT:
+        start_metrics_server()
+
+    # Timers only enqueue / write small rows; jobs run in the main loop below
+    scheduler = BackgroundScheduler()
+    apply_schedule(scheduler)
+    scheduler.add_job(heartbeat, 'interval', seconds=HEARTBEAT_SECONDS, id='heartbeat', next_run_time=datetime.now())
+    scheduler.add_job(housekeeping, 'interval', seconds=SETTINGS_SECONDS, args=[scheduler], id='housekeeping')
+    scheduler.start()
+
+    stopping = threading.Event()
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.set())
+
+    log_to_db("Worker iniciado.", "INFO")
+    try:
+        while not stopping.is_set():
+            process_job_queue()
+            stopping.wait(POLL_SECONDS)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Alerts still queued (or just merged by a digest) would be lost on exit
+        get_notifier().flush(timeout=SHUTDOWN_FLUSH_S)
+        scheduler.shutdown(wait=False)
+        log_to_db("Worker detenido.", "INFO")
+
+
+if __name__ == "__main__":
+    if "--check" in sys.argv:
+        sys.exit(0 if check_health() else 1)
+    main()